@@ -1,31 +1,437 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # отсчёт для отчёта о времени запуска
 import sys
 import os
 import json
 import csv
 import datetime
+import bisect
+import mmap
+import codecs
+import hashlib
+import zlib
+import struct
+import difflib
+import re
+import threading
+import contextlib
+import uuid
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QTabWidget, QVBoxLayout, QHBoxLayout,
     QLineEdit, QPushButton, QListWidget, QListWidgetItem, QTextEdit, QFileDialog,
     QToolBar, QFontComboBox, QComboBox, QLabel, QDialog, QFormLayout,
-    QDialogButtonBox, QMessageBox, QInputDialog
+    QDialogButtonBox, QMessageBox, QListView, QDateEdit, QDateTimeEdit, QCheckBox,
+    QProgressDialog, QPlainTextEdit, QProgressBar, QTableWidget, QTableWidgetItem, QHeaderView
 )
-from PyQt6.QtGui import QAction, QFont, QKeySequence
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QAction, QFont, QKeySequence, QColor, QTextCursor, QTextCharFormat, QTextDocument
+from PyQt6.QtCore import (
+    Qt, QTimer, QObject, pyqtSignal, QAbstractListModel, QSortFilterProxyModel, QModelIndex,
+    QThread, QDate, QDateTime, QSemaphore, QEvent
+)
+
+from omnidesk_core import (
+    PersistenceService, TaskRepository, TaskIndex, exportData, NoteRepository, FullTextIndex,
+    FileSyncServer, SyncEngine, Instrumentation, importTasks, TaskRecord, taskToDict, PRIORITIES, CATEGORIES, isoToEpoch,
+    ReminderQueue
+)
+STARTUP_IMPORTED = time.perf_counter()
+
+#############################################
+# Отчёт о времени запуска: включается флагом --startup-timing или переменной
+# окружения OMNIDESK_STARTUP_TIMING. Этапы печатаются в stderr по мере
+# прохождения, время — от начала импорта модуля.
+#############################################
+class StartupProfiler:
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.enabled = "--startup-timing" in sys.argv or bool(os.environ.get("OMNIDESK_STARTUP_TIMING"))
+        self.last = STARTUP_STARTED
+        self.seen = set()
+
+    def mark(self, stage, at=None):
+        # Каждый этап отмечается один раз
+        if not self.enabled or stage in self.seen:
+            return
+        self.seen.add(stage)
+        now = time.perf_counter() if at is None else at
+        print(f"[запуск] {stage}: {(now - STARTUP_STARTED) * 1000:.1f} мс "
+              f"(+{(now - self.last) * 1000:.1f} мс)", file=sys.stderr)
+        self.last = now
+
+#############################################
+# Фоновая загрузка данных: функция выполняется в отдельном потоке, результат
+# приходит сигналом loaded. wait() позволяет дождаться его синхронно.
+#############################################
+class DataLoader(QThread):
+    loaded = pyqtSignal(object)
+
+    def __init__(self, func, parent=None):
+        super().__init__(parent)
+        self.func = func
+        self.result = None
+
+    def run(self):
+        self.result = self.func()
+        self.loaded.emit(self.result)
+
+class WriteNotifier(QObject):
+    # Переносит уведомления PersistenceService из рабочего потока в поток GUI
+    writeFinished = pyqtSignal(str, bool)  # путь к файлу, успех записи
+
+#############################################
+# Модель списка задач: задачи хранятся в списке компактных записей (TaskRecord),
+# а представление запрашивает данные только для видимых строк.
+# Фильтрация — через прокси-модель.
+#############################################
+def taskDisplayText(task):
+    if task.due_at is not None:
+        return f"{task.text} (Приоритет: {task.priority}, Категория: {task.category}, Срок: {formatMoment(task.due)})"
+    return f"{task.text} (Приоритет: {task.priority}, Категория: {task.category})"
+
+class TaskListModel(QAbstractListModel):
+    taskChanged = pyqtSignal(object)  # задачу (TaskRecord) отметили или переименовали в списке
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tasks = []
+        self.rows = {}  # id задачи -> номер строки
+        self.task_index = TaskIndex()
+        self.next_id = 1
+
+    def assignId(self, task):
+        # Стабильный целочисленный id; задачи из старых файлов получают его при загрузке,
+        # а восстановленная из архива задача — новый, если её id уже занят
+        if task.id is None or task.id in self.rows:
+            task.id = self.next_id
+        self.next_id = max(self.next_id, task.id + 1)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tasks)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self.tasks[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return taskDisplayText(task)
+        if role == Qt.ItemDataRole.EditRole:
+            return task.text
+        if role == Qt.ItemDataRole.CheckStateRole:
+            return Qt.CheckState.Checked if task.completed else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.ForegroundRole:
+            # Просроченные невыполненные задачи — красным
+            if task.due_at is not None and not task.completed and task.due_at <= time.time():
+                return QColor("red")
+            return None
+        if role == Qt.ItemDataRole.UserRole:
+            return task
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return (Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+                | Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEditable)
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid():
+            return False
+        task = self.tasks[index.row()]
+        if role == Qt.ItemDataRole.CheckStateRole:
+            task.completed = Qt.CheckState(value) == Qt.CheckState.Checked
+            self.task_index.setCompleted(task.id, task.completed)
+        elif role == Qt.ItemDataRole.EditRole:
+            new_text = str(value)
+            if " (Приоритет:" in new_text:
+                new_text = new_text.split(" (Приоритет:")[0]
+            task.text = new_text
+        else:
+            return False
+        self.dataChanged.emit(index, index)
+        self.taskChanged.emit(task)
+        return True
+
+    def setTasks(self, tasks):
+        self.beginResetModel()
+        self.tasks = [TaskRecord.fromDict(task) for task in tasks]
+        self.rows = {}
+        for row, task in enumerate(self.tasks):
+            self.assignId(task)
+            self.rows[task.id] = row
+        self.task_index.rebuild(self.tasks)
+        self.endResetModel()
+
+    def appendTask(self, task):
+        return self.appendTasks([task])[0]
+
+    def appendTasks(self, tasks):
+        # Одна вставка диапазона строк вместо сигнала на каждую задачу.
+        # Словари превращаются в записи; возвращаются добавленные записи
+        tasks = [TaskRecord.fromDict(task) for task in tasks]
+        if not tasks:
+            return tasks
+        first = len(self.tasks)
+        self.beginInsertRows(QModelIndex(), first, first + len(tasks) - 1)
+        for task in tasks:
+            self.assignId(task)
+            self.rows[task.id] = len(self.tasks)
+            self.tasks.append(task)
+            self.task_index.add(task)
+        self.endInsertRows()
+        return tasks
+
+    def removeTasks(self, predicate):
+        # Удаляет подходящие задачи за один проход и возвращает их
+        removed = [task for task in self.tasks if predicate(task)]
+        if removed:
+            self.beginResetModel()
+            for task in removed:
+                self.task_index.remove(task)
+            self.tasks = [task for task in self.tasks if not predicate(task)]
+            self.rows = {task.id: row for row, task in enumerate(self.tasks)}
+            self.endResetModel()
+        return removed
+
+    def notifyRows(self, task_ids):
+        # Сообщаем об изменении только указанных строк, склеивая соседние в диапазоны
+        rows = sorted(self.rows[task_id] for task_id in task_ids if task_id in self.rows)
+        start = prev = None
+        for row in rows + [None]:
+            if start is not None and (row is None or row != prev + 1):
+                self.dataChanged.emit(self.index(start), self.index(prev))
+                start = None
+            if start is None:
+                start = row
+            prev = row
+
+class TaskFilterProxyModel(QSortFilterProxyModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # None у любого поля — без ограничения по нему
+        self.filters = {"category": None, "priority": None, "completed": None, "since": None, "until": None}
+        # Те же фильтры в виде кодов и секунд — для сравнения с полями TaskRecord
+        self.keys = self.filterKeys(self.filters)
+
+    @staticmethod
+    def filterKeys(filters):
+        # Значения, которых нет ни у одной задачи, получают код -1 — ничего не совпадёт
+        def code(table, value):
+            if value is None:
+                return None
+            found = table.lookup(value)
+            return -1 if found is None else found
+        since = isoToEpoch(filters["since"])
+        until = isoToEpoch(filters["until"])
+        return (code(CATEGORIES, filters["category"]), code(PRIORITIES, filters["priority"]),
+                filters["completed"], since, until)
+
+    def setFilters(self, **filters):
+        new_filters = dict(self.filters, **filters)
+        if new_filters == self.filters:
+            return
+        model = self.sourceModel()
+        old_ids = model.task_index.match(**self.filters)
+        new_ids = model.task_index.match(**new_filters)
+        self.filters = new_filters
+        self.keys = self.filterKeys(new_filters)
+        flipped = old_ids ^ new_ids
+        if len(flipped) * 4 > len(model.tasks):
+            # Меняется видимость большей части строк — дешевле перефильтровать всё
+            self.invalidateFilter()
+        else:
+            # Прокси перепроверит только строки, для которых пришёл dataChanged
+            model.notifyRows(flipped)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        # Проверка одной строки — O(1): сравнение целых кодов, без QVariant и строк
+        task = self.sourceModel().tasks[source_row]
+        category, priority, completed, since, until = self.keys
+        if category is not None and task.category_code != category:
+            return False
+        if priority is not None and task.priority_code != priority:
+            return False
+        if completed is not None and bool(task.completed) != completed:
+            return False
+        created = -1 if task.created is None else task.created
+        if since is not None and created < since:
+            return False
+        if until is not None and created > until:
+            return False
+        return True
+
+#############################################
+# Фоновый экспорт: ExportWorker выполняет exportData в отдельном потоке,
+# ExportDialog выбирает формат и состав выгрузки.
+#############################################
+class ExportWorker(QThread):
+    progressChanged = pyqtSignal(int)
+    exportFinished = pyqtSignal(int, str)  # число строк (-1 — отменён), текст ошибки
+
+    def __init__(self, path, fmt, sources, tasks, storage, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.fmt = fmt
+        self.sources = sources
+        self.tasks = tasks
+        self.storage = storage
+
+    def run(self):
+        try:
+            count = exportData(self.path, self.fmt, self.sources, self.tasks, self.storage,
+                               progress=self.progressChanged.emit, cancelled=self.isInterruptionRequested)
+        except OSError as e:
+            self.exportFinished.emit(-1, str(e))
+            return
+        self.exportFinished.emit(-1 if count is None else count, "")
+
+class ExportDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Экспорт")
+        layout = QFormLayout()
+        self.tasks_check = QCheckBox("Активные задачи")
+        self.tasks_check.setChecked(True)
+        self.archive_check = QCheckBox("Архив")
+        self.history_check = QCheckBox("История изменений")
+        layout.addRow("Что экспортировать:", self.tasks_check)
+        layout.addRow("", self.archive_check)
+        layout.addRow("", self.history_check)
+        self.format_combo = QComboBox()
+        self.format_combo.addItem("CSV", "csv")
+        self.format_combo.addItem("JSON Lines", "jsonl")
+        layout.addRow("Формат:", self.format_combo)
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+        self.setLayout(layout)
+
+    def getOptions(self):
+        sources = []
+        if self.tasks_check.isChecked():
+            sources.append("tasks")
+        if self.archive_check.isChecked():
+            sources.append("archive")
+        if self.history_check.isChecked():
+            sources.append("history")
+        return sources, self.format_combo.currentData()
+
+#############################################
+# Срок и напоминание задачи: флажок «Срок», дата и время, за сколько напомнить.
+# Используется в строке ввода новой задачи и в диалоге изменения срока.
+#############################################
+REMIND_OFFSETS = [("Без напоминания", None), ("В срок", 0), ("За 15 минут", 15 * 60),
+                  ("За час", 60 * 60), ("За день", 24 * 60 * 60)]
+
+def formatMoment(value):
+    # value — строка ISO; время показывается так, как записано, в том числе в своём часовом поясе
+    return datetime.datetime.fromisoformat(value).strftime("%d.%m.%Y %H:%M")
+
+class DueDateEditor(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.due_check = QCheckBox("Срок:")
+        self.due_check.toggled.connect(self.updateEnabled)
+        layout.addWidget(self.due_check)
+        self.due_edit = QDateTimeEdit()
+        self.due_edit.setCalendarPopup(True)
+        self.due_edit.setDisplayFormat("dd.MM.yyyy HH:mm")
+        layout.addWidget(self.due_edit)
+        self.remind_combo = QComboBox()
+        for text, offset in REMIND_OFFSETS:
+            self.remind_combo.addItem(text, offset)
+        layout.addWidget(self.remind_combo)
+        layout.addStretch()
+        self.setLayout(layout)
+        self.setValues(None, None)
+
+    def updateEnabled(self):
+        enabled = self.due_check.isChecked()
+        self.due_edit.setEnabled(enabled)
+        self.remind_combo.setEnabled(enabled)
+
+    def setValues(self, due_at, remind_at):
+        # Без срока предлагаем начало следующего часа
+        self.due_check.setChecked(due_at is not None)
+        moment = due_at if due_at is not None else (int(time.time()) // 3600 + 1) * 3600
+        self.due_edit.setDateTime(QDateTime.fromSecsSinceEpoch(moment))
+        index = 0
+        if due_at is not None and remind_at is not None:
+            offset = due_at - remind_at
+            index = self.remind_combo.findData(offset)
+            if index < 0:
+                self.remind_combo.addItem(f"За {offset // 60} мин", offset)
+                index = self.remind_combo.count() - 1
+        self.remind_combo.setCurrentIndex(index)
+        self.updateEnabled()
+
+    def values(self):
+        # (срок, время напоминания) в секундах Unix; None — не задано
+        if not self.due_check.isChecked():
+            return None, None
+        due_at = self.due_edit.dateTime().toSecsSinceEpoch()
+        offset = self.remind_combo.currentData()
+        return due_at, (None if offset is None else due_at - offset)
+
+class TaskDueDialog(QDialog):
+    def __init__(self, task, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Срок и напоминание")
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(task.text))
+        self.editor = DueDateEditor(self)
+        self.editor.setValues(task.due_at, task.remind_at)
+        layout.addWidget(self.editor)
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
 
 #############################################
 # 1. Список дел (TodoTab) с архивированием, восстановлением из архива,
 #    экспортом в CSV и историей изменений
 #############################################
 class TodoTab(QWidget):
+    # Где теперь затронутые задачи: "task" (активные), "archive" или "deleted"
+    tasksChanged = pyqtSignal(str, list)
+    historyLogged = pyqtSignal(dict)
+
     def __init__(self):
         super().__init__()
-        self.file_path = "tasks.json"          # файл для активных задач
-        self.archive_path = "tasks_archive.json"  # файл для архивированных задач
-        self.history_path = "tasks_history.json"  # файл для истории изменений
+        self.loader = None  # фоновая загрузка задач, пока она идёт
+        # Внутри batch() сигналы tasksChanged копятся и отправляются одним разом
+        self.batch_depth = 0
+        self.batch_changes = []  # (где задачи, список задач)
+        # Сроки и напоминания: куча ближайших событий и один таймер на ближайшее из них
+        self.reminders = ReminderQueue()
+        self.reminder_timer = QTimer(self)
+        self.reminder_timer.setSingleShot(True)
+        self.reminder_timer.timeout.connect(self.fireReminders)
+        self.reminder_box = None
         self.initUI()
+        self.repository = self.createRepository()
+        self.storage = self.repository.storage
         self.loadTasks()
 
+    def createRepository(self):
+        # Операции с хранилищем и историей — в omnidesk_core; вкладка ведёт модель и интерфейс
+        settings = PersistenceService.instance().readJson("settings.json", {}) or {}
+        repository = TaskRepository(".", settings.get("storage_backend", "json"),
+                                    snapshot=lambda: self.task_model.tasks)
+        repository.addHistoryListener(self.historyLogged.emit)
+        return repository
+
     def initUI(self):
         layout = QVBoxLayout()
 
@@ -36,12 +442,12 @@ class TodoTab(QWidget):
         input_layout.addWidget(self.task_input)
 
         self.priority_combo = QComboBox()
-        self.priority_combo.addItems(["Низкий", "Средний", "Высокий"])
+        self.priority_combo.addItems(PRIORITIES.values)
         input_layout.addWidget(QLabel("Приоритет:"))
         input_layout.addWidget(self.priority_combo)
 
         self.category_combo = QComboBox()
-        self.category_combo.addItems(["Общее", "Работа", "Дом", "Учёба", "Другое"])
+        self.category_combo.addItems(CATEGORIES.values)
         input_layout.addWidget(QLabel("Категория:"))
         input_layout.addWidget(self.category_combo)
 
@@ -49,27 +455,43 @@ class TodoTab(QWidget):
         self.add_button.clicked.connect(self.addTask)
         input_layout.addWidget(self.add_button)
         layout.addLayout(input_layout)
+        self.due_editor = DueDateEditor(self)
+        layout.addWidget(self.due_editor)
 
         # Фильтр по категории и приоритету
         filter_layout = QHBoxLayout()
         self.filter_category = QComboBox()
         self.filter_category.addItem("Все категории")
-        self.filter_category.addItems(["Общее", "Работа", "Дом", "Учёба", "Другое"])
+        self.filter_category.addItems(CATEGORIES.values)
         self.filter_category.currentTextChanged.connect(self.updateTaskFilter)
         filter_layout.addWidget(QLabel("Фильтр по категории:"))
         filter_layout.addWidget(self.filter_category)
 
         self.filter_priority = QComboBox()
         self.filter_priority.addItem("Все приоритеты")
-        self.filter_priority.addItems(["Низкий", "Средний", "Высокий"])
+        self.filter_priority.addItems(PRIORITIES.values)
         self.filter_priority.currentTextChanged.connect(self.updateTaskFilter)
         filter_layout.addWidget(QLabel("Фильтр по приоритету:"))
         filter_layout.addWidget(self.filter_priority)
+
+        self.filter_status = QComboBox()
+        self.filter_status.addItems(["Все задачи", "Активные", "Выполненные"])
+        self.filter_status.currentTextChanged.connect(self.updateTaskFilter)
+        filter_layout.addWidget(QLabel("Статус:"))
+        filter_layout.addWidget(self.filter_status)
         layout.addLayout(filter_layout)
 
-        # Список задач
-        self.task_list = QListWidget()
-        self.task_list.itemChanged.connect(self.onItemChanged)
+        # Список задач: модель хранит задачи, прокси-модель отвечает за фильтр
+        self.task_model = TaskListModel(self)
+        self.task_model.taskChanged.connect(self.onTaskChanged)
+        self.task_proxy = TaskFilterProxyModel(self)
+        self.task_proxy.setSourceModel(self.task_model)
+        self.task_list = QListView()
+        self.task_list.setUniformItemSizes(True)
+        self.task_list.setModel(self.task_proxy)
+        self.loading_label = QLabel("Загрузка задач…")
+        self.loading_label.hide()
+        layout.addWidget(self.loading_label)
         layout.addWidget(self.task_list)
 
         # Кнопки для удаления, архивирования, показа архива, истории и экспорта
@@ -86,13 +508,21 @@ class TodoTab(QWidget):
         self.show_archive_button.clicked.connect(self.openArchiveDialog)
         btn_layout.addWidget(self.show_archive_button)
 
+        self.due_button = QPushButton("Срок…")
+        self.due_button.clicked.connect(self.editDueDate)
+        btn_layout.addWidget(self.due_button)
+
         self.show_history_button = QPushButton("Показать историю")
         self.show_history_button.clicked.connect(self.showHistory)
         btn_layout.addWidget(self.show_history_button)
 
-        self.export_csv_button = QPushButton("Экспорт в CSV")
-        self.export_csv_button.clicked.connect(self.exportToCSV)
-        btn_layout.addWidget(self.export_csv_button)
+        self.import_button = QPushButton("Импорт…")
+        self.import_button.clicked.connect(self.importTasks)
+        btn_layout.addWidget(self.import_button)
+
+        self.export_button = QPushButton("Экспорт…")
+        self.export_button.clicked.connect(self.exportTasks)
+        btn_layout.addWidget(self.export_button)
 
         layout.addLayout(btn_layout)
         self.setLayout(layout)
@@ -101,183 +531,357 @@ class TodoTab(QWidget):
         text = self.task_input.text().strip()
         if not text:
             return
-        priority = self.priority_combo.currentText()
-        category = self.category_combo.currentText()
-        timestamp = datetime.datetime.now().isoformat()
-        task_data = {
-            "text": text,
-            "completed": False,
-            "priority": priority,
-            "category": category,
-            "timestamp": timestamp
-        }
-        item = QListWidgetItem(f"{text} (Приоритет: {priority}, Категория: {category})")
-        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEditable)
-        item.setCheckState(Qt.CheckState.Unchecked)
-        item.setData(Qt.ItemDataRole.UserRole, task_data)
-        self.task_list.addItem(item)
+        due_at, remind_at = self.due_editor.values()
+        task_data = TaskRepository.newTask(text, self.priority_combo.currentText(),
+                                           self.category_combo.currentText(), due=due_at, remind=remind_at)
+        self.task_model.appendTask(task_data)
         self.task_input.clear()
-        self.logHistory("added", task_data)
-        self.saveTasks()
-        self.updateTaskFilter()
-
-    def onItemChanged(self, item):
-        task_data = item.data(Qt.ItemDataRole.UserRole)
-        if task_data:
-            task_data["completed"] = (item.checkState() == Qt.CheckState.Checked)
-            # Обновляем текст, если он изменён
-            full_text = item.text()
-            if " (Приоритет:" in full_text:
-                new_text = full_text.split(" (Приоритет:")[0]
+        self.due_editor.setValues(None, None)
+        self.repository.add([task_data])
+        self.emitTasksChanged("task", [task_data])
+
+    def onTaskChanged(self, task_data):
+        # Прокси-модель сама перепроверяет фильтр для изменённой строки
+        self.repository.update(task_data)
+        self.emitTasksChanged("task", [task_data])
+
+    @contextlib.contextmanager
+    def batch(self):
+        # Пакет изменений: история и файлы записываются один раз в конце,
+        # подписчики получают по одному сигналу на каждый вид изменения
+        self.batch_depth += 1
+        try:
+            with self.repository.batch():
+                yield self
+        finally:
+            self.batch_depth -= 1
+            if not self.batch_depth:
+                changes, self.batch_changes = self.batch_changes, []
+                for location, tasks in changes:
+                    self.tasksChanged.emit(location, tasks)
+
+    def emitTasksChanged(self, location, tasks):
+        self.updateReminders(location, tasks)
+        if not self.batch_depth:
+            self.tasksChanged.emit(location, tasks)
+        elif self.batch_changes and self.batch_changes[-1][0] == location:
+            self.batch_changes[-1][1].extend(tasks)
+        else:
+            self.batch_changes.append((location, list(tasks)))
+
+    def updateReminders(self, location, tasks):
+        # Точечно: задача в активных — перепланировать, ушла в архив или удалена — снять
+        now = time.time()
+        for task in tasks:
+            if location == "task":
+                self.reminders.update(task, now)
+            else:
+                self.reminders.remove(task.get("id"))
+        self.armReminders()
+
+    def armReminders(self):
+        moment = self.reminders.nextTime()
+        if moment is None:
+            self.reminder_timer.stop()
+            return
+        # Интервал QTimer ограничен; дальние события таймер просто перезаведёт
+        delay = min(max(moment - time.time(), 0), 24 * 60 * 60)
+        self.reminder_timer.start(int(delay * 1000))
+
+    def fireReminders(self):
+        fired = self.reminders.popDue(time.time())
+        self.armReminders()
+        lines = []
+        for task_id, kind in fired:
+            row = self.task_model.rows.get(task_id)
+            if row is None:
+                continue
+            task = self.task_model.tasks[row]
+            if kind == "due":
+                lines.append(f"Срок истёк: {task.text}")
             else:
-                new_text = full_text
-            task_data["text"] = new_text
-            item.setData(Qt.ItemDataRole.UserRole, task_data)
-            item.setText(f"{task_data['text']} (Приоритет: {task_data['priority']}, Категория: {task_data['category']})")
-            self.logHistory("changed", task_data)
-            self.saveTasks()
-            self.updateTaskFilter()
+                lines.append(f"Напоминание: {task.text} (срок {formatMoment(task.due)})")
+        if not lines:
+            return
+        self.task_model.notifyRows([task_id for task_id, _ in fired])
+        if len(lines) > 10:
+            lines = lines[:10] + [f"…и ещё {len(lines) - 10}"]
+        # Немодальное окно: одно на пачку событий, предыдущее заменяется
+        if self.reminder_box is not None:
+            self.reminder_box.close()
+        self.reminder_box = QMessageBox(QMessageBox.Icon.Information, "Напоминание", "\n".join(lines),
+                                        QMessageBox.StandardButton.Ok, self)
+        self.reminder_box.setModal(False)
+        self.reminder_box.show()
+        QApplication.alert(self.window())
+
+    def editDueDate(self):
+        index = self.task_list.currentIndex()
+        if not index.isValid():
+            QMessageBox.information(self, "Срок", "Выберите задачу в списке.")
+            return
+        task = self.task_model.tasks[self.task_proxy.mapToSource(index).row()]
+        dialog = TaskDueDialog(task, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        due_at, remind_at = dialog.editor.values()
+        if (due_at, remind_at) == (task.due_at, task.remind_at):
+            return
+        task.due = due_at
+        task.remind = remind_at
+        self.task_model.notifyRows([task.id])
+        self.onTaskChanged(task)
 
     def deleteCompletedTasks(self):
-        for index in range(self.task_list.count() - 1, -1, -1):
-            item = self.task_list.item(index)
-            task_data = item.data(Qt.ItemDataRole.UserRole)
-            if task_data and task_data.get("completed"):
-                self.task_list.takeItem(index)
-        self.saveTasks()
+        if not self.task_model.task_index.by_completed[True]:
+            return
+        with self.batch():
+            removed = self.task_model.removeTasks(lambda task: task.completed)
+            self.repository.delete(removed)
+            self.emitTasksChanged("deleted", removed)
 
     def archiveCompletedTasks(self):
-        archived = []
-        for index in range(self.task_list.count() - 1, -1, -1):
-            item = self.task_list.item(index)
-            task_data = item.data(Qt.ItemDataRole.UserRole)
-            if task_data and task_data.get("completed"):
-                archived.append(task_data)
-                self.logHistory("archived", task_data)
-                self.task_list.takeItem(index)
-        if os.path.exists(self.archive_path):
-            with open(self.archive_path, 'r', encoding='utf-8') as f:
-                archive_list = json.load(f)
-        else:
-            archive_list = []
-        archive_list.extend(archived)
-        with open(self.archive_path, 'w', encoding='utf-8') as f:
-            json.dump(archive_list, f, ensure_ascii=False, indent=4)
-        self.saveTasks()
+        if not self.task_model.task_index.by_completed[True]:
+            return
+        with self.batch():
+            archived = self.task_model.removeTasks(lambda task: task.completed)
+            self.repository.archive(archived)
+            self.emitTasksChanged("archive", archived)
 
     def openArchiveDialog(self):
-        dialog = ArchiveDialog(self.archive_path, self)
+        dialog = ArchiveDialog(self.storage, self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             # Восстанавливаем выбранные задачи
-            restored_tasks = dialog.getRestoredTasks()
-            for task in restored_tasks:
-                self.restoreTask(task)
-            # Если архив очищен, удаляем файл архива
-            if dialog.archiveCleared:
-                if os.path.exists(self.archive_path):
-                    os.remove(self.archive_path)
-        # После закрытия диалога обновляем архив
-        remaining = dialog.getRemainingTasks()
-        with open(self.archive_path, 'w', encoding='utf-8') as f:
-            json.dump(remaining, f, ensure_ascii=False, indent=4)
+            self.restoreTasks(dialog.getRestoredTasks())
+        if dialog.archiveCleared:
+            self.emitTasksChanged("deleted", self.repository.clearArchive())
+
+    def importTasks(self):
+        file_name, _ = QFileDialog.getOpenFileName(self, "Импорт задач", "",
+                                                   "CSV или JSON (*.csv *.json *.jsonl);;All Files (*)")
+        if not file_name:
+            return
+        try:
+            tasks = importTasks(file_name)
+        except (OSError, ValueError, csv.Error, AttributeError) as e:
+            QMessageBox.warning(self, "Импорт", f"Не удалось прочитать файл:\n{e}")
+            return
+        with self.batch():
+            tasks = self.task_model.appendTasks(tasks)
+            self.repository.add(tasks)
+            self.emitTasksChanged("task", tasks)
+        QMessageBox.information(self, "Импорт", f"Импортировано задач: {len(tasks)}.")
 
     def showHistory(self):
-        if os.path.exists(self.history_path):
-            with open(self.history_path, 'r', encoding='utf-8') as f:
-                history_list = json.load(f)
-        else:
-            history_list = []
-        text = ""
-        for entry in history_list:
-            text += f"{entry['timestamp']}: {entry['action']} – {entry['task']['text']}\n"
-        QMessageBox.information(self, "История задач", text if text else "История пуста.")
+        dialog = HistoryDialog(self.storage, self)
+        dialog.exec()
 
     def updateTaskFilter(self):
         cat_filter = self.filter_category.currentText()
         prio_filter = self.filter_priority.currentText()
-        for i in range(self.task_list.count()):
-            item = self.task_list.item(i)
-            task_data = item.data(Qt.ItemDataRole.UserRole)
-            show = True
-            if task_data:
-                if cat_filter != "Все категории" and task_data.get("category") != cat_filter:
-                    show = False
-                if prio_filter != "Все приоритеты" and task_data.get("priority") != prio_filter:
-                    show = False
-            item.setHidden(not show)
-
-    def exportToCSV(self):
-        file_name, _ = QFileDialog.getSaveFileName(self, "Экспорт задач в CSV", "", "CSV Files (*.csv)")
-        if file_name:
-            with open(file_name, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ["text", "completed", "priority", "category", "timestamp"]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                for i in range(self.task_list.count()):
-                    item = self.task_list.item(i)
-                    task_data = item.data(Qt.ItemDataRole.UserRole)
-                    if task_data:
-                        writer.writerow(task_data)
-            QMessageBox.information(self, "Экспорт", "Экспорт задач завершен.")
+        status_filter = self.filter_status.currentIndex()
+        with Instrumentation.instance().measure("tasks.filter"):
+            self.task_proxy.setFilters(
+                category=None if cat_filter == "Все категории" else cat_filter,
+                priority=None if prio_filter == "Все приоритеты" else prio_filter,
+                completed=None if status_filter == 0 else status_filter == 2
+            )
+
+    def exportTasks(self):
+        dialog = ExportDialog(self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        sources, fmt = dialog.getOptions()
+        if not sources:
+            return
+        file_filter = "CSV Files (*.csv)" if fmt == "csv" else "JSON Lines (*.jsonl)"
+        file_name, _ = QFileDialog.getSaveFileName(self, "Экспорт", "", file_filter)
+        if not file_name:
+            return
+        # Неизменяемые снимки (кортежи): пока идёт экспорт, задачи в списке можно менять,
+        # а словари для файла строятся уже в фоновом потоке
+        frozen = [task.freeze() for task in self.task_model.tasks]
+        self.export_worker = ExportWorker(file_name, fmt, sources, frozen, self.storage, self)
+        total = 0
+        if "tasks" in sources:
+            total += len(self.task_model.tasks)
+        if "archive" in sources:
+            total += self.storage.archiveCount()
+        # Размер истории заранее неизвестен — тогда показываем индикатор без шкалы
+        self.export_progress = QProgressDialog("Экспорт…", "Отмена", 0, 0 if "history" in sources else total, self)
+        self.export_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.export_progress.setMinimumDuration(500)
+        self.export_progress.canceled.connect(self.export_worker.requestInterruption)
+        if "history" not in sources:
+            self.export_worker.progressChanged.connect(self.export_progress.setValue)
+        self.export_worker.exportFinished.connect(self.onExportFinished)
+        self.export_worker.start()
+
+    def onExportFinished(self, count, error):
+        self.export_progress.reset()
+        self.export_worker.wait()
+        self.export_worker = None
+        if error:
+            QMessageBox.warning(self, "Экспорт", f"Не удалось выполнить экспорт:\n{error}")
+        elif count >= 0:
+            QMessageBox.information(self, "Экспорт", f"Экспорт завершен, записей: {count}.")
 
     def saveTasks(self):
-        tasks = []
-        for i in range(self.task_list.count()):
-            item = self.task_list.item(i)
-            task_data = item.data(Qt.ItemDataRole.UserRole)
-            if task_data:
-                tasks.append(task_data)
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(tasks, f, ensure_ascii=False, indent=4)
+        with Instrumentation.instance().measure("tasks.save"):
+            self.storage.saveTasks(self.task_model.tasks)
 
     def loadTasks(self):
-        if os.path.exists(self.file_path):
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                tasks = json.load(f)
-            self.task_list.blockSignals(True)
-            self.task_list.clear()
-            for task in tasks:
-                item = QListWidgetItem(f"{task['text']} (Приоритет: {task['priority']}, Категория: {task['category']})")
-                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEditable)
-                item.setCheckState(Qt.CheckState.Checked if task.get("completed") else Qt.CheckState.Unchecked)
-                item.setData(Qt.ItemDataRole.UserRole, task)
-                self.task_list.addItem(item)
-            self.task_list.blockSignals(False)
-
-    def restoreTask(self, task_data):
-        # Добавляем восстановленную задачу в активный список
-        item = QListWidgetItem(f"{task_data['text']} (Приоритет: {task_data['priority']}, Категория: {task_data['category']})")
-        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEditable)
-        item.setCheckState(Qt.CheckState.Checked if task_data.get("completed") else Qt.CheckState.Unchecked)
-        item.setData(Qt.ItemDataRole.UserRole, task_data)
-        self.task_list.addItem(item)
-        self.logHistory("restored", task_data)
-        self.saveTasks()
-
-    def logHistory(self, action, task):
-        entry = {
-            "action": action,
-            "task": task,
-            "timestamp": datetime.datetime.now().isoformat()
-        }
-        if os.path.exists(self.history_path):
-            with open(self.history_path, 'r', encoding='utf-8') as f:
-                history = json.load(f)
+        # Файлы читаются в фоне; до окончания загрузки изменяющие кнопки недоступны
+        self.setLoading(True)
+        self.loader = DataLoader(self.repository.load, self)
+        self.loader.loaded.connect(self.onTasksLoaded)
+        self.loader.start()
+
+    def onTasksLoaded(self, tasks):
+        if self.loader is None:
+            return  # уже применено через ensureLoaded
+        self.loader = None
+        # Задачи без id получат номера после всех занятых, в том числе архивных
+        self.task_model.next_id = max(self.task_model.next_id, self.repository.nextId())
+        with Instrumentation.instance().measure("tasks.show"):
+            self.task_model.setTasks(tasks)
+        with Instrumentation.instance().measure("tasks.reminders"):
+            self.reminders.rebuild(self.task_model.tasks, time.time())
+        self.armReminders()
+        self.setLoading(False)
+        StartupProfiler.instance().mark("данные: задачи")
+
+    def ensureLoaded(self):
+        # Для кода, которому задачи нужны немедленно (синхронизация, поиск)
+        if self.loader is not None:
+            self.loader.wait()
+            self.onTasksLoaded(self.loader.result)
+
+    def setLoading(self, loading):
+        self.loading_label.setVisible(loading)
+        for button in (self.add_button, self.delete_button, self.archive_button, self.due_button,
+                       self.show_archive_button, self.import_button, self.export_button):
+            button.setEnabled(not loading)
+
+    def selectTask(self, task_id):
+        row = self.task_model.rows.get(task_id)
+        if row is None:
+            return
+        proxy_index = self.task_proxy.mapFromSource(self.task_model.index(row))
+        if proxy_index.isValid():
+            self.task_list.setCurrentIndex(proxy_index)
+            self.task_list.scrollTo(proxy_index)
+
+    def restoreTasks(self, tasks):
+        # Восстановленные задачи добавляются в активный список одним пакетом
+        if not tasks:
+            return
+        # Копии с исходными id: appendTasks выдаёт новый id, если исходный уже занят
+        archived = [taskToDict(task) for task in tasks]
+        with self.batch():
+            tasks = self.task_model.appendTasks(tasks)
+            self.repository.restore(tasks, archived)
+            self.emitTasksChanged("task", tasks)
+
+    def applySyncedTask(self, task, location):
+        # Применение изменения, полученного синхронизацией. Задача уже несёт
+        # локальный id (новая — без id). Подходит для обоих хранилищ:
+        # restoreTasks кладёт задачу в активные, дальше она переносится куда нужно.
+        # Через repository.apply, без записи истории: история приходит с сервера отдельно
+        with self.batch():
+            row = self.task_model.rows.get(task.get("id"))
+            if row is not None:
+                current = self.task_model.tasks[row]
+                if location == "task":
+                    self.task_model.task_index.remove(current)
+                    current.update(task)
+                    self.task_model.task_index.add(current)
+                    self.task_model.notifyRows([current["id"]])
+                    self.repository.apply("updateTasks", [current])
+                else:
+                    self.task_model.removeTasks(lambda item: item.id == current.id)
+                    current.update(task)
+                    self.repository.apply("archiveTasks" if location == "archive" else "deleteTasks", [current])
+                task = current
+            elif location == "task":
+                task = self.task_model.appendTask(task)
+                self.repository.apply("restoreTasks", [task])
+            else:
+                if "id" not in task:
+                    task["id"] = self.task_model.next_id
+                    self.task_model.next_id += 1
+                self.repository.apply("restoreTasks", [task])
+                self.repository.apply("archiveTasks" if location == "archive" else "deleteTasks", [task])
+            self.emitTasksChanged(location, [task])
+        return task["id"]
+
+#############################################
+# Модель архива: задачи подгружаются страницами по мере прокрутки
+# (canFetchMore/fetchMore), поэтому диалог открывается сразу при любом размере архива
+#############################################
+class ArchiveListModel(QAbstractListModel):
+    PAGE_SIZE = 200
+
+    def __init__(self, tasks_iter, parent=None):
+        super().__init__(parent)
+        self.tasks = []
+        self.source = tasks_iter
+        self.exhausted = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tasks)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self.tasks[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return taskDisplayText(task)
+        if role == Qt.ItemDataRole.UserRole:
+            return task
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        page = []
+        for task in self.source:
+            page.append(TaskRecord.fromDict(task))
+            if len(page) >= self.PAGE_SIZE:
+                break
         else:
-            history = []
-        history.append(entry)
-        with open(self.history_path, 'w', encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=4)
+            self.exhausted = True
+        if page:
+            row = len(self.tasks)
+            self.beginInsertRows(QModelIndex(), row, row + len(page) - 1)
+            self.tasks.extend(page)
+            self.endInsertRows()
+
+    def takeRows(self, rows):
+        # Убирает строки за один проход и возвращает их задачи
+        rows = set(rows)
+        taken = [self.tasks[row] for row in sorted(rows)]
+        self.beginResetModel()
+        self.tasks = [task for row, task in enumerate(self.tasks) if row not in rows]
+        self.endResetModel()
+        return taken
+
+    def clear(self):
+        self.beginResetModel()
+        self.tasks = []
+        self.exhausted = True
+        self.endResetModel()
 
 #############################################
 # Диалог для работы с архивом: позволяет выбрать задачи для восстановления
 # и очистить архив
 #############################################
 class ArchiveDialog(QDialog):
-    def __init__(self, archive_path, parent=None):
+    def __init__(self, storage, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Архив задач")
-        self.archive_path = archive_path
+        self.storage = storage
         self.restored_tasks = []
         self.archiveCleared = False
         self.initUI()
@@ -285,9 +889,12 @@ class ArchiveDialog(QDialog):
 
     def initUI(self):
         layout = QVBoxLayout()
-        self.list_widget = QListWidget()
-        self.list_widget.setSelectionMode(QListWidget.SelectionMode.MultiSelection)
-        layout.addWidget(self.list_widget)
+        self.count_label = QLabel()
+        layout.addWidget(self.count_label)
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setSelectionMode(QListView.SelectionMode.MultiSelection)
+        layout.addWidget(self.list_view)
 
         btn_layout = QHBoxLayout()
         self.restore_button = QPushButton("Восстановить выбранные")
@@ -306,58 +913,1246 @@ class ArchiveDialog(QDialog):
         self.setLayout(layout)
 
     def loadArchive(self):
-        self.archived_tasks = []
-        self.list_widget.clear()
-        if os.path.exists(self.archive_path):
-            with open(self.archive_path, 'r', encoding='utf-8') as f:
-                self.archived_tasks = json.load(f)
-            for task in self.archived_tasks:
-                item_text = f"{task['text']} (Приоритет: {task['priority']}, Категория: {task['category']})"
-                item = QListWidgetItem(item_text)
-                item.setData(Qt.ItemDataRole.UserRole, task)
-                self.list_widget.addItem(item)
+        self.archive_model = ArchiveListModel(self.storage.iterArchive(), self)
+        self.list_view.setModel(self.archive_model)
+        self.archive_model.fetchMore()
+        self.updateCountLabel()
+
+    def updateCountLabel(self):
+        total = 0 if self.archiveCleared else self.storage.archiveCount() - len(self.restored_tasks)
+        self.count_label.setText(f"Задач в архиве: {total}")
 
     def restoreSelected(self):
-        selected_items = self.list_widget.selectedItems()
-        for item in selected_items:
-            task = item.data(Qt.ItemDataRole.UserRole)
-            self.restored_tasks.append(task)
-            row = self.list_widget.row(item)
-            self.list_widget.takeItem(row)
-            self.archived_tasks.remove(task)
+        rows = [index.row() for index in self.list_view.selectionModel().selectedRows()]
+        if rows:
+            self.restored_tasks.extend(self.archive_model.takeRows(rows))
+            self.updateCountLabel()
 
     def clearArchive(self):
         reply = QMessageBox.question(self, "Очистить архив", "Вы уверены, что хотите очистить архив?",
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            self.archived_tasks = []
-            self.list_widget.clear()
+            self.archive_model.clear()
             self.archiveCleared = True
+            self.updateCountLabel()
 
     def getRestoredTasks(self):
         return self.restored_tasks
 
-    def getRemainingTasks(self):
-        return self.archived_tasks
+#############################################
+# Просмотр истории задач: журнал читается в фоновом потоке пачками,
+# модель показывает записи страницами, фильтры применяются при чтении
+#############################################
+HISTORY_ACTIONS = {
+    "added": "Добавлена",
+    "changed": "Изменена",
+    "archived": "Архивирована",
+    "restored": "Восстановлена",
+}
+
+class HistoryLoader(QThread):
+    batchReady = pyqtSignal(int, list)  # поколение загрузки, пачка строк
+    BATCH_SIZE = 500
+
+    def __init__(self, storage, generation, action=None, date_from=None, date_to=None, text="", parent=None):
+        super().__init__(parent)
+        self.storage = storage
+        self.generation = generation  # номер загрузки в диалоге; пачки прежних загрузок отбрасываются
+        self.action = action
+        self.date_from = date_from  # "YYYY-MM-DD" или None
+        self.date_to = date_to
+        self.text = text.lower()
+
+    def matches(self, entry):
+        if self.action is not None and entry.get("action") != self.action:
+            return False
+        day = entry.get("timestamp", "")[:10]
+        if self.date_from is not None and day < self.date_from:
+            return False
+        if self.date_to is not None and day > self.date_to:
+            return False
+        if self.text and self.text not in entry.get("task", {}).get("text", "").lower():
+            return False
+        return True
+
+    def run(self):
+        batch = []
+        for entry in self.storage.iterHistory():
+            if self.isInterruptionRequested():
+                return
+            if self.matches(entry):
+                # В памяти держим только то, что нужно для отображения
+                batch.append((entry.get("timestamp", ""), entry.get("action", ""), entry.get("task", {}).get("text", "")))
+                if len(batch) >= self.BATCH_SIZE:
+                    self.batchReady.emit(self.generation, batch)
+                    batch = []
+        if batch:
+            self.batchReady.emit(self.generation, batch)
+
+class HistoryListModel(QAbstractListModel):
+    PAGE_SIZE = 200
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = []  # всё, что уже прочитано фоновым потоком
+        self.shown = 0     # сколько строк отдано представлению
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.shown
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        timestamp, action, text = self.entries[index.row()]
+        return f"{timestamp.replace('T', ' ')[:19]}  {HISTORY_ACTIONS.get(action, action)} – {text}"
+
+    def clear(self):
+        self.beginResetModel()
+        self.entries = []
+        self.shown = 0
+        self.endResetModel()
+
+    def appendEntries(self, entries):
+        self.entries.extend(entries)
+        if self.shown < self.PAGE_SIZE:
+            self.fetchMore()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.shown < len(self.entries)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(self.PAGE_SIZE, len(self.entries) - self.shown)
+        if count > 0:
+            self.beginInsertRows(QModelIndex(), self.shown, self.shown + count - 1)
+            self.shown += count
+            self.endInsertRows()
+
+class HistoryDialog(QDialog):
+    def __init__(self, storage, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("История задач")
+        self.resize(700, 500)
+        self.storage = storage
+        self.loader = None
+        self.load_generation = 0  # номер текущей загрузки; растёт при каждом reload
+        self.initUI()
+        self.reload()
+
+    def initUI(self):
+        layout = QVBoxLayout()
+        filter_layout = QHBoxLayout()
+        self.action_combo = QComboBox()
+        self.action_combo.addItem("Все действия", None)
+        for action, title in HISTORY_ACTIONS.items():
+            self.action_combo.addItem(title, action)
+        self.action_combo.currentIndexChanged.connect(self.reload)
+        filter_layout.addWidget(self.action_combo)
+
+        self.period_check = QCheckBox("Период:")
+        self.period_check.toggled.connect(self.reload)
+        filter_layout.addWidget(self.period_check)
+        self.date_from = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.date_from.setCalendarPopup(True)
+        self.date_from.dateChanged.connect(self.reload)
+        filter_layout.addWidget(self.date_from)
+        self.date_to = QDateEdit(QDate.currentDate())
+        self.date_to.setCalendarPopup(True)
+        self.date_to.dateChanged.connect(self.reload)
+        filter_layout.addWidget(self.date_to)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Поиск по тексту задачи")
+        filter_layout.addWidget(self.search_edit, 1)
+        layout.addLayout(filter_layout)
+
+        # Поиск по тексту запускаем после паузы в наборе
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.reload)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+
+        self.history_model = HistoryListModel(self)
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setModel(self.history_model)
+        layout.addWidget(self.list_view)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def stopLoader(self):
+        if self.loader is not None:
+            self.loader.batchReady.disconnect()
+            self.loader.finished.disconnect()
+            self.loader.requestInterruption()
+            self.loader.wait()
+            self.loader = None
+
+    def reload(self):
+        self.stopLoader()
+        self.history_model.clear()
+        period = self.period_check.isChecked()
+        self.load_generation += 1
+        self.loader = HistoryLoader(
+            self.storage,
+            self.load_generation,
+            action=self.action_combo.currentData(),
+            date_from=self.date_from.date().toString("yyyy-MM-dd") if period else None,
+            date_to=self.date_to.date().toString("yyyy-MM-dd") if period else None,
+            text=self.search_edit.text().strip(),
+            parent=self
+        )
+        self.loader.batchReady.connect(self.onBatchReady)
+        self.loader.finished.connect(lambda generation=self.load_generation: self.onLoadFinished(generation))
+        self.status_label.setText("Загрузка…")
+        self.loader.start()
+
+    def onBatchReady(self, generation, batch):
+        # Пачка, отправленная прежним потоком до его остановки, может прийти
+        # уже после reload — она относится к другому фильтру
+        if generation != self.load_generation:
+            return
+        self.history_model.appendEntries(batch)
+        self.status_label.setText(f"Загрузка… найдено записей: {len(self.history_model.entries)}")
+
+    def onLoadFinished(self, generation):
+        if generation != self.load_generation:
+            return
+        found = len(self.history_model.entries)
+        self.status_label.setText(f"Найдено записей: {found}" if found else "История пуста.")
+
+    def done(self, result):
+        self.stopLoader()
+        super().done(result)
 
 #############################################
 # 2. Текстовый редактор с поддержкой работы с несколькими файлами,
 #    форматированием, историей версий и функцией поиска
+#
+# Хранилище версий файлов: содержимое адресуется по SHA-256 и хранится
+# сжатым, чаще всего как дельта к предыдущей версии. Для каждого файла ведётся
+# манифест версий; старые версии вычищаются по правилам хранения.
+#############################################
+class VersionStore:
+    def __init__(self, root="file_history", keep_last=20, keep_daily_days=30, max_chain=16):
+        self.root = root
+        self.keep_last = keep_last              # сколько последних версий хранить всегда
+        self.keep_daily_days = keep_daily_days  # за сколько дней хранить по версии на день
+        self.max_chain = max_chain              # после стольких дельт — полная копия
+        self.last_content = None                # (путь, текст) последней версии — только одного файла
+        self.lock = threading.Lock()
+
+    def manifestPath(self, file_path):
+        key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.root, "manifests", key + ".json")
+
+    def objectPath(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def writeFileAtomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def loadManifest(self, file_path):
+        path = self.manifestPath(file_path)
+        if not os.path.exists(path):
+            return {"path": os.path.abspath(file_path), "versions": []}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def listVersions(self, file_path):
+        return self.loadManifest(file_path)["versions"]
+
+    def readObject(self, digest):
+        with open(self.objectPath(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if data[:1] == b"F":
+            return data[1:].decode('utf-8')
+        # Дельта: база, длины общего начала и конца, изменённая середина
+        base = self.readObject(data[1:65].decode('ascii'))
+        prefix, suffix = struct.unpack(">QQ", data[65:81])
+        return base[:prefix] + data[81:].decode('utf-8') + base[len(base) - suffix:]
+
+    @staticmethod
+    def commonAffixes(old, new):
+        # Длины общего начала и конца; сравниваем срезами, двоичным поиском
+        limit = min(len(old), len(new))
+        lo, hi = 0, limit
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if old[:mid] == new[:mid]:
+                lo = mid
+            else:
+                hi = mid - 1
+        prefix = lo
+        lo, hi = 0, limit - prefix
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if old[len(old) - mid:] == new[len(new) - mid:]:
+                lo = mid
+            else:
+                hi = mid - 1
+        return prefix, lo
+
+    def addVersion(self, file_path, content):
+        # Возвращает запись о версии или None, если содержимое не изменилось
+        with self.lock:
+            manifest = self.loadManifest(file_path)
+            versions = manifest["versions"]
+            digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            if versions and versions[-1]["hash"] == digest:
+                return None
+            depth = 0
+            if os.path.exists(self.objectPath(digest)):
+                # Тот же текст уже хранится (возможно, дельтой) — берём настоящую глубину цепочки
+                depth = self.objectDepth(digest)
+            else:
+                payload = b"F" + content.encode('utf-8')
+                if versions and versions[-1]["depth"] < self.max_chain:
+                    previous = versions[-1]
+                    if self.last_content is not None and self.last_content[0] == file_path:
+                        old = self.last_content[1]
+                    else:
+                        old = self.readObject(previous["hash"])
+                    prefix, suffix = self.commonAffixes(old, content)
+                    middle = content[prefix:len(content) - suffix].encode('utf-8')
+                    delta = b"D" + previous["hash"].encode('ascii') + struct.pack(">QQ", prefix, suffix) + middle
+                    if len(delta) < len(payload):
+                        payload = delta
+                        depth = previous["depth"] + 1
+                self.writeFileAtomic(self.objectPath(digest), zlib.compress(payload, 6))
+            version_id = str(time.time_ns())
+            if versions and int(version_id) <= int(versions[-1]["id"]):
+                version_id = str(int(versions[-1]["id"]) + 1)
+            entry = {
+                "id": version_id,
+                "time": datetime.datetime.now().isoformat(),
+                "hash": digest,
+                "size": len(content),
+                "depth": depth
+            }
+            versions.append(entry)
+            evicted = self.applyRetention(manifest)
+            self.writeFileAtomic(self.manifestPath(file_path),
+                                 json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8'))
+            self.last_content = (file_path, content)
+            # Обход всего хранилища — только если объект удалённой версии больше не нужен
+            # оставшимся версиям этого файла (ни сам, ни как база дельты)
+            if evicted and {dropped["hash"] for dropped in evicted} - self.reachable(manifest["versions"]):
+                self.collectGarbage()
+            return entry
+
+    def applyRetention(self, manifest):
+        # Последние keep_last версий плюс последняя версия каждого дня за keep_daily_days;
+        # возвращает удалённые из манифеста записи
+        versions = manifest["versions"]
+        keep = set(range(max(0, len(versions) - self.keep_last), len(versions)))
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=self.keep_daily_days)).isoformat()
+        last_of_day = {}
+        for i, entry in enumerate(versions):
+            if entry["time"] >= cutoff:
+                last_of_day[entry["time"][:10]] = i
+        keep.update(last_of_day.values())
+        if len(keep) == len(versions):
+            return []
+        manifest["versions"] = [entry for i, entry in enumerate(versions) if i in keep]
+        return [entry for i, entry in enumerate(versions) if i not in keep]
+
+    def collectGarbage(self):
+        # Удаляем объекты, на которые не ссылается ни одна версия (с учётом баз дельт)
+        manifests_dir = os.path.join(self.root, "manifests")
+        referenced = set()
+        for name in os.listdir(manifests_dir):
+            if name.endswith(".json"):
+                with open(os.path.join(manifests_dir, name), 'r', encoding='utf-8') as f:
+                    self.reachable(json.load(f)["versions"], referenced)
+        objects_dir = os.path.join(self.root, "objects")
+        for prefix in os.listdir(objects_dir):
+            for digest in os.listdir(os.path.join(objects_dir, prefix)):
+                if digest not in referenced:
+                    os.remove(os.path.join(objects_dir, prefix, digest))
+
+    def reachable(self, versions, referenced=None):
+        # Хэши версий и всех баз их дельт
+        referenced = set() if referenced is None else referenced
+        for entry in versions:
+            digest = entry["hash"]
+            while digest and digest not in referenced:
+                referenced.add(digest)
+                digest = self.objectBase(digest)
+        return referenced
+
+    def objectDepth(self, digest):
+        depth = 0
+        digest = self.objectBase(digest)
+        while digest:
+            depth += 1
+            digest = self.objectBase(digest)
+        return depth
+
+    def objectBase(self, digest):
+        # Распаковываем только заголовок: вид объекта и хэш базы (65 байт)
+        decompressor = zlib.decompressobj()
+        head = b""
+        with open(self.objectPath(digest), 'rb') as f:
+            while len(head) < 65:
+                chunk = f.read(4096)
+                if not chunk:
+                    break
+                head += decompressor.decompress(decompressor.unconsumed_tail + chunk, 65 - len(head))
+        return head[1:65].decode('ascii') if head[:1] == b"D" else None
+
+    def findVersion(self, file_path, version_id):
+        for entry in self.listVersions(file_path):
+            if entry["id"] == version_id:
+                return entry
+        raise KeyError(version_id)
+
+    def restoreVersion(self, file_path, version_id):
+        return self.readObject(self.findVersion(file_path, version_id)["hash"])
+
+    def diffVersions(self, file_path, old_id, new_id=None, new_content=None):
+        # new_id=None — сравнение с переданным текущим текстом
+        old = self.restoreVersion(file_path, old_id).splitlines(keepends=True)
+        new = (new_content if new_id is None else self.restoreVersion(file_path, new_id)).splitlines(keepends=True)
+        # Общие начало и конец отрезаем заранее: difflib медленен на больших файлах
+        prefix, suffix = self.commonAffixes(old, new)
+        start = max(prefix - 3, 0)
+        tail = max(suffix - 3, 0)
+        diff = difflib.unified_diff(
+            old[start:len(old) - tail], new[start:len(new) - tail],
+            fromfile=f"версия {old_id}", tofile="текущая" if new_id is None else f"версия {new_id}")
+        lines = []
+        for line in diff:
+            if line.startswith("@@"):
+                # Возвращаем номерам строк в заголовках блоков смещение отрезанного начала
+                old_range, new_range = line.split()[1:3]
+                line = f"@@ {self.shiftRange(old_range, start)} {self.shiftRange(new_range, start)} @@\n"
+            lines.append(line)
+        return "".join(lines)
+
+    @staticmethod
+    def shiftRange(hunk_range, offset):
+        sign, numbers = hunk_range[0], hunk_range[1:]
+        first, _, count = numbers.partition(",")
+        first = int(first) + offset
+        return f"{sign}{first},{count}" if count else f"{sign}{first}"
+
+class VersionsDialog(QDialog):
+    def __init__(self, store, file_path, current_content, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Версии: {os.path.basename(file_path)}")
+        self.resize(700, 500)
+        self.store = store
+        self.file_path = file_path
+        self.current_content = current_content
+        self.restored_content = None
+        layout = QVBoxLayout()
+        self.list_widget = QListWidget()
+        for entry in reversed(store.listVersions(file_path)):
+            item = QListWidgetItem(f"{entry['time'].replace('T', ' ')[:19]}  ({entry['size']} симв.)")
+            item.setData(Qt.ItemDataRole.UserRole, entry["id"])
+            self.list_widget.addItem(item)
+        self.list_widget.currentItemChanged.connect(self.showDiff)
+        layout.addWidget(self.list_widget, 1)
+        self.diff_view = QPlainTextEdit()
+        self.diff_view.setReadOnly(True)
+        layout.addWidget(self.diff_view, 2)
+        btn_layout = QHBoxLayout()
+        self.restore_button = QPushButton("Восстановить")
+        self.restore_button.clicked.connect(self.restoreSelected)
+        btn_layout.addWidget(self.restore_button)
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.reject)
+        btn_layout.addWidget(close_button)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+    def showDiff(self, item):
+        if item is None:
+            return
+        diff = self.store.diffVersions(self.file_path, item.data(Qt.ItemDataRole.UserRole),
+                                       new_content=self.current_content)
+        self.diff_view.setPlainText(diff or "Версия совпадает с текущим текстом.")
+
+    def restoreSelected(self):
+        item = self.list_widget.currentItem()
+        if item is not None:
+            self.restored_content = self.store.restoreVersion(self.file_path, item.data(Qt.ItemDataRole.UserRole))
+            self.accept()
+
+#############################################
+# Журнал восстановления несохранённых вкладок. Для каждой вкладки — файл JSON Lines:
+# заголовок с исходным файлом (или пустым/сохранённым текстом в качестве базы) и
+# замены диапазонов строк, накопленные с прошлого снимка. Запись и сжатие журнала
+# идут в потоке сохранения, в потоке интерфейса собираются только изменённые строки.
+#############################################
+class RecoveryJournal:
+    def __init__(self, root="recovery", compact_bytes=4 * 1024 * 1024):
+        self.root = root
+        self.compact_bytes = compact_bytes  # журнал больше этого (и половины базы) сворачивается в базу
+        self.persistence = PersistenceService.instance()
+        # Порции записей: [ключ задачи, [(id вкладки, запись), ...]]; запись None — удалить журнал.
+        # Очередь склеивает задачи с одинаковым ключом и выполняет их в порядке первой постановки
+        self.chunks = []
+        self.lock = threading.Lock()
+        self.job_key = os.path.join(root, f"journal-{id(self):x}")
+
+    def journalPath(self, tab_id):
+        return os.path.join(self.root, tab_id + ".jsonl")
+
+    def basePath(self, tab_id):
+        return os.path.join(self.root, tab_id + ".base")
+
+    def open(self, tab_id, title, file_path=None, base_text=None):
+        # База — исходный файл, переданный текст или пустой документ
+        header = {"op": "header", "title": title, "path": file_path, "time": datetime.datetime.now().isoformat()}
+        if base_text is not None:
+            header["base"] = "text"
+            header["text"] = base_text
+        else:
+            header["base"] = "file" if file_path else "empty"
+        if file_path:
+            # Размер и время изменения файла снимаются в потоке сохранения уже после
+            # отложенной записи этого файла: заголовок и всё, что за ним, — в новой
+            # порции со свежим ключом, она встанет в очередь позади сохранения
+            with self.lock:
+                self.chunks.append([f"{self.job_key}#{uuid.uuid4().hex}", []])
+        self.append(tab_id, header)
+
+    def splice(self, tab_id, start, end, lines):
+        # Строки [start, end) прошлого снимка заменяются на lines
+        self.append(tab_id, {"op": "splice", "start": start, "end": end, "lines": lines})
+
+    def discard(self, tab_id):
+        self.append(tab_id, None)
+
+    def append(self, tab_id, record):
+        with self.lock:
+            if not self.chunks:
+                self.chunks.append([self.job_key, []])
+            self.chunks[-1][1].append((tab_id, record))
+
+    def flush(self):
+        with self.lock:
+            keys = [key for key, records in self.chunks if records]
+        for key in keys:
+            self.persistence.submit(key, lambda key=key: self.writePending(key))
+
+    def writePending(self, key):
+        with self.lock:
+            pending = []
+            for chunk in self.chunks:
+                if chunk[0] == key:
+                    pending, chunk[1] = chunk[1], []
+            # В закрытые порции (кроме последней) больше ничего не добавляется
+            self.chunks = [chunk for chunk in self.chunks[:-1] if chunk[1]] + self.chunks[-1:]
+        os.makedirs(self.root, exist_ok=True)
+        touched = []
+        for tab_id, record in pending:
+            path = self.journalPath(tab_id)
+            if record is None:
+                for stale in (path, self.basePath(tab_id)):
+                    if os.path.exists(stale):
+                        os.remove(stale)
+                continue
+            if record["op"] == "header":
+                record = self.writeHeader(tab_id, record)
+                mode = 'w'
+            else:
+                mode = 'a'
+            with open(path, mode, encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if tab_id not in touched:
+                touched.append(tab_id)
+        for tab_id in touched:
+            path = self.journalPath(tab_id)
+            if not os.path.exists(path):
+                continue
+            header = self.readHeader(path)
+            if os.path.getsize(path) > max(self.compact_bytes, header.get("size", 0) // 2):
+                self.compact(tab_id, header)
+
+    def writeHeader(self, tab_id, header):
+        header = dict(header)
+        if header["base"] == "text":
+            text = header.pop("text")
+            self.writeBase(tab_id, text)
+            header["size"] = len(text)
+        elif header["base"] == "file":
+            # Изменённый после открытия вкладки файл уже не годится в базу
+            try:
+                stat = os.stat(header["path"])
+            except OSError:
+                stat = None
+            header["size"] = stat.st_size if stat else -1
+            header["mtime"] = stat.st_mtime_ns if stat else -1
+        return header
+
+    def writeBase(self, tab_id, text):
+        tmp_path = self.basePath(tab_id) + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.basePath(tab_id))
+
+    def compact(self, tab_id, header):
+        # Текущий текст становится новой базой, журнал — одним заголовком
+        text = self.readText(tab_id)
+        if text is None:
+            return
+        header = dict(header, base="text", text=text)
+        header.pop("mtime", None)
+        header = self.writeHeader(tab_id, header)
+        path = self.journalPath(tab_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def readHeader(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.loads(f.readline())
+
+    def entries(self):
+        # Журналы, оставшиеся от прошлого запуска: id, заголовок вкладки, путь к файлу
+        if not os.path.isdir(self.root):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith(".jsonl"):
+                continue
+            tab_id = name[:-len(".jsonl")]
+            try:
+                header = self.readHeader(self.journalPath(tab_id))
+            except (OSError, ValueError):
+                continue
+            result.append(dict(header, id=tab_id))
+        return result
+
+    def readText(self, tab_id):
+        # Восстанавливает текст вкладки; None — журнал повреждён или база изменилась
+        try:
+            with open(self.journalPath(tab_id), 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                lines = self.readBase(tab_id, header)
+                if lines is None:
+                    return None
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # недописанная при сбое последняя строка
+                    lines[record["start"]:record["end"]] = record["lines"]
+        except (OSError, ValueError):
+            return None
+        return "\n".join(lines)
+
+    def readBase(self, tab_id, header):
+        if header["base"] == "empty":
+            return [""]
+        if header["base"] == "text":
+            path = self.basePath(tab_id)
+        else:
+            path = header["path"]
+            stat = os.stat(path)
+            if stat.st_size != header["size"] or stat.st_mtime_ns != header["mtime"]:
+                return None
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read().split("\n")
+
+class LargeFileReader(QThread):
+    chunkRead = pyqtSignal(str, int)  # текст из целых строк, прочитано байт
+    CHUNK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, file_path, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        # Не даём потоку убегать вперёд интерфейса больше чем на две порции
+        self.slots = QSemaphore(2)
+
+    def chunkConsumed(self):
+        self.slots.release()
+
+    def iterBlocks(self, f):
+        # Через mmap, если возможно (пустые и особые файлы отображать нельзя)
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            while True:
+                block = f.read(self.CHUNK_SIZE)
+                if not block:
+                    return
+                yield block
+        else:
+            with mapped:
+                for pos in range(0, len(mapped), self.CHUNK_SIZE):
+                    yield mapped[pos:pos + self.CHUNK_SIZE]
+
+    def run(self):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        remainder = ""
+        done = 0
+        with open(self.file_path, 'rb') as f:
+            for block in self.iterBlocks(f):
+                if self.isInterruptionRequested():
+                    return
+                done += len(block)
+                text = remainder + decoder.decode(block)
+                # Отдаём только целые строки, хвост переносим в следующую порцию
+                cut = text.rfind("\n")
+                if cut < 0:
+                    remainder = text
+                    continue
+                remainder = text[cut + 1:]
+                self.slots.acquire()
+                self.chunkRead.emit(text[:cut], done)
+        self.slots.acquire()
+        self.chunkRead.emit(remainder + decoder.decode(b"", final=True), done)
+
+#############################################
+# Поиск по вкладкам редактора: выполняется в фоновом потоке по снимкам текста,
+# результаты подсвечиваются через ExtraSelections порциями, чтобы не блокировать ввод
 #############################################
+def compileSearchPattern(text, regex=False, case_sensitive=False, whole_word=False):
+    pattern = text if regex else re.escape(text)
+    if whole_word:
+        pattern = rf"\b(?:{pattern})\b"
+    return re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+
+ASTRAL_CHAR = re.compile("[\U00010000-\U0010ffff]")
+
+class SearchWorker(QThread):
+    tabSearched = pyqtSignal(object, list)  # ключ вкладки, список (начало, конец)
+
+    def __init__(self, pattern, snapshots, parent=None):
+        super().__init__(parent)
+        self.pattern = pattern
+        self.snapshots = snapshots  # список (ключ вкладки, текст)
+
+    def run(self):
+        with Instrumentation.instance().measure("editor.search"):
+            self.searchSnapshots()
+
+    def searchSnapshots(self):
+        for key, text in self.snapshots:
+            spans = []
+            for match in self.pattern.finditer(text):
+                if match.end() == match.start():
+                    continue
+                spans.append((match.start(), match.end()))
+                if len(spans) % 1000 == 0 and self.isInterruptionRequested():
+                    return
+            if self.isInterruptionRequested():
+                return
+            self.tabSearched.emit(key, self.toDocumentPositions(text, spans))
+
+    @staticmethod
+    def toDocumentPositions(text, spans):
+        # Позиции в документе Qt считаются в UTF-16: символы вне BMP занимают две позиции
+        if not spans or text.isascii() or max(text) <= "\uffff":
+            return spans
+        astral = [match.start() for match in ASTRAL_CHAR.finditer(text)]
+        return [(start + bisect.bisect_left(astral, start), end + bisect.bisect_left(astral, end))
+                for start, end in spans]
+
+class FindPanel(QWidget):
+    HIGHLIGHT_BATCH = 2000
+    MAX_HIGHLIGHTS = 20000
+
+    def __init__(self, editor_widget, parent=None):
+        super().__init__(parent)
+        self.editor_widget = editor_widget  # MultiFileTextEditor
+        self.worker = None
+        self.results = {}    # ключ вкладки -> (ревизия документа, позиции совпадений)
+        self.snapshots = {}  # ключ вкладки -> (ревизия документа, текст)
+        self.pending_highlights = []
+        self.highlights = []
+        self.highlighted_tab = None
+        self.initUI()
+
+    def initUI(self):
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        row = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Найти")
+        self.search_edit.returnPressed.connect(self.findNext)
+        row.addWidget(self.search_edit, 1)
+        self.case_check = QCheckBox("Учитывать регистр")
+        self.word_check = QCheckBox("Слово целиком")
+        self.regex_check = QCheckBox("Регулярное выражение")
+        for check in (self.case_check, self.word_check, self.regex_check):
+            check.toggled.connect(self.scheduleSearch)
+            row.addWidget(check)
+        prev_button = QPushButton("Назад")
+        prev_button.clicked.connect(self.findPrevious)
+        row.addWidget(prev_button)
+        next_button = QPushButton("Далее")
+        next_button.clicked.connect(self.findNext)
+        row.addWidget(next_button)
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.closePanel)
+        row.addWidget(close_button)
+        layout.addLayout(row)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        self.results_list = QListWidget()
+        self.results_list.setMaximumHeight(100)
+        self.results_list.itemClicked.connect(self.activateResult)
+        layout.addWidget(self.results_list)
+        self.setLayout(layout)
+
+        # Поиск по мере набора, после короткой паузы
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.startSearch)
+        self.search_edit.textChanged.connect(self.scheduleSearch)
+
+        self.highlight_timer = QTimer(self)
+        self.highlight_timer.setInterval(0)
+        self.highlight_timer.timeout.connect(self.highlightBatch)
+
+    def editors(self):
+        tabs = self.editor_widget.tab_widget
+        for index in range(tabs.count()):
+            editor = tabs.widget(index)
+            if isinstance(editor, EditorTab) and not editor.loading:
+                yield index, editor
+
+    def openPanel(self):
+        self.show()
+        self.search_edit.setFocus()
+        self.search_edit.selectAll()
+        self.scheduleSearch()
+
+    def closePanel(self):
+        self.stopWorker()
+        self.clearHighlights()
+        self.hide()
+
+    def scheduleSearch(self):
+        self.search_timer.start()
+
+    def stopWorker(self):
+        if self.worker is not None:
+            self.worker.tabSearched.disconnect()
+            self.worker.requestInterruption()
+            self.worker.wait()
+            self.worker.deleteLater()
+            self.worker = None
+
+    def snapshot(self, editor):
+        # Текст вкладки берём заново, только если документ изменился
+        revision = editor.revision()
+        cached = self.snapshots.get(id(editor))
+        if cached is None or cached[0] != revision:
+            cached = (revision, editor.plainText())
+            self.snapshots[id(editor)] = cached
+        return cached
+
+    def startSearch(self):
+        self.stopWorker()
+        self.results = {}
+        self.results_list.clear()
+        self.clearHighlights()
+        text = self.search_edit.text()
+        if not text:
+            self.status_label.clear()
+            return
+        try:
+            pattern = compileSearchPattern(text, self.regex_check.isChecked(),
+                                           self.case_check.isChecked(), self.word_check.isChecked())
+        except re.error as e:
+            self.status_label.setText(f"Ошибка в выражении: {e}")
+            return
+        live = set()
+        snapshots = []
+        current = self.editor_widget.currentEditor()
+        # Текущая вкладка ищется первой, чтобы её подсветка появилась сразу
+        for _, editor in sorted(self.editors(), key=lambda pair: pair[1] is not current):
+            revision, content = self.snapshot(editor)
+            snapshots.append((id(editor), content))
+            live.add(id(editor))
+        self.snapshots = {key: value for key, value in self.snapshots.items() if key in live}
+        self.status_label.setText("Поиск…")
+        self.worker = SearchWorker(pattern, snapshots, self)
+        self.worker.tabSearched.connect(self.onTabSearched)
+        self.worker.finished.connect(self.onSearchFinished)
+        self.worker.start()
+
+    def onTabSearched(self, key, spans):
+        self.results[key] = (self.snapshots[key][0], spans)
+        self.updateResultsList()
+        current = self.editor_widget.currentEditor()
+        if current is not None and id(current) == key:
+            self.highlightEditor(current)
+
+    def onSearchFinished(self):
+        if self.sender() is not self.worker:
+            return
+        total = sum(len(spans) for _, spans in self.results.values())
+        self.status_label.setText(f"Совпадений: {total}" if total else "Текст не найден.")
+
+    def updateResultsList(self):
+        self.results_list.clear()
+        for index, editor in self.editors():
+            result = self.results.get(id(editor))
+            if result and result[1]:
+                item = QListWidgetItem(f"{self.editor_widget.tab_widget.tabText(index)}: {len(result[1])}")
+                item.setData(Qt.ItemDataRole.UserRole, index)
+                self.results_list.addItem(item)
+
+    def activateResult(self, item):
+        self.editor_widget.tab_widget.setCurrentIndex(item.data(Qt.ItemDataRole.UserRole))
+
+    def currentSpans(self, editor):
+        result = self.results.get(id(editor))
+        if result is None or result[0] != editor.revision():
+            return None
+        return result[1]
+
+    def onCurrentTabChanged(self):
+        if not self.isVisible():
+            return
+        editor = self.editor_widget.currentEditor()
+        self.clearHighlights()
+        if editor is not None and self.currentSpans(editor) is not None:
+            self.highlightEditor(editor)
+        elif self.search_edit.text():
+            self.scheduleSearch()
+
+    def clearHighlights(self):
+        self.highlight_timer.stop()
+        self.pending_highlights = []
+        self.highlights = []
+        if self.highlighted_tab is not None:
+            self.highlighted_tab.text_edit.setExtraSelections([])
+            self.highlighted_tab = None
+
+    def highlightEditor(self, editor):
+        self.clearHighlights()
+        self.highlighted_tab = editor
+        self.pending_highlights = list(self.currentSpans(editor) or [])[:self.MAX_HIGHLIGHTS]
+        self.highlight_timer.start()
+
+    def highlightBatch(self):
+        editor = self.highlighted_tab
+        if editor is None or not self.pending_highlights:
+            self.highlight_timer.stop()
+            return
+        batch = self.pending_highlights[:self.HIGHLIGHT_BATCH]
+        del self.pending_highlights[:self.HIGHLIGHT_BATCH]
+        fmt = QTextCharFormat()
+        fmt.setBackground(QColor("#ffe680"))
+        document = editor.text_edit.document()
+        for start, end in batch:
+            selection = QTextEdit.ExtraSelection()
+            cursor = QTextCursor(document)
+            cursor.setPosition(start)
+            cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+            selection.cursor = cursor
+            selection.format = fmt
+            self.highlights.append(selection)
+        editor.text_edit.setExtraSelections(self.highlights)
+
+    def findNext(self):
+        self.jump(forward=True)
+
+    def findPrevious(self):
+        self.jump(forward=False)
+
+    def jump(self, forward):
+        editor = self.editor_widget.currentEditor()
+        spans = self.currentSpans(editor) if editor is not None else None
+        if not spans:
+            return
+        cursor = editor.text_edit.textCursor()
+        if forward:
+            pos = bisect.bisect_left(spans, (cursor.selectionEnd(),))
+            start, end = spans[pos % len(spans)]
+        else:
+            pos = bisect.bisect_left(spans, (cursor.selectionStart(),)) - 1
+            start, end = spans[pos]
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        editor.text_edit.setTextCursor(cursor)
+        editor.text_edit.ensureCursorVisible()
+
 class EditorTab(QWidget):
-    def __init__(self, file_path=None, content=""):
+    def __init__(self, file_path=None, content="", large=False, read_only=False):
         super().__init__()
         self.file_path = file_path
-        self.text_edit = QTextEdit()
-        self.text_edit.setPlainText(content)
+        self.large = large          # режим больших файлов: простой текст, чтение порциями
+        self.read_only = read_only
+        self.loading = False
+        # Спящая вкладка: документ выгружен, остались путь к файлу (или файл подкачки
+        # с несохранённым текстом) и позиция курсора и прокрутки
+        self.hibernated = False
+        self.hibernations = 0
+        self.swap_path = None
+        self.swap_html = False
+        self.saved_state = None  # (позиция курсора, прокрутка по X, по Y, был ли изменён)
+        self.last_active = time.monotonic()
         layout = QVBoxLayout()
+        if large:
+            self.text_edit = QPlainTextEdit()
+            self.text_edit.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+            self.progress_bar = QProgressBar()
+            self.progress_bar.setFormat("Загрузка… %p%")
+            self.progress_bar.hide()
+            layout.addWidget(self.progress_bar)
+        else:
+            self.text_edit = QTextEdit()
+        self.text_edit.setPlainText(content)
+        self.text_edit.setReadOnly(read_only)
         layout.addWidget(self.text_edit)
         self.setLayout(layout)
+        # Журнал восстановления: блоки [dirty_head, blockCount - dirty_tail) изменены
+        # с прошлого снимка, journal_blocks — число блоков в том снимке
+        self.journal_id = uuid.uuid4().hex
+        self.journal_open = False
+        self.journal_blocks = self.text_edit.document().blockCount()
+        self.dirty_head = None
+        self.dirty_tail = 0
+        self.text_edit.document().contentsChange.connect(self.onContentsChange)
+
+    def isRichText(self):
+        return isinstance(self.text_edit, QTextEdit)
+
+    def loadLargeFile(self):
+        self.loading = True
+        self.progress_bar.show()
+        self.text_edit.setReadOnly(True)
+        self.text_edit.setUndoRedoEnabled(False)
+        self.progress_bar.setRange(0, max(os.path.getsize(self.file_path), 1))
+        self.reader = LargeFileReader(self.file_path, self)
+        self.reader.chunkRead.connect(self.onChunkRead)
+        self.reader.finished.connect(self.onLoadFinished)
+        self.reader.start()
+
+    def onChunkRead(self, text, done):
+        self.text_edit.appendPlainText(text)
+        self.progress_bar.setValue(done)
+        self.reader.chunkConsumed()
+
+    def onLoadFinished(self):
+        self.loading = False
+        self.progress_bar.hide()
+        self.text_edit.setUndoRedoEnabled(True)
+        self.text_edit.setReadOnly(self.read_only)
+        self.text_edit.moveCursor(self.text_edit.textCursor().MoveOperation.Start)
+        self.text_edit.document().setModified(False)
+        self.journal_blocks = self.text_edit.document().blockCount()
+        if self.saved_state is not None:
+            # Вкладка просыпалась: позицию восстанавливаем после дочитывания файла
+            self.restoreViewState()
+
+    def stopLoading(self):
+        if self.loading:
+            self.reader.requestInterruption()
+            self.reader.chunkConsumed()
+            self.reader.wait()
+
+    def onContentsChange(self, position, removed, added):
+        # Загрузка файла и выгрузка/пробуждение вкладки текст не меняют
+        if self.loading or self.text_edit.signalsBlocked():
+            return
+        document = self.text_edit.document()
+        first = document.findBlock(position).blockNumber()
+        last = document.findBlock(min(position + added, document.characterCount() - 1)).blockNumber()
+        tail = document.blockCount() - 1 - last
+        if self.dirty_head is None:
+            self.dirty_head, self.dirty_tail = first, tail
+        else:
+            self.dirty_head = min(self.dirty_head, first)
+            self.dirty_tail = min(self.dirty_tail, tail)
+
+    def snapshotTo(self, journal, title):
+        # В журнал уходят только строки, изменённые с прошлого снимка
+        if self.dirty_head is None or self.loading or self.hibernated:
+            return False
+        document = self.text_edit.document()
+        count = document.blockCount()
+        head = self.dirty_head
+        end = max(count - self.dirty_tail, head)
+        lines = []
+        block = document.findBlockByNumber(head)
+        for _ in range(end - head):
+            lines.append(block.text())
+            block = block.next()
+        if not self.journal_open:
+            journal.open(self.journal_id, title, self.file_path)
+            self.journal_open = True
+        journal.splice(self.journal_id, head, max(self.journal_blocks - self.dirty_tail, head), lines)
+        self.journal_blocks = count
+        self.dirty_head = None
+        self.dirty_tail = 0
+        return True
+
+    def startJournal(self, journal, title, text):
+        # Восстановленная вкладка: база журнала — сам восстановленный текст
+        journal.open(self.journal_id, title, self.file_path, base_text=text)
+        self.journal_open = True
+        self.journal_blocks = self.text_edit.document().blockCount()
+
+    def resetJournal(self, journal):
+        if self.journal_open:
+            journal.discard(self.journal_id)
+            self.journal_open = False
+        self.journal_blocks = self.text_edit.document().blockCount()
+        self.dirty_head = None
+        self.dirty_tail = 0
+
+    def revision(self):
+        # У спящей вкладки своя «ревизия», чтобы кэш снимков поиска не спутал её с документом
+        return -self.hibernations if self.hibernated else self.text_edit.document().revision()
+
+    def plainText(self):
+        if not self.hibernated:
+            return self.text_edit.toPlainText()
+        if self.swap_path is not None:
+            content = PersistenceService.instance().readText(self.swap_path, "")
+            if self.swap_html:
+                document = QTextDocument()
+                document.setHtml(content)
+                return document.toPlainText()
+            return content
+        return self.readFile() or ""
+
+    def readFile(self):
+        if self.file_path is None:
+            return None
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def memoryEstimate(self):
+        # Грубая оценка: символы документа в UTF-16
+        return 0 if self.hibernated else self.text_edit.document().characterCount() * 2
+
+    def hibernate(self, swap_path):
+        # Выгружает документ. Несохранённый текст уходит в файл подкачки;
+        # неизменённый файл просто перечитается при пробуждении
+        if self.hibernated or self.loading:
+            return False
+        document = self.text_edit.document()
+        modified = document.isModified()
+        if modified or self.file_path is None:
+            if not document.isEmpty():
+                self.swap_html = self.isRichText()
+                content = self.text_edit.toHtml() if self.swap_html else self.text_edit.toPlainText()
+                PersistenceService.instance().writeText(swap_path, content)
+                self.swap_path = swap_path
+        elif not (os.path.isfile(self.file_path) and os.access(self.file_path, os.R_OK)):
+            return False  # файл пропал или не читается — держим текст в памяти
+        self.saved_state = (self.text_edit.textCursor().position(),
+                            self.text_edit.horizontalScrollBar().value(),
+                            self.text_edit.verticalScrollBar().value(), modified)
+        self.text_edit.blockSignals(True)
+        self.text_edit.clear()
+        self.text_edit.blockSignals(False)
+        document.clearUndoRedoStacks()
+        document.setModified(False)
+        self.hibernated = True
+        self.hibernations += 1
+        return True
+
+    def wake(self):
+        if not self.hibernated:
+            return
+        self.hibernated = False
+        self.text_edit.blockSignals(True)
+        if self.swap_path is not None:
+            persistence = PersistenceService.instance()
+            content = persistence.readText(self.swap_path, "")
+            if self.swap_html:
+                self.text_edit.setHtml(content)
+            else:
+                self.text_edit.setPlainText(content)
+            persistence.removeFile(self.swap_path)
+            self.swap_path = None
+            self.text_edit.blockSignals(False)
+        elif self.file_path is not None and self.large:
+            self.text_edit.blockSignals(False)
+            self.loadLargeFile()
+            return  # позиция восстановится в onLoadFinished
+        elif self.file_path is not None:
+            self.text_edit.setPlainText(self.readFile() or "")
+            self.text_edit.blockSignals(False)
+        else:
+            self.text_edit.blockSignals(False)
+        self.restoreViewState()
+
+    def restoreViewState(self):
+        position, scroll_x, scroll_y, modified = self.saved_state
+        self.saved_state = None
+        document = self.text_edit.document()
+        document.clearUndoRedoStacks()
+        document.setModified(modified)
+        cursor = self.text_edit.textCursor()
+        cursor.setPosition(min(position, max(document.characterCount() - 1, 0)))
+        self.text_edit.setTextCursor(cursor)
+        self.text_edit.horizontalScrollBar().setValue(scroll_x)
+        self.text_edit.verticalScrollBar().setValue(scroll_y)
+
+    def discardSwap(self):
+        if self.swap_path is not None:
+            PersistenceService.instance().removeFile(self.swap_path)
+            self.swap_path = None
 
 class MultiFileTextEditor(QWidget):
+    fileSaved = pyqtSignal(str, str)  # путь, содержимое
+
     def __init__(self):
         super().__init__()
+        self.persistence = PersistenceService.instance()
+        # Сервис сообщает о записи из своего потока; сигнал доставит это в поток GUI
+        self.write_notifier = WriteNotifier(self)
+        self.write_notifier.writeFinished.connect(self.onWriteFinished)
+        # Ссылка на слушателя хранится: при каждом обращении к сигналу создаётся
+        # новый связанный объект, и removeListener его бы не нашёл
+        self.write_listener = self.write_notifier.writeFinished.emit
+        self.persistence.addListener(self.write_listener)
+        self.version_store = VersionStore()
+        # Выгрузка фоновых вкладок: после простоя или сверх бюджета памяти, начиная
+        # с давно не открывавшихся. Текст изменённых вкладок — в файлах подкачки
+        settings = self.persistence.readJson("settings.json", {}) or {}
+        self.swap_dir = "editor_swap"
+        self.idle_seconds = settings.get("editor_idle_minutes", 10) * 60
+        self.memory_budget = settings.get("editor_memory_budget_mb", 200) * 1024 * 1024
+        self.clearStaleSwap()
         self.initUI()
+        self.hibernate_timer = QTimer(self)
+        self.hibernate_timer.setInterval(30000)
+        self.hibernate_timer.timeout.connect(self.hibernateIdleTabs)
+        self.hibernate_timer.start()
+        # Несохранённые правки раз в пару секунд дописываются в журнал восстановления
+        self.recovery = RecoveryJournal()
+        self.recovery_timer = QTimer(self)
+        self.recovery_timer.setInterval(2000)
+        self.recovery_timer.timeout.connect(self.snapshotTabs)
+        self.recovery_timer.start()
 
     def initUI(self):
         layout = QVBoxLayout()
@@ -398,6 +2193,10 @@ class MultiFileTextEditor(QWidget):
         find_action.triggered.connect(self.findText)
         self.toolbar.addAction(find_action)
 
+        versions_action = QAction("Версии", self)
+        versions_action.triggered.connect(self.showVersions)
+        self.toolbar.addAction(versions_action)
+
         self.font_combo = QFontComboBox()
         self.font_combo.currentFontChanged.connect(self.changeFont)
         self.toolbar.addWidget(self.font_combo)
@@ -412,6 +2211,14 @@ class MultiFileTextEditor(QWidget):
 
         self.tab_widget = QTabWidget()
         layout.addWidget(self.tab_widget)
+
+        self.find_panel = FindPanel(self)
+        self.find_panel.hide()
+        # Сначала будим вкладку, потом панель поиска подсвечивает её текст
+        self.active_editor = None
+        self.tab_widget.currentChanged.connect(self.onCurrentTabChanged)
+        self.tab_widget.currentChanged.connect(self.find_panel.onCurrentTabChanged)
+        layout.addWidget(self.find_panel)
         self.setLayout(layout)
 
         # Создаем первую вкладку по умолчанию
@@ -423,6 +2230,105 @@ class MultiFileTextEditor(QWidget):
             return current_widget
         return None
 
+    def stopBackgroundWork(self):
+        self.persistence.removeListener(self.write_listener)
+        self.find_panel.stopWorker()
+        self.hibernate_timer.stop()
+        self.recovery_timer.stop()
+        for index in range(self.tab_widget.count()):
+            editor = self.tab_widget.widget(index)
+            if isinstance(editor, EditorTab):
+                editor.stopLoading()
+                editor.discardSwap()
+                # Штатный выход: журнал нужен только после сбоя
+                editor.resetJournal(self.recovery)
+        self.recovery.flush()
+
+    def snapshotTabs(self):
+        with Instrumentation.instance().measure("editor.recovery"):
+            for editor in self.editors():
+                editor.snapshotTo(self.recovery, self.tab_widget.tabText(self.tab_widget.indexOf(editor)))
+            self.recovery.flush()
+
+    def restoreTab(self, entry, text):
+        settings = self.persistence.readJson("settings.json", {}) or {}
+        large = len(text) >= settings.get("large_file_threshold_mb", 10) * 1024 * 1024
+        editor = EditorTab(file_path=entry["path"], content=text, large=large)
+        editor.startJournal(self.recovery, entry["title"], text)
+        editor.text_edit.document().setModified(True)
+        index = self.tab_widget.addTab(editor, entry["title"])
+        self.tab_widget.setTabToolTip(index, f"Восстановлено после сбоя ({entry['time'][:16].replace('T', ' ')})")
+        self.tab_widget.setCurrentIndex(index)
+        self.recovery.flush()
+
+    def editors(self):
+        return [editor for editor in (self.tab_widget.widget(index) for index in range(self.tab_widget.count()))
+                if isinstance(editor, EditorTab)]
+
+    def onCurrentTabChanged(self):
+        now = time.monotonic()
+        # Простой вкладки отсчитывается с момента, когда с неё ушли
+        if self.active_editor is not None:
+            self.active_editor.last_active = now
+        editor = self.currentEditor()
+        self.active_editor = editor
+        if editor is not None:
+            editor.last_active = now
+            if editor.hibernated:
+                editor.wake()
+                self.setTabHibernated(editor, False)
+        self.enforceMemoryBudget()
+
+    def hibernateTab(self, editor):
+        if editor is self.currentEditor():
+            return False
+        swap_path = os.path.join(self.swap_dir, f"{uuid.uuid4().hex}.swap")
+        # Файлы подкачки удаляются при запуске, поэтому перед выгрузкой дописываем журнал
+        editor.snapshotTo(self.recovery, self.tab_widget.tabText(self.tab_widget.indexOf(editor)))
+        self.recovery.flush()
+        if not editor.hibernate(swap_path):
+            return False
+        self.setTabHibernated(editor, True)
+        Instrumentation.instance().count("editor.hibernated")
+        return True
+
+    def setTabHibernated(self, editor, hibernated):
+        index = self.tab_widget.indexOf(editor)
+        if index >= 0:
+            self.tab_widget.setTabToolTip(index, "Выгружена из памяти, откроется при выборе" if hibernated else "")
+
+    def hibernateIdleTabs(self):
+        now = time.monotonic()
+        for editor in self.editors():
+            if not editor.hibernated and now - editor.last_active >= self.idle_seconds:
+                self.hibernateTab(editor)
+
+    def enforceMemoryBudget(self):
+        editors = self.editors()
+        total = sum(editor.memoryEstimate() for editor in editors)
+        if total <= self.memory_budget:
+            return
+        for editor in sorted(editors, key=lambda editor: editor.last_active):
+            if total <= self.memory_budget:
+                break
+            estimate = editor.memoryEstimate()
+            if estimate and self.hibernateTab(editor):
+                total -= estimate
+
+    def clearStaleSwap(self):
+        # Файлы подкачки нужны только пока приложение работает
+        if os.path.isdir(self.swap_dir):
+            for name in os.listdir(self.swap_dir):
+                if name.endswith(".swap"):
+                    self.persistence.removeFile(os.path.join(self.swap_dir, name))
+
+    def currentRichEditor(self):
+        # Форматирование доступно только во вкладках с QTextEdit
+        editor = self.currentEditor()
+        if editor and editor.isRichText() and not editor.read_only:
+            return editor
+        return None
+
     def newFile(self):
         editor = EditorTab()
         index = self.tab_widget.addTab(editor, "Безымянный")
@@ -431,14 +2337,42 @@ class MultiFileTextEditor(QWidget):
     def openFile(self):
         file_name, _ = QFileDialog.getOpenFileName(self, "Открыть файл", "", "Text Files (*.txt);;All Files (*)")
         if file_name:
+            self.openPath(file_name)
+
+    def openPath(self, file_name):
+        # Уже открытый файл просто делаем текущим
+        for index in range(self.tab_widget.count()):
+            editor = self.tab_widget.widget(index)
+            if editor.file_path and os.path.abspath(editor.file_path) == os.path.abspath(file_name):
+                self.tab_widget.setCurrentIndex(index)
+                return
+        if os.path.exists(file_name):
+            with Instrumentation.instance().measure("editor.open"):
+                self.openNewTab(file_name)
+
+    def openNewTab(self, file_name):
+        settings = self.persistence.readJson("settings.json", {}) or {}
+        threshold = settings.get("large_file_threshold_mb", 10) * 1024 * 1024
+        title = os.path.basename(file_name)
+        if os.path.getsize(file_name) >= threshold:
+            # Большой файл: простой текстовый виджет и чтение порциями в фоне
+            read_only = settings.get("large_file_read_only", False)
+            editor = EditorTab(file_path=file_name, large=True, read_only=read_only)
+            if read_only:
+                title += " (только чтение)"
+            editor.loadLargeFile()
+        else:
             with open(file_name, 'r', encoding='utf-8') as f:
                 content = f.read()
             editor = EditorTab(file_path=file_name, content=content)
-            index = self.tab_widget.addTab(editor, os.path.basename(file_name))
-            self.tab_widget.setCurrentIndex(index)
+        index = self.tab_widget.addTab(editor, title)
+        self.tab_widget.setCurrentIndex(index)
 
     def saveFile(self):
         editor = self.currentEditor()
+        if editor and (editor.loading or editor.read_only):
+            QMessageBox.information(self, "Сохранение", "Файл открыт только для чтения или ещё загружается.")
+            return
         if editor:
             if editor.file_path is None:
                 file_name, _ = QFileDialog.getSaveFileName(self, "Сохранить файл", "", "Text Files (*.txt);;All Files (*)")
@@ -448,21 +2382,51 @@ class MultiFileTextEditor(QWidget):
                 else:
                     return
             content = editor.text_edit.toPlainText()
-            with open(editor.file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            self.persistence.writeText(editor.file_path, content)
             self.saveVersion(editor.file_path, content)
+            editor.text_edit.document().setModified(False)
+            editor.resetJournal(self.recovery)
+            self.recovery.flush()
+            self.fileSaved.emit(editor.file_path, content)
 
     def saveVersion(self, file_path, content):
-        history_dir = "file_history"
-        os.makedirs(history_dir, exist_ok=True)
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        base = os.path.basename(file_path)
-        backup_file = os.path.join(history_dir, f"{base}_{timestamp}.txt")
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # Хэширование, дельта и сжатие выполняются в потоке сохранения
+        instrumentation = Instrumentation.instance()
+        instrumentation.count("editor.saveVersion.requested")
 
-    def changeFont(self, font: QFont):
+        def addVersion():
+            with instrumentation.measure("editor.saveVersion"):
+                self.version_store.addVersion(file_path, content)
+
+        # Ключ у каждого сохранения свой: очередь склеивает задачи с одним ключом,
+        # а промежуточные версии терять нельзя
+        self.persistence.submit(f"{self.version_store.manifestPath(file_path)}#{uuid.uuid4().hex}", addVersion)
+
+    def showVersions(self):
         editor = self.currentEditor()
+        if editor is None or editor.file_path is None:
+            return
+        # Дожидаемся версий, ещё стоящих в очереди на запись
+        self.persistence.flush()
+        if not self.version_store.listVersions(editor.file_path):
+            QMessageBox.information(self, "Версии", "Для этого файла ещё нет сохранённых версий.")
+            return
+        dialog = VersionsDialog(self.version_store, editor.file_path, editor.text_edit.toPlainText(), self)
+        if dialog.exec() == QDialog.DialogCode.Accepted and dialog.restored_content is not None:
+            editor.text_edit.setPlainText(dialog.restored_content)
+
+    def onWriteFinished(self, path, ok):
+        # Сообщаем об ошибке, только если файл открыт в одной из вкладок
+        if ok:
+            return
+        for index in range(self.tab_widget.count()):
+            editor = self.tab_widget.widget(index)
+            if isinstance(editor, EditorTab) and editor.file_path == path:
+                QMessageBox.warning(self, "Сохранение", f"Не удалось сохранить файл:\n{path}")
+                return
+
+    def changeFont(self, font: QFont):
+        editor = self.currentRichEditor()
         if editor:
             cursor = editor.text_edit.textCursor()
             if not cursor.hasSelection():
@@ -474,12 +2438,12 @@ class MultiFileTextEditor(QWidget):
             size_int = int(size)
         except ValueError:
             return
-        editor = self.currentEditor()
+        editor = self.currentRichEditor()
         if editor:
             editor.text_edit.setFontPointSize(size_int)
 
     def setBold(self):
-        editor = self.currentEditor()
+        editor = self.currentRichEditor()
         if editor:
             fmt = editor.text_edit.currentCharFormat()
             weight = QFont.Weight.Bold if fmt.fontWeight() != QFont.Weight.Bold else QFont.Weight.Normal
@@ -487,39 +2451,39 @@ class MultiFileTextEditor(QWidget):
             editor.text_edit.mergeCurrentCharFormat(fmt)
 
     def setItalic(self):
-        editor = self.currentEditor()
+        editor = self.currentRichEditor()
         if editor:
             fmt = editor.text_edit.currentCharFormat()
             fmt.setFontItalic(not fmt.fontItalic())
             editor.text_edit.mergeCurrentCharFormat(fmt)
 
     def setUnderline(self):
-        editor = self.currentEditor()
+        editor = self.currentRichEditor()
         if editor:
             fmt = editor.text_edit.currentCharFormat()
             fmt.setFontUnderline(not fmt.fontUnderline())
             editor.text_edit.mergeCurrentCharFormat(fmt)
 
     def findText(self):
-        editor = self.currentEditor()
-        if editor:
-            text, ok = QInputDialog.getText(self, "Найти", "Введите текст для поиска:")
-            if ok and text:
-                # Перемещаем курсор в начало документа и ищем текст
-                editor.text_edit.moveCursor(editor.text_edit.textCursor().MoveOperation.Start)
-                found = editor.text_edit.find(text)
-                if not found:
-                    QMessageBox.information(self, "Найти", "Текст не найден.")
+        self.find_panel.openPanel()
 
 #############################################
 # 3. Органайзер заметок с возможностью создания, редактирования,
 #    удаления и добавления заметок из быстрой заметки
 #############################################
 class NotesOrganizer(QWidget):
+    noteSaved = pyqtSignal(dict)   # заметка записана (для поискового индекса)
+    noteDeleted = pyqtSignal(int)  # id удалённой заметки
+
     def __init__(self):
         super().__init__()
-        self.notes_file = "notes.json"
-        self.notes = []  # список заметок (каждая заметка — словарь с ключами "title" и "content")
+        # Хранение, кэш текстов и учёт изменений — в omnidesk_core.NoteRepository
+        self.repository = NoteRepository(".")
+        self.notes = self.repository.notes  # только "id" и "title"
+        # Заметка в редакторе и ревизия документа, текст которой уже забран в кэш
+        self.editor_note_id = None
+        self.editor_revision = None
+        self.loader = None  # фоновая загрузка списка заметок, пока она идёт
         self.initUI()
         self.loadNotes()
 
@@ -550,14 +2514,15 @@ class NotesOrganizer(QWidget):
         layout.addLayout(editor_layout, 2)
         self.setLayout(layout)
 
+        settings = PersistenceService.instance().readJson("settings.json", {}) or {}
         self.autosave_timer = QTimer()
-        self.autosave_timer.setInterval(1000)
+        self.autosave_timer.setInterval(settings.get("autosave_interval", 1000))
         self.autosave_timer.setSingleShot(True)
         self.autosave_timer.timeout.connect(self.saveNotes)
 
     def newNote(self):
-        new_note = {"title": "Без названия", "content": ""}
-        self.notes.append(new_note)
+        self.ensureLoaded()
+        new_note = self.repository.create("Без названия")
         self.list_widget.addItem(new_note["title"])
         self.list_widget.setCurrentRow(self.list_widget.count() - 1)
         self.loadNoteIntoEditor(self.list_widget.currentItem())
@@ -566,56 +2531,136 @@ class NotesOrganizer(QWidget):
     def deleteNote(self):
         row = self.list_widget.currentRow()
         if row >= 0:
-            self.notes.pop(row)
+            self.flushEditor()
+            note_id = self.notes[row]["id"]
+            self.repository.delete(note_id)
             self.list_widget.takeItem(row)
             self.clearEditor()
             self.saveNotes()
+            self.noteDeleted.emit(note_id)
 
     def loadNoteIntoEditor(self, item):
         row = self.list_widget.row(item)
         if 0 <= row < len(self.notes):
+            # Текст предыдущей заметки забираем до того, как редактор перезаписан
+            self.flushEditor()
             note = self.notes[row]
             self.title_edit.setText(note["title"])
             self.text_edit.blockSignals(True)
-            self.text_edit.setPlainText(note["content"])
+            self.text_edit.setPlainText(self.repository.body(note["id"]))
             self.text_edit.blockSignals(False)
+            self.editor_note_id = note["id"]
+            self.editor_revision = self.text_edit.document().revision()
 
     def updateCurrentNoteTitle(self):
         row = self.list_widget.currentRow()
         if 0 <= row < len(self.notes):
             new_title = self.title_edit.text()
-            self.notes[row]["title"] = new_title
+            self.repository.rename(self.notes[row], new_title)
             self.list_widget.currentItem().setText(new_title)
             self.saveNotes()
 
     def autoSaveNote(self):
-        row = self.list_widget.currentRow()
-        if 0 <= row < len(self.notes):
-            self.notes[row]["content"] = self.text_edit.toPlainText()
-        self.autosave_timer.start()
+        # На каждое нажатие только перезапускаем таймер; текст извлекается при сохранении
+        if self.editor_note_id is not None:
+            self.autosave_timer.start()
+
+    def flushEditor(self):
+        if self.editor_note_id is None:
+            return
+        revision = self.text_edit.document().revision()
+        if revision != self.editor_revision:
+            self.repository.setBody(self.editor_note_id, self.text_edit.toPlainText())
+            self.editor_revision = revision
+
+    def noteBody(self, note_id):
+        return self.repository.body(note_id)
+
+    def iterNotes(self):
+        self.ensureLoaded()
+        return self.repository.iterNotes()
 
     def clearEditor(self):
+        # Без сигналов: иначе очистка попадёт в соседнюю заметку, ставшую текущей
         self.title_edit.clear()
+        self.text_edit.blockSignals(True)
         self.text_edit.clear()
+        self.text_edit.blockSignals(False)
+        self.editor_note_id = None
+        self.editor_revision = None
 
     def saveNotes(self):
-        with open(self.notes_file, 'w', encoding='utf-8') as f:
-            json.dump(self.notes, f, ensure_ascii=False, indent=4)
+        with Instrumentation.instance().measure("notes.save"):
+            self.flushEditor()
+            saved = self.repository.save()
+        for note in saved:
+            self.noteSaved.emit(note)
 
     def loadNotes(self):
-        if os.path.exists(self.notes_file):
-            with open(self.notes_file, 'r', encoding='utf-8') as f:
-                self.notes = json.load(f)
-            self.list_widget.clear()
-            for note in self.notes:
-                self.list_widget.addItem(note["title"])
+        # Список заголовков (и однократный перенос notes.json) читается в фоне
+        self.list_widget.clear()
+        self.list_widget.addItem("Загрузка заметок…")
+        self.list_widget.setEnabled(False)
+        self.new_note_button.setEnabled(False)
+        self.loader = DataLoader(self.repository.load, self)
+        self.loader.loaded.connect(self.onNotesLoaded)
+        self.loader.start()
+
+    def ensureLoaded(self):
+        if self.loader is not None:
+            self.loader.wait()
+            self.onNotesLoaded(self.loader.result)
+
+    def onNotesLoaded(self, notes):
+        if self.loader is None:
+            return  # уже применено через ensureLoaded
+        self.loader = None
+        self.list_widget.clear()
+        self.list_widget.setEnabled(True)
+        self.new_note_button.setEnabled(True)
+        with Instrumentation.instance().measure("notes.show"):
+            self.list_widget.addItems([note["title"] for note in notes])
+        StartupProfiler.instance().mark("данные: заметки")
+
+    def applySyncedNote(self, note_id, title, content, deleted):
+        # Изменение заметки, полученное синхронизацией; возвращает локальный id
+        self.ensureLoaded()
+        row = self.repository.rowOf(note_id)
+        if deleted:
+            if row is not None:
+                if note_id == self.editor_note_id:
+                    self.clearEditor()
+                self.repository.delete(note_id)
+                self.list_widget.takeItem(row)
+                self.saveNotes()
+                self.noteDeleted.emit(note_id)
+            return note_id
+        if row is None:
+            note = self.repository.create(title, content)
+            self.list_widget.addItem(title)
+        else:
+            note = self.notes[row]
+            self.repository.rename(note, title)
+            self.repository.setBody(note["id"], content)
+            self.list_widget.item(row).setText(title)
+        if note["id"] == self.editor_note_id:
+            self.title_edit.setText(title)
+            self.text_edit.blockSignals(True)
+            self.text_edit.setPlainText(content)
+            self.text_edit.blockSignals(False)
+            self.editor_revision = self.text_edit.document().revision()
+        self.saveNotes()
+        return note["id"]
+
+    def addNote(self, title, content):
+        self.ensureLoaded()
+        self.repository.create(title, content)
+        self.list_widget.addItem(title)
+        self.saveNotes()
 
     def addNoteFromQuick(self, content):
         # Добавляем новую заметку с содержимым из быстрой заметки
-        new_note = {"title": "Быстрая заметка", "content": content}
-        self.notes.append(new_note)
-        self.list_widget.addItem(new_note["title"])
-        self.saveNotes()
+        self.addNote("Быстрая заметка", content)
         QMessageBox.information(self, "Заметки", "Быстрая заметка добавлена в заметки.")
 
 #############################################
@@ -666,6 +2711,21 @@ class SettingsDialog(QDialog):
         self.language_combo = QComboBox()
         self.language_combo.addItems(["Русский", "English"])
         layout.addRow("Язык интерфейса:", self.language_combo)
+        self.storage_combo = QComboBox()
+        self.storage_combo.addItem("JSON-файлы", "json")
+        self.storage_combo.addItem("SQLite", "sqlite")
+        layout.addRow("Хранилище задач (после перезапуска):", self.storage_combo)
+        self.large_file_threshold_edit = QLineEdit()
+        layout.addRow("Большие файлы открывать порциями от (МБ):", self.large_file_threshold_edit)
+        self.large_file_read_only_check = QCheckBox("Открывать большие файлы только для чтения")
+        layout.addRow("", self.large_file_read_only_check)
+        self.editor_idle_edit = QLineEdit()
+        layout.addRow("Выгружать неактивные вкладки через (мин):", self.editor_idle_edit)
+        self.editor_budget_edit = QLineEdit()
+        layout.addRow("Память под открытые вкладки (МБ):", self.editor_budget_edit)
+        self.sync_dir_edit = QLineEdit()
+        self.sync_dir_edit.setPlaceholderText("Общая папка, например в облачном диске")
+        layout.addRow("Папка синхронизации:", self.sync_dir_edit)
         buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         buttons.accepted.connect(self.accept)
         buttons.rejected.connect(self.reject)
@@ -673,33 +2733,217 @@ class SettingsDialog(QDialog):
         self.setLayout(layout)
 
     def loadSettings(self):
-        if os.path.exists(self.settings_file):
-            with open(self.settings_file, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
+        settings = PersistenceService.instance().readJson(self.settings_file)
+        if settings is not None:
             self.autosave_interval_edit.setText(str(settings.get("autosave_interval", 1000)))
             self.default_save_path_edit.setText(settings.get("default_save_path", ""))
             lang = settings.get("language", "Русский")
             index = self.language_combo.findText(lang)
             if index >= 0:
                 self.language_combo.setCurrentIndex(index)
+            index = self.storage_combo.findData(settings.get("storage_backend", "json"))
+            self.storage_combo.setCurrentIndex(max(index, 0))
+            self.large_file_threshold_edit.setText(str(settings.get("large_file_threshold_mb", 10)))
+            self.large_file_read_only_check.setChecked(settings.get("large_file_read_only", False))
+            self.editor_idle_edit.setText(str(settings.get("editor_idle_minutes", 10)))
+            self.editor_budget_edit.setText(str(settings.get("editor_memory_budget_mb", 200)))
+            self.sync_dir_edit.setText(settings.get("sync_dir", ""))
         else:
             self.autosave_interval_edit.setText("1000")
             self.default_save_path_edit.setText("")
             self.language_combo.setCurrentIndex(0)
+            self.storage_combo.setCurrentIndex(0)
+            self.large_file_threshold_edit.setText("10")
+            self.large_file_read_only_check.setChecked(False)
+            self.editor_idle_edit.setText("10")
+            self.editor_budget_edit.setText("200")
+            self.sync_dir_edit.setText("")
 
     def getSettings(self):
         return {
             "autosave_interval": int(self.autosave_interval_edit.text()),
             "default_save_path": self.default_save_path_edit.text(),
-            "language": self.language_combo.currentText()
+            "language": self.language_combo.currentText(),
+            "storage_backend": self.storage_combo.currentData(),
+            "large_file_threshold_mb": int(self.large_file_threshold_edit.text()),
+            "large_file_read_only": self.large_file_read_only_check.isChecked(),
+            "editor_idle_minutes": int(self.editor_idle_edit.text()),
+            "editor_memory_budget_mb": int(self.editor_budget_edit.text()),
+            "sync_dir": self.sync_dir_edit.text()
         }
 
     def accept(self):
         settings = self.getSettings()
-        with open(self.settings_file, 'w', encoding='utf-8') as f:
-            json.dump(settings, f, ensure_ascii=False, indent=4)
+        PersistenceService.instance().writeJson(self.settings_file, settings)
         super().accept()
 
+SEARCH_KINDS = {
+    "note": "Заметка",
+    "task": "Задача",
+    "archive": "Архив",
+    "file": "Файл",
+}
+
+class QuickSearchDialog(QDialog):
+    resultActivated = pyqtSignal(str, str)  # id документа, вид
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Быстрый поиск")
+        self.resize(600, 400)
+        self.index = index
+        layout = QVBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Поиск по заметкам, задачам и файлам")
+        self.search_edit.textChanged.connect(self.runSearch)
+        self.search_edit.returnPressed.connect(self.activateCurrent)
+        layout.addWidget(self.search_edit)
+        self.results_list = QListWidget()
+        self.results_list.itemActivated.connect(self.activateItem)
+        layout.addWidget(self.results_list)
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        self.setLayout(layout)
+
+    def runSearch(self, text):
+        started = time.perf_counter()
+        with Instrumentation.instance().measure("search.query"):
+            results = self.index.search(text)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.results_list.clear()
+        for doc_id, kind, title, _ in results:
+            item = QListWidgetItem(f"[{SEARCH_KINDS.get(kind, kind)}] {title}")
+            item.setData(Qt.ItemDataRole.UserRole, (doc_id, kind))
+            self.results_list.addItem(item)
+        if results:
+            self.results_list.setCurrentRow(0)
+        self.status_label.setText(f"Найдено: {len(results)} ({elapsed:.1f} мс)" if text.strip() else "")
+
+    def activateCurrent(self):
+        item = self.results_list.currentItem()
+        if item is not None:
+            self.activateItem(item)
+
+    def activateItem(self, item):
+        doc_id, kind = item.data(Qt.ItemDataRole.UserRole)
+        self.resultActivated.emit(doc_id, kind)
+        self.accept()
+
+#############################################
+# Диагностика: пульс цикла событий (на сколько опоздал таймер — столько
+# интерфейс не отвечал), периодические выборки памяти и окно с процентилями
+# замеров. Работает, только пока включён сбор показателей.
+#############################################
+class DiagnosticsMonitor(QObject):
+    def __init__(self, interval=100, memory_every=10, stall_ms=100, parent=None):
+        super().__init__(parent)
+        self.instrumentation = Instrumentation.instance()
+        self.interval = interval          # период пульса, мс
+        self.memory_every = memory_every  # память снимается раз в столько пульсов
+        self.stall_ms = stall_ms          # задержка, начиная с которой считаем подвисание
+        self.ticks = 0
+        self.last = None
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.onHeartbeat)
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def onHeartbeat(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self.last - self.interval / 1000)
+        self.last = now
+        self.instrumentation.record("eventloop.lag", now - lag, lag)
+        if lag * 1000 >= self.stall_ms:
+            self.instrumentation.count("eventloop.stalls")
+        self.ticks += 1
+        if self.ticks % self.memory_every == 0:
+            self.instrumentation.sampleMemory()
+
+class DiagnosticsDialog(QDialog):
+    COLUMNS = ["Операция", "Замеров", "p50, мс", "p90, мс", "p99, мс", "Макс., мс"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Диагностика")
+        self.resize(700, 450)
+        self.instrumentation = Instrumentation.instance()
+        layout = QVBoxLayout()
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+        self.counters_label = QLabel()
+        self.counters_label.setWordWrap(True)
+        layout.addWidget(self.counters_label)
+
+        btn_layout = QHBoxLayout()
+        reset_button = QPushButton("Сбросить")
+        reset_button.clicked.connect(self.resetStats)
+        btn_layout.addWidget(reset_button)
+        export_button = QPushButton("Экспорт трассы…")
+        export_button.clicked.connect(self.exportTrace)
+        btn_layout.addWidget(export_button)
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.accept)
+        btn_layout.addWidget(close_button)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+        # Показатели обновляются раз в секунду, пока окно открыто
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+        self.refresh()
+
+    def refresh(self):
+        summary = self.instrumentation.summary()
+        self.status_label.setText("Сбор показателей включён." if self.instrumentation.enabled else
+                                  "Сбор показателей выключен (Диагностика → Сбор показателей).")
+        timings = sorted(summary["timings"].items())
+        self.table.setRowCount(len(timings))
+        for row, (name, stats) in enumerate(timings):
+            values = [name, stats["count"], stats["p50_ms"], stats["p90_ms"], stats["p99_ms"], stats["max_ms"]]
+            for column, value in enumerate(values):
+                text = value if isinstance(value, str) else (f"{value:.2f}" if isinstance(value, float) else str(value))
+                self.table.setItem(row, column, QTableWidgetItem(text))
+        lines = [f"{name}: {value}" for name, value in sorted(summary["counters"].items())]
+        gauges = summary["gauges"]
+        if "memory.current" in gauges:
+            lines.append(f"Память (tracemalloc): {gauges['memory.current'] / 1048576:.1f} МБ, "
+                         f"пик {gauges.get('memory.peak', 0) / 1048576:.1f} МБ")
+        self.counters_label.setText("\n".join(lines))
+
+    def resetStats(self):
+        self.instrumentation.reset()
+        self.refresh()
+
+    def exportTrace(self):
+        exportDiagnosticsTrace(self)
+
+def exportDiagnosticsTrace(parent):
+    file_name, _ = QFileDialog.getSaveFileName(parent, "Экспорт трассы", "omnidesk_trace.json",
+                                               "JSON Files (*.json)")
+    if not file_name:
+        return
+    try:
+        count = Instrumentation.instance().exportTrace(file_name)
+    except OSError as e:
+        QMessageBox.warning(parent, "Диагностика", f"Не удалось сохранить трассу:\n{e}")
+        return
+    QMessageBox.information(parent, "Диагностика", f"Трасса сохранена, событий: {count}.\n"
+                                                   "Открыть её можно в chrome://tracing или Perfetto.")
+
 #############################################
 # 6. Главное окно – объединяет все режимы, без переключения тем,
 #    с переупорядоченными вкладками: «Заметки», «Список дел», «Текстовый редактор»
@@ -714,17 +2958,172 @@ class MainWindow(QMainWindow):
 
     def initUI(self):
         self.tab_widget = QTabWidget()
-        # Изменён порядок вкладок: сначала Заметки, затем Список дел и Текстовый редактор
-        self.notes_organizer = NotesOrganizer()
-        self.todo_tab = TodoTab()
-        self.text_editor = MultiFileTextEditor()
-
-        self.tab_widget.addTab(self.notes_organizer, "Заметки")
-        self.tab_widget.addTab(self.todo_tab, "Список дел")
-        self.tab_widget.addTab(self.text_editor, "Текстовый редактор")
+        # Изменён порядок вкладок: сначала Заметки, затем Список дел и Текстовый редактор.
+        # Вкладка создаётся при первом показе (или первом обращении), до этого — заглушка
+        self.tab_specs = [("notes", "Заметки", NotesOrganizer),
+                          ("todo", "Список дел", TodoTab),
+                          ("editor", "Текстовый редактор", MultiFileTextEditor)]
+        self.tabs = {}
+        for key, title, _ in self.tab_specs:
+            self.tab_widget.addTab(QLabel("Загрузка…", alignment=Qt.AlignmentFlag.AlignCenter), title)
 
         self.setCentralWidget(self.tab_widget)
+        self.diagnostics_monitor = DiagnosticsMonitor(parent=self)
         self.createMenu()
+        self.initSearchIndex()
+        self.initSync()
+        self.ensureTab(self.tab_specs[0][0])
+        self.tab_widget.currentChanged.connect(lambda index: self.ensureTab(self.tab_specs[index][0]))
+        self.tab_widget.installEventFilter(self)
+        QTimer.singleShot(0, self.offerRecovery)
+
+    def ensureTab(self, key):
+        widget = self.tabs.get(key)
+        if widget is not None:
+            return widget
+        index = next(index for index, spec in enumerate(self.tab_specs) if spec[0] == key)
+        _, title, factory = self.tab_specs[index]
+        widget = factory()
+        self.tabs[key] = widget
+        self.connectTab(key, widget)
+        # Замена заглушки не должна снова вызывать ensureTab через currentChanged
+        current = self.tab_widget.currentIndex()
+        self.tab_widget.blockSignals(True)
+        placeholder = self.tab_widget.widget(index)
+        self.tab_widget.removeTab(index)
+        self.tab_widget.insertTab(index, widget, title)
+        self.tab_widget.setCurrentIndex(current)
+        self.tab_widget.blockSignals(False)
+        placeholder.deleteLater()
+        StartupProfiler.instance().mark(f"вкладка: {title}")
+        return widget
+
+    def offerRecovery(self):
+        # Журналы восстановления остаются только после аварийного завершения
+        journal = RecoveryJournal()
+        entries = journal.entries()
+        if not entries:
+            return
+        titles = "\n".join(entry["title"] for entry in entries[:10])
+        answer = QMessageBox.question(
+            self, "Восстановление",
+            f"Прошлый сеанс завершился аварийно. Восстановить несохранённые вкладки редактора ({len(entries)})?\n\n{titles}")
+        if answer == QMessageBox.StandardButton.Yes:
+            editor = self.editorTab()
+            failed = []
+            for entry in entries:
+                text = journal.readText(entry["id"])
+                if text is None:
+                    failed.append(entry["title"])
+                elif text or entry["path"]:
+                    editor.restoreTab(entry, text)
+            self.tab_widget.setCurrentWidget(editor)
+            if failed:
+                QMessageBox.warning(self, "Восстановление",
+                                    "Не удалось восстановить (исходный файл изменился или журнал повреждён):\n"
+                                    + "\n".join(failed))
+        for entry in entries:
+            journal.discard(entry["id"])
+        journal.flush()
+
+    def notesTab(self):
+        return self.ensureTab("notes")
+
+    def todoTab(self):
+        return self.ensureTab("todo")
+
+    def editorTab(self):
+        return self.ensureTab("editor")
+
+    def connectTab(self, key, widget):
+        # Поисковый индекс и синхронизация подписываются на вкладку при её создании
+        if key == "notes":
+            widget.noteSaved.connect(self.indexNote)
+            widget.noteDeleted.connect(self.unindexNote)
+            widget.noteSaved.connect(
+                lambda note: self.sync_engine.record("note", note["id"], {"title": note["title"], "content": note["content"]}))
+            widget.noteDeleted.connect(
+                lambda note_id: self.sync_engine.record("note", note_id, None, deleted=True))
+        elif key == "todo":
+            widget.tasksChanged.connect(self.indexTasks)
+            widget.tasksChanged.connect(self.recordTasks)
+            widget.historyLogged.connect(
+                lambda entry: self.sync_engine.record("history", None, dict(entry, task=dict(entry["task"]))))
+        elif key == "editor":
+            widget.fileSaved.connect(self.indexFile)
+
+    def eventFilter(self, obj, event):
+        if obj is self.tab_widget and event.type() == QEvent.Type.Paint:
+            StartupProfiler.instance().mark("первая отрисовка")
+            self.tab_widget.removeEventFilter(self)
+        return super().eventFilter(obj, event)
+
+    def initSearchIndex(self):
+        # Индекс загружается с диска при первом обращении и сохраняется с задержкой
+        self.search_index = FullTextIndex("search_index.json.gz")
+        self.index_save_timer = QTimer(self)
+        self.index_save_timer.setSingleShot(True)
+        self.index_save_timer.setInterval(2000)
+        self.index_save_timer.timeout.connect(self.search_index.save)
+
+    def indexNote(self, note):
+        self.search_index.update(f"note:{note['id']}", "note", note["title"], note["content"])
+        self.index_save_timer.start()
+
+    def unindexNote(self, note_id):
+        self.search_index.remove(f"note:{note_id}")
+        self.index_save_timer.start()
+
+    def indexTasks(self, change, tasks):
+        for task in tasks:
+            doc_id = f"task:{task['id']}"
+            if change == "deleted":
+                self.search_index.remove(doc_id)
+            else:
+                self.search_index.update(doc_id, change, task["text"],
+                                         f"{task.get('category', '')} {task.get('priority', '')}")
+        self.index_save_timer.start()
+
+    def indexFile(self, path, content):
+        self.search_index.update(f"file:{os.path.abspath(path)}", "file", os.path.basename(path), content)
+        self.index_save_timer.start()
+
+    def rebuildSearchIndex(self):
+        # Полное построение — только если индекса на диске ещё нет
+        self.todoTab().ensureLoaded()
+        for note in self.notesTab().iterNotes():
+            self.search_index.update(f"note:{note['id']}", "note", note["title"], note["content"])
+        self.indexTasks("task", self.todoTab().task_model.tasks)
+        self.indexTasks("archive", list(self.todoTab().storage.iterArchive()))
+        self.search_index.save()
+
+    def openQuickSearch(self):
+        if self.search_index.isEmpty():
+            self.rebuildSearchIndex()
+        dialog = QuickSearchDialog(self.search_index, self)
+        dialog.resultActivated.connect(self.openSearchResult)
+        dialog.exec()
+
+    def openSearchResult(self, doc_id, kind):
+        key = doc_id.split(":", 1)[1]
+        if kind == "note":
+            self.tab_widget.setCurrentWidget(self.notesTab())
+            self.notesTab().ensureLoaded()
+            for row, note in enumerate(self.notesTab().notes):
+                if str(note["id"]) == key:
+                    self.notesTab().list_widget.setCurrentRow(row)
+                    self.notesTab().loadNoteIntoEditor(self.notesTab().list_widget.item(row))
+                    break
+        elif kind == "task":
+            self.tab_widget.setCurrentWidget(self.todoTab())
+            self.todoTab().ensureLoaded()
+            self.todoTab().selectTask(int(key))
+        elif kind == "archive":
+            self.tab_widget.setCurrentWidget(self.todoTab())
+            self.todoTab().openArchiveDialog()
+        elif kind == "file":
+            self.tab_widget.setCurrentWidget(self.editorTab())
+            self.editorTab().openPath(key)
 
     def createMenu(self):
         menubar = self.menuBar()
@@ -739,24 +3138,149 @@ class MainWindow(QMainWindow):
         sync_action.triggered.connect(self.syncData)
         sync_menu.addAction(sync_action)
 
+        search_menu = menubar.addMenu("Поиск")
+        search_action = QAction("Быстрый поиск", self)
+        search_action.setShortcut(QKeySequence("Ctrl+K"))
+        search_action.triggered.connect(self.openQuickSearch)
+        search_menu.addAction(search_action)
+
         quick_menu = menubar.addMenu("Быстрая заметка")
         quick_action = QAction("Открыть быструю заметку", self)
         quick_action.triggered.connect(self.openQuickNote)
         quick_menu.addAction(quick_action)
 
+        diagnostics_menu = menubar.addMenu("Диагностика")
+        self.diagnostics_action = QAction("Сбор показателей", self)
+        self.diagnostics_action.setCheckable(True)
+        self.diagnostics_action.toggled.connect(self.setDiagnosticsEnabled)
+        diagnostics_menu.addAction(self.diagnostics_action)
+        stats_action = QAction("Показатели…", self)
+        stats_action.triggered.connect(self.openDiagnostics)
+        diagnostics_menu.addAction(stats_action)
+        trace_action = QAction("Экспорт трассы…", self)
+        trace_action.triggered.connect(lambda: exportDiagnosticsTrace(self))
+        diagnostics_menu.addAction(trace_action)
+        # Сбор мог быть включён при запуске (--diagnostics)
+        self.diagnostics_action.setChecked(Instrumentation.instance().enabled)
+
+    def setDiagnosticsEnabled(self, enabled):
+        instrumentation = Instrumentation.instance()
+        if enabled:
+            instrumentation.enable()
+            self.diagnostics_monitor.start()
+        else:
+            self.diagnostics_monitor.stop()
+            instrumentation.disable()
+
+    def openDiagnostics(self):
+        DiagnosticsDialog(self).exec()
+
     def openSettings(self):
         dialog = SettingsDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             settings = dialog.getSettings()
-            self.notes_organizer.autosave_timer.setInterval(settings.get("autosave_interval", 1000))
+            if "notes" in self.tabs:
+                self.tabs["notes"].autosave_timer.setInterval(settings.get("autosave_interval", 1000))
+            if "editor" in self.tabs:
+                editor = self.tabs["editor"]
+                editor.idle_seconds = settings["editor_idle_minutes"] * 60
+                editor.memory_budget = settings["editor_memory_budget_mb"] * 1024 * 1024
+                editor.enforceMemoryBudget()
+
+    def closeEvent(self, event):
+        # Несозданные вкладки не создаём; незавершённую фоновую загрузку дожидаемся
+        if "editor" in self.tabs:
+            self.tabs["editor"].stopBackgroundWork()
+        if "todo" in self.tabs:
+            self.tabs["todo"].ensureLoaded()
+        if "notes" in self.tabs:
+            self.tabs["notes"].ensureLoaded()
+            # Правки, которые ещё ждут таймера автосохранения
+            self.tabs["notes"].saveNotes()
+        self.sync_engine.saveState()
+        self.search_index.save()
+        super().closeEvent(event)
+
+    def initSync(self):
+        # Локальные изменения попадают в outbox сразу, отправляются при syncData
+        self.sync_engine = SyncEngine("sync")
+
+    def recordTasks(self, location, tasks):
+        self.sync_engine.recordMany(
+            ("task", task["id"], {"location": location, "task": taskToDict(task)}, location == "deleted")
+            for task in tasks)
+
+    def iterSeedRecords(self):
+        # Всё, что было на устройстве до первой синхронизации: задачи, архив, история, заметки
+        todo = self.todoTab()
+        for task in todo.task_model.tasks:
+            yield "task", task.id, {"location": "task", "task": taskToDict(task)}, False
+        for task in todo.storage.iterArchive():
+            if task.get("id") is not None:
+                yield "task", task["id"], {"location": "archive", "task": taskToDict(task)}, False
+        for entry in todo.storage.iterHistory():
+            yield "history", None, dict(entry, task=dict(entry["task"])), False
+        for note in self.notesTab().iterNotes():
+            yield "note", note["id"], {"title": note["title"], "content": note["content"]}, False
+
+    def applySyncChange(self, change, conflict):
+        kind = change["kind"]
+        data = change["data"]
+        if kind == "history":
+            self.todoTab().storage.logHistory(data)
+            return None
+        local_id = self.sync_engine.localId(kind, change["uid"])
+        if change["deleted"] and local_id is None:
+            return None  # запись создана и удалена на другом устройстве, здесь её не было
+        if kind == "task":
+            task = dict(data["task"])
+            task.pop("id", None)
+            if local_id is not None:
+                task["id"] = local_id
+            return self.todoTab().applySyncedTask(task, data["location"])
+        if conflict and local_id is not None:
+            # Проигравшую локальную версию заметки не теряем — сохраняем копией.
+            # Копию делает только проигравшее устройство, поэтому она одна.
+            title = next((note["title"] for note in self.notesTab().notes if note["id"] == local_id), None)
+            content = self.notesTab().noteBody(local_id) if title is not None else None
+            if title is not None and (change["deleted"] or (title, content) != (data["title"], data["content"])):
+                self.sync_conflicts.append({"title": title, "content": content})
+        if change["deleted"]:
+            return self.notesTab().applySyncedNote(local_id, None, None, True)
+        return self.notesTab().applySyncedNote(local_id, data["title"], data["content"], False)
 
     def syncData(self):
-        QMessageBox.information(self, "Синхронизация", "Синхронизация данных завершена.")
+        settings = PersistenceService.instance().readJson("settings.json", {}) or {}
+        sync_dir = settings.get("sync_dir")
+        if not sync_dir:
+            QMessageBox.information(self, "Синхронизация", "Укажите папку синхронизации в настройках.")
+            return
+        self.todoTab().ensureLoaded()
+        self.notesTab().ensureLoaded()
+        self.notesTab().saveNotes()
+        self.sync_conflicts = []
+        if not self.sync_engine.seeded:
+            # До загрузки чужих изменений, иначе они вернулись бы на сервер как свои
+            self.sync_engine.seed(self.iterSeedRecords())
+        try:
+            server = FileSyncServer(sync_dir)
+            received = self.sync_engine.pull(server, self.applySyncChange)
+            for note in self.sync_conflicts:
+                self.notesTab().addNote(f"{note['title']} (конфликт)", note["content"])
+            sent = self.sync_engine.push(server)
+        except (OSError, ValueError) as e:
+            # Неотправленное остаётся в outbox, загрузка продолжится с сохранённого курсора
+            QMessageBox.warning(self, "Синхронизация", f"Синхронизация прервана: {e}")
+            return
+        message = f"Синхронизация завершена.\nПолучено изменений: {received}\nОтправлено: {sent}"
+        if self.sync_conflicts:
+            message += f"\nКонфликтов заметок: {len(self.sync_conflicts)} (сохранены копии)"
+        QMessageBox.information(self, "Синхронизация", message)
 
     def openQuickNote(self):
         if self.quick_note_widget is None:
             # Передаем callback для добавления заметки в NotesOrganizer
-            self.quick_note_widget = QuickNoteWidget(self.notes_organizer.addNoteFromQuick, self)
+            self.quick_note_widget = QuickNoteWidget(self.notesTab().addNoteFromQuick, self)
         self.quick_note_widget.show()
         self.quick_note_widget.raise_()
         self.quick_note_widget.activateWindow()
@@ -765,9 +3289,18 @@ def main():
     app = QApplication(sys.argv)
     # Применяем стиль Fusion
     app.setStyle("Fusion")
+    settings = PersistenceService.instance().readJson("settings.json", {}) or {}
+    if "--diagnostics" in sys.argv or os.environ.get("OMNIDESK_DIAGNOSTICS") or settings.get("diagnostics"):
+        Instrumentation.instance().enable()
+    profiler = StartupProfiler.instance()
+    profiler.mark("импорт модулей", at=STARTUP_IMPORTED)
     window = MainWindow()
+    profiler.mark("создание окна")
     window.show()
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    # Перед выходом дописываем на диск всё, что ещё в очереди
+    PersistenceService.instance().shutdown()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,377 @@
+#############################################
+# Замеры производительности OmniDesk на синтетических данных.
+# Для каждого размера (число задач) создаётся отдельный каталог с tasks.json,
+# сегментированным архивом, журналом истории, notes.json и большим текстовым
+# файлом, после чего замеряются загрузка, сохранение и фильтр списка дел,
+# запись истории, архивирование и восстановление, загрузка и автосохранение
+# заметок, открытие файла и поиск в редакторе.
+#
+# Qt запускается без окна (QT_QPA_PLATFORM=offscreen), результаты пишутся
+# в JSON, который можно сравнить с прошлым прогоном:
+#
+#   python benchmarks/run_benchmarks.py --sizes 1000,10000 --output new.json
+#   python benchmarks/run_benchmarks.py --output new.json --compare old.json
+#############################################
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from PyQt6.QtCore import QEventLoop, PYQT_VERSION_STR, QT_VERSION_STR
+from PyQt6.QtWidgets import QApplication
+
+import OmniDesk
+from omnidesk_core import PersistenceService, HistoryJournal, SegmentedArchive, PRIORITIES, CATEGORIES
+
+WORDS = ["отчёт", "встреча", "купить", "позвонить", "проверить", "письмо", "проект",
+         "молоко", "бюджет", "ремонт", "экзамен", "обзор", "план", "договор", "счёт"]
+FORMAT_VERSION = 1
+
+#############################################
+# Синтетические данные
+#############################################
+def randomText(rng, words=4):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def generateTasks(rng, count, first_id=1, start=datetime.datetime(2023, 1, 1)):
+    # Время создания растянуто на год, чтобы архив разошёлся по сегментам-месяцам
+    step = 365 * 24 * 3600 / max(count, 1)
+    return [{
+        "id": first_id + n,
+        "text": f"{randomText(rng)} #{first_id + n}",
+        "completed": n % 3 == 0,
+        "priority": rng.choice(PRIORITIES.values),
+        "category": rng.choice(CATEGORIES.values),
+        "timestamp": (start + datetime.timedelta(seconds=n * step)).isoformat()
+    } for n in range(count)]
+
+def writeJson(path, data):
+    # Без fsync и фоновой записи: подготовка данных в замер не входит
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+def generateData(directory, size, notes_ratio, seed):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    tasks = generateTasks(rng, size)
+    writeJson(os.path.join(directory, "tasks.json"), tasks)
+
+    archived = generateTasks(rng, size, first_id=size + 1)
+    for task in archived:
+        task["completed"] = True
+    archive = SegmentedArchive(os.path.join(directory, "tasks_archive"))
+    archive.append(archived)
+
+    history = HistoryJournal(os.path.join(directory, "tasks_history.jsonl"))
+    entries = [{"action": rng.choice(["added", "changed", "archived"]), "task": task,
+                "timestamp": task["timestamp"]} for task in tasks + archived]
+    for start in range(0, len(entries), 10000):
+        history.appendMany(entries[start:start + 10000])
+    history.flush()
+
+    # Заметка заметно тяжелее задачи, поэтому их меньше в notes_ratio раз
+    notes = [{"title": f"Заметка {n}: {randomText(rng, 3)}",
+              "content": "\n".join(randomText(rng, 12) for _ in range(20))}
+             for n in range(max(int(size * notes_ratio), 1))]
+    writeJson(os.path.join(directory, "notes.json"), notes)
+
+    # Текстовый файл: строка на задачу; маркер для поиска встречается раз в 100 строк
+    with open(os.path.join(directory, "large.txt"), 'w', encoding='utf-8') as f:
+        for n in range(size):
+            marker = " НАЙТИ" if n % 100 == 0 else ""
+            f.write(f"{n:08d} {randomText(rng, 8)}{marker}\n")
+    PersistenceService.instance().flush()
+
+#############################################
+# Замеры
+#############################################
+def waitFor(app, predicate, timeout=600):
+    # Крутим цикл событий, пока не выполнится условие (фоновые загрузки, поиск)
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("превышено время ожидания")
+        app.processEvents(QEventLoop.ProcessEventsFlag.AllEvents, 50)
+
+def measure(func, repeat, setup=None):
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+    return runs
+
+def disposeWidget(app, widget):
+    widget.deleteLater()
+    app.processEvents()
+
+def benchTodo(app, repeat, history_ops, results):
+    persistence = PersistenceService.instance()
+    tabs = []
+
+    def load():
+        tab = OmniDesk.TodoTab()
+        tab.ensureLoaded()
+        tabs.append(tab)
+
+    results["todo_load"] = measure(load, repeat)
+    tab = tabs.pop()
+    for other in tabs:
+        disposeWidget(app, other)
+
+    def save():
+        tab.saveTasks()
+        persistence.flush()
+
+    results["todo_save"] = measure(save, repeat)
+
+    # Шесть переключений фильтров — как если бы пользователь перебирал их по очереди
+    filter_steps = [(tab.filter_category, "Работа"), (tab.filter_priority, "Высокий"),
+                    (tab.filter_status, "Активные"), (tab.filter_category, "Все категории"),
+                    (tab.filter_priority, "Все приоритеты"), (tab.filter_status, "Все задачи")]
+
+    def filterTasks():
+        for combo, text in filter_steps:
+            combo.setCurrentText(text)
+
+    results["todo_filter"] = (measure(filterTasks, repeat), len(filter_steps))
+
+    task = tab.task_model.tasks[0]
+
+    def logHistory():
+        for _ in range(history_ops):
+            tab.repository.logHistory("changed", [task])
+
+    results["log_history"] = (measure(logHistory, repeat), history_ops)
+
+    # Архивирование и восстановление чередуются: восстановленные задачи остаются
+    # выполненными и снова попадают в следующее архивирование
+    archived = []
+    tab.tasksChanged.connect(lambda location, tasks: location == "archive" and archived.extend(tasks))
+    archive_runs, restore_runs = [], []
+    for _ in range(repeat):
+        archived.clear()
+        started = time.perf_counter()
+        tab.archiveCompletedTasks()
+        persistence.flush()
+        archive_runs.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        tab.restoreTasks(list(archived))
+        persistence.flush()
+        restore_runs.append(time.perf_counter() - started)
+    results["archive"] = archive_runs
+    results["restore"] = restore_runs
+    disposeWidget(app, tab)
+
+def benchNotes(app, repeat, results):
+    persistence = PersistenceService.instance()
+    organizers = []
+
+    def load():
+        organizer = OmniDesk.NotesOrganizer()
+        organizer.ensureLoaded()
+        persistence.flush()
+        organizers.append(organizer)
+
+    # Первая загрузка переносит notes.json в отдельные файлы — это отдельный замер
+    results["notes_migrate"] = measure(load, 1)
+    results["notes_load"] = measure(load, repeat)
+    organizer = organizers.pop()
+    for other in organizers:
+        disposeWidget(app, other)
+
+    organizer.loadNoteIntoEditor(organizer.list_widget.item(organizer.list_widget.count() // 2))
+
+    def edit():
+        organizer.text_edit.textCursor().insertText("x")
+
+    def autosave():
+        organizer.saveNotes()
+        persistence.flush()
+
+    results["notes_autosave"] = measure(autosave, repeat, setup=edit)
+    organizer.autosave_timer.stop()
+    disposeWidget(app, organizer)
+
+def benchEditor(app, repeat, file_path, results):
+    editor = OmniDesk.MultiFileTextEditor()
+
+    def closeTabs():
+        while editor.tab_widget.count():
+            tab = editor.tab_widget.widget(0)
+            if isinstance(tab, OmniDesk.EditorTab):
+                tab.stopLoading()
+            editor.tab_widget.removeTab(0)
+            tab.deleteLater()
+        app.processEvents()
+
+    def openFile():
+        editor.openPath(file_path)
+        waitFor(app, lambda: not editor.currentEditor().loading)
+
+    results["editor_open"] = measure(openFile, repeat, setup=closeTabs)
+
+    panel = editor.find_panel
+    editor.findText()
+    panel.search_timer.stop()
+    panel.search_edit.blockSignals(True)
+    panel.search_edit.setText("НАЙТИ")
+    panel.search_edit.blockSignals(False)
+
+    def find():
+        panel.startSearch()
+        # Статус меняется в onSearchFinished, после результатов по всем вкладкам
+        waitFor(app, lambda: panel.status_label.text() != "Поиск…")
+
+    results["editor_find"] = measure(find, repeat)
+    editor.stopBackgroundWork()
+    closeTabs()
+    disposeWidget(app, editor)
+
+def summarize(runs, ops=1):
+    return {"runs": [round(value, 6) for value in runs],
+            "min": round(min(runs), 6),
+            "median": round(statistics.median(runs), 6),
+            "ops": ops}
+
+def runSize(app, size, args):
+    directory = os.path.join(args.data_root, f"size_{size}")
+    shutil.rmtree(directory, ignore_errors=True)
+    started = time.perf_counter()
+    generateData(directory, size, args.notes_ratio, args.seed)
+    print(f"[{size}] данные подготовлены за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+    raw = {}
+    previous_dir = os.getcwd()
+    # Вкладки работают с файлами в текущем каталоге, как и в приложении
+    os.chdir(directory)
+    try:
+        if selected(args, "todo"):
+            benchTodo(app, args.repeat, args.history_ops, raw)
+        if selected(args, "notes"):
+            benchNotes(app, args.repeat, raw)
+        if selected(args, "editor"):
+            benchEditor(app, args.repeat, os.path.join(directory, "large.txt"), raw)
+    finally:
+        PersistenceService.instance().flush()
+        os.chdir(previous_dir)
+    if not args.keep_data:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    summary = {}
+    for name, value in raw.items():
+        runs, ops = value if isinstance(value, tuple) else (value, 1)
+        summary[name] = summarize(runs, ops)
+        print(f"[{size}] {name}: медиана {summary[name]['median'] * 1000:.1f} мс", file=sys.stderr)
+    return summary
+
+def selected(args, group):
+    return not args.only or group in args.only
+
+#############################################
+# Результаты и сравнение с прошлым прогоном
+#############################################
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def metadata(args):
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": gitCommit(),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "pyqt": PYQT_VERSION_STR,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "notes_ratio": args.notes_ratio,
+        "history_ops": args.history_ops
+    }
+
+def compareResults(current, baseline, threshold):
+    # Сравниваем медианы; регрессия — замедление больше чем в threshold раз
+    regressions = []
+    print(f"{'замер':<16}{'размер':>9}{'было, мс':>12}{'стало, мс':>12}{'×':>8}")
+    for name, sizes in sorted(current["results"].items()):
+        for size, stats in sorted(sizes.items(), key=lambda item: int(item[0])):
+            old = baseline.get("results", {}).get(name, {}).get(size)
+            if old is None:
+                continue
+            ratio = stats["median"] / old["median"] if old["median"] else float("inf")
+            mark = "  регрессия" if ratio > threshold else ""
+            print(f"{name:<16}{size:>9}{old['median'] * 1000:>12.1f}{stats['median'] * 1000:>12.1f}{ratio:>8.2f}{mark}")
+            if ratio > threshold:
+                regressions.append((name, size, ratio))
+    return regressions
+
+def buildParser():
+    parser = argparse.ArgumentParser(description="Замеры производительности OmniDesk на синтетических данных")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="число задач через запятую (1000000 — только явно, прогон долгий)")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждого замера")
+    parser.add_argument("--only", default="", help="группы замеров через запятую: todo, notes, editor")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "benchmark_results.json"),
+                        help="файл для результатов (JSON); каталог benchmarks/results не попадает в git")
+    parser.add_argument("--compare", help="прошлый файл результатов для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="во сколько раз медиана может вырасти, прежде чем это считается регрессией")
+    parser.add_argument("--notes-ratio", type=float, default=0.1, help="заметок на одну задачу")
+    parser.add_argument("--history-ops", type=int, default=100, help="записей истории в одном замере log_history")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора данных")
+    parser.add_argument("--data-root", help="каталог для данных (по умолчанию временный)")
+    parser.add_argument("--keep-data", action="store_true", help="не удалять сгенерированные данные")
+    return parser
+
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    args.only = [name.strip() for name in args.only.split(",") if name.strip()]
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    temp_root = None
+    if args.data_root is None:
+        temp_root = args.data_root = tempfile.mkdtemp(prefix="omnidesk_bench_")
+    args.data_root = os.path.abspath(args.data_root)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    report = {"format": FORMAT_VERSION, "meta": metadata(args), "results": {}}
+    try:
+        for size in sizes:
+            for name, stats in runSize(app, size, args).items():
+                report["results"].setdefault(name, {})[str(size)] = stats
+    finally:
+        PersistenceService.instance().shutdown()
+        if temp_root is not None and not args.keep_data:
+            shutil.rmtree(temp_root, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compareResults(report, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#############################################
+# omnidesk — консольная утилита для пакетной работы с данными OmniDesk:
+# добавление, импорт, экспорт, архивирование задач и выборки по ним, заметки.
+# Работает только с omnidesk_core и не импортирует Qt, поэтому запускается
+# быстро и подходит для ночных заданий.
+#
+#   python omnidesk_cli.py add "Купить молоко" --priority Высокий --category Дом
+#   python omnidesk_cli.py import tasks.csv
+#   python omnidesk_cli.py query --status active --category Работа
+#   python omnidesk_cli.py archive --before 2024-01-01
+#   python omnidesk_cli.py export backup.jsonl --sources tasks,archive,history
+#############################################
+import argparse
+import json
+import os
+import sys
+
+from omnidesk_core import (PersistenceService, TaskRepository, TaskIndex, NoteRepository, exportData, importTasks,
+                           taskToDict, PRIORITIES, CATEGORIES)
+
+class TaskSession:
+    # Активные задачи в памяти и репозиторий над ними — то же, что модель вкладки «Список дел»
+    def __init__(self, data_dir, backend):
+        self.tasks = []
+        self.repository = TaskRepository(data_dir, backend, snapshot=lambda: self.tasks)
+        self.tasks.extend(self.repository.load())
+        self.next_id = self.repository.nextId()
+        ids = set()
+        for task in self.tasks:
+            if "id" not in task or task["id"] in ids:
+                task["id"] = self.next_id
+            self.next_id = max(self.next_id, task["id"] + 1)
+            ids.add(task["id"])
+
+    def assignIds(self, tasks):
+        for task in tasks:
+            task["id"] = self.next_id
+            self.next_id += 1
+
+def readSettings(data_dir):
+    try:
+        with open(os.path.join(data_dir, "settings.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def taskLine(task):
+    mark = "x" if task.get("completed") else " "
+    due = f", срок {task['due'][:16]}" if task.get("due") else ""
+    return f"{task['id']:>7} [{mark}] {task['text']} (Приоритет: {task.get('priority')}, " \
+           f"Категория: {task.get('category')}, {task.get('timestamp', '')[:19]}{due})"
+
+def endOfDay(value):
+    # --until 2024-01-31 включает задачи, созданные в течение этого дня
+    return value + "T23:59:59.999999" if value and len(value) == 10 else value
+
+def commandAdd(args, session):
+    task = TaskRepository.newTask(args.text, args.priority, args.category, due=args.due, remind=args.remind)
+    session.assignIds([task])
+    session.tasks.append(task)
+    session.repository.add([task])
+    print(task["id"])
+
+def commandImport(args, session):
+    tasks = importTasks(args.file, args.format)
+    session.assignIds(tasks)
+    session.tasks.extend(tasks)
+    # Одна запись задач и одна пачка истории на весь импорт
+    session.repository.add(tasks)
+    print(f"Импортировано задач: {len(tasks)}")
+
+def commandArchive(args, session):
+    archived = [task for task in session.tasks if task.get("completed")
+                and (args.before is None or task.get("timestamp", "") < args.before)]
+    if archived:
+        ids = {task["id"] for task in archived}
+        session.tasks[:] = [task for task in session.tasks if task["id"] not in ids]
+        session.repository.archive(archived)
+    print(f"В архив перенесено задач: {len(archived)}")
+
+def commandQuery(args, session):
+    completed = None if args.status == "all" else args.status == "done"
+    if args.archive:
+        # Архив читается потоково и фильтруется на лету
+        def matches(task):
+            return ((args.category is None or task.get("category") == args.category)
+                    and (args.priority is None or task.get("priority") == args.priority)
+                    and (completed is None or bool(task.get("completed")) == completed)
+                    and (args.since is None or task.get("timestamp", "") >= args.since)
+                    and (args.until is None or task.get("timestamp", "") <= endOfDay(args.until)))
+        results = (task for task in session.repository.storage.iterArchive() if matches(task))
+    else:
+        index = TaskIndex()
+        index.rebuild(session.tasks)
+        ids = index.match(args.category, args.priority, completed, args.since, endOfDay(args.until))
+        results = (task for task in session.tasks if task["id"] in ids)
+    count = 0
+    for task in results:
+        if args.limit is not None and count >= args.limit:
+            break
+        print(json.dumps(taskToDict(task), ensure_ascii=False) if args.json else taskLine(task))
+        count += 1
+    if not args.json:
+        print(f"Найдено: {count}", file=sys.stderr)
+
+def commandExport(args, session):
+    sources = [source.strip() for source in args.sources.split(",") if source.strip()]
+    fmt = args.format or ("csv" if args.file.lower().endswith(".csv") else "jsonl")
+    count = exportData(args.file, fmt, sources, session.tasks, session.repository.storage)
+    print(f"Экспортировано записей: {count}")
+
+def commandNotes(args):
+    repository = NoteRepository(args.data_dir)
+    repository.load()
+    if args.notes_command == "add":
+        if args.file:
+            with open(args.file, 'r', encoding='utf-8') as f:
+                content = f.read()
+        elif args.content is not None:
+            content = args.content
+        else:
+            content = sys.stdin.read()
+        note = repository.create(args.title, content)
+        repository.save()
+        print(note["id"])
+    else:
+        for note in repository.notes:
+            print(f"{note['id']:>7} {note['title']}")
+
+def buildParser():
+    parser = argparse.ArgumentParser(prog="omnidesk", description="Пакетная работа с задачами и заметками OmniDesk")
+    parser.add_argument("--data-dir", default=".", help="каталог с данными приложения (по умолчанию текущий)")
+    parser.add_argument("--backend", choices=["json", "sqlite"],
+                        help="хранилище задач (по умолчанию — из settings.json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="добавить задачу")
+    add.add_argument("text")
+    add.add_argument("--priority", choices=PRIORITIES.values, default="Низкий")
+    add.add_argument("--category", choices=CATEGORIES.values, default="Общее")
+    add.add_argument("--due", help="срок (ГГГГ-ММ-ДДTЧЧ:ММ)")
+    add.add_argument("--remind", help="когда напомнить (ГГГГ-ММ-ДДTЧЧ:ММ)")
+
+    import_ = commands.add_parser("import", help="импортировать задачи из CSV, JSON Lines или JSON")
+    import_.add_argument("file")
+    import_.add_argument("--format", choices=["csv", "jsonl", "json"])
+
+    archive = commands.add_parser("archive", help="перенести выполненные задачи в архив")
+    archive.add_argument("--before", help="только созданные раньше этой даты (ГГГГ-ММ-ДД)")
+
+    query = commands.add_parser("query", help="вывести задачи по фильтрам")
+    query.add_argument("--category")
+    query.add_argument("--priority")
+    query.add_argument("--status", choices=["all", "active", "done"], default="all")
+    query.add_argument("--since", help="созданные не раньше (ГГГГ-ММ-ДД)")
+    query.add_argument("--until", help="созданные не позже (ГГГГ-ММ-ДД)")
+    query.add_argument("--archive", action="store_true", help="искать в архиве")
+    query.add_argument("--limit", type=int)
+    query.add_argument("--json", action="store_true", help="вывод в JSON Lines")
+
+    export = commands.add_parser("export", help="выгрузить задачи, архив и историю")
+    export.add_argument("file")
+    export.add_argument("--format", choices=["csv", "jsonl"])
+    export.add_argument("--sources", default="tasks,archive,history")
+
+    notes = commands.add_parser("notes", help="заметки")
+    notes_commands = notes.add_subparsers(dest="notes_command", required=True)
+    notes_commands.add_parser("list", help="список заметок")
+    notes_add = notes_commands.add_parser("add", help="добавить заметку (текст — из --content, --file или stdin)")
+    notes_add.add_argument("title")
+    notes_add.add_argument("--content")
+    notes_add.add_argument("--file")
+    return parser
+
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    try:
+        if args.command == "notes":
+            commandNotes(args)
+        else:
+            backend = args.backend or readSettings(args.data_dir).get("storage_backend", "json")
+            session = TaskSession(args.data_dir, backend)
+            {"add": commandAdd, "import": commandImport, "archive": commandArchive,
+             "query": commandQuery, "export": commandExport}[args.command](args, session)
+    finally:
+        # Все отложенные записи должны оказаться на диске до выхода
+        PersistenceService.instance().shutdown()
+
+if __name__ == "__main__":
+    main()
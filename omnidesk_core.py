@@ -0,0 +1,2074 @@
+#############################################
+# Ядро данных OmniDesk без зависимости от Qt: фоновое сохранение, хранилища
+# задач, архива и истории, заметки, полнотекстовый индекс и синхронизация.
+# Его используют и виджеты OmniDesk.py, и консольная утилита omnidesk_cli.py.
+#############################################
+import os
+import json
+import csv
+import datetime
+import bisect
+import contextlib
+import sqlite3
+import gzip
+import re
+import math
+import heapq
+import itertools
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict, deque
+
+#############################################
+# Встроенные замеры: длительности операций, счётчики и выборки памяти.
+# По умолчанию выключены — тогда measure() возвращает общий пустой контекст,
+# а count() и gauge() сразу выходят. Включаются флагом --diagnostics,
+# переменной окружения OMNIDESK_DIAGNOSTICS или из меню «Диагностика».
+#############################################
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    __slots__ = ("owner", "name", "started")
+
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.owner.record(self.name, self.started, time.perf_counter() - self.started)
+        return False
+
+class Instrumentation:
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, window=2048, max_events=100000):
+        self.enabled = False
+        self.window = window          # для процентилей хранятся последние window замеров
+        self.max_events = max_events  # и не больше max_events событий для трассы
+        self.tracing_memory = False   # tracemalloc запущен нами и будет нами остановлен
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.origin = time.perf_counter()
+            self.samples = {}   # имя -> последние длительности, с
+            self.totals = {}    # имя -> [число замеров, суммарное время]
+            self.counters = {}  # имя -> значение
+            self.gauges = {}    # имя -> последние (время, значение)
+            self.events = deque(maxlen=self.max_events)  # (имя, начало, длительность, поток)
+
+    def enable(self, memory=True):
+        # Отслеживание памяти замедляет каждое выделение, поэтому включается только вместе с замерами
+        self.enabled = True
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing_memory = True
+
+    def disable(self):
+        self.enabled = False
+        if self.tracing_memory:
+            tracemalloc.stop()
+            self.tracing_memory = False
+
+    def measure(self, name):
+        return Span(self, name) if self.enabled else NULL_SPAN
+
+    def record(self, name, started, duration):
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+                self.totals[name] = [0, 0.0]
+            samples.append(duration)
+            total = self.totals[name]
+            total[0] += 1
+            total[1] += duration
+            self.events.append((name, started, duration, threading.get_ident()))
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges.setdefault(name, deque(maxlen=self.window)).append((time.perf_counter(), value))
+
+    def sampleMemory(self):
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self.gauge("memory.current", current)
+            self.gauge("memory.peak", peak)
+
+    @staticmethod
+    def percentile(ordered, percent):
+        # Ближайший ранг по отсортированной выборке
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))]
+
+    def summary(self):
+        # Для окна диагностики и экспорта: времена в миллисекундах
+        with self.lock:
+            samples = {name: sorted(values) for name, values in self.samples.items()}
+            totals = {name: list(total) for name, total in self.totals.items()}
+            counters = dict(self.counters)
+            gauges = {name: values[-1][1] for name, values in self.gauges.items() if values}
+        timings = {}
+        for name, ordered in samples.items():
+            count, total = totals[name]
+            timings[name] = {
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "p50_ms": round(self.percentile(ordered, 50) * 1000, 3),
+                "p90_ms": round(self.percentile(ordered, 90) * 1000, 3),
+                "p99_ms": round(self.percentile(ordered, 99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3)
+            }
+        return {"timings": timings, "counters": counters, "gauges": gauges}
+
+    def exportTrace(self, path):
+        # Формат Trace Event (chrome://tracing, Perfetto): события "X" и счётчики "C"
+        with self.lock:
+            events = list(self.events)
+            gauges = {name: list(values) for name, values in self.gauges.items()}
+        pid = os.getpid()
+        trace = [{"name": name, "ph": "X", "pid": pid, "tid": tid,
+                  "ts": round((started - self.origin) * 1e6, 1), "dur": round(duration * 1e6, 1)}
+                 for name, started, duration, tid in events]
+        for name, values in gauges.items():
+            trace.extend({"name": name, "ph": "C", "pid": pid, "tid": 0,
+                          "ts": round((at - self.origin) * 1e6, 1), "args": {"value": value}}
+                         for at, value in values)
+        data = {"traceEvents": trace, "displayTimeUnit": "ms", "summary": self.summary()}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return len(trace)
+
+#############################################
+# Фоновое сохранение: все записи на диск выполняет один рабочий поток.
+# Повторные записи в один и тот же файл склеиваются (на диск попадает только
+# последняя), файл заменяется атомарно через временный файл и rename.
+#############################################
+class PersistenceService:
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        # path -> (вид, данные); данные после передачи сервису не изменяются
+        self.pending = {}
+        # Слушатели listener(path, ok) вызываются в рабочем потоке после каждой записи
+        self.listeners = []
+        self.in_flight = {}
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="persistence", daemon=True)
+        self.thread.start()
+
+    def addListener(self, listener):
+        self.listeners.append(listener)
+
+    def removeListener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def writeJson(self, path, data, indent=4, compressed=False):
+        # compressed=True — компактный JSON, сжатый gzip. data может быть функцией
+        # без аргументов: тогда сами данные строятся уже в рабочем потоке
+        self.schedule(path, ("json.gz" if compressed else "json", data, indent))
+
+    def writeText(self, path, text):
+        self.schedule(path, ("text", text, None))
+
+    def submit(self, key, func):
+        # Произвольная работа в рабочем потоке; повторные задачи с тем же ключом склеиваются
+        self.schedule(key, ("call", func, None))
+
+    def removeFile(self, path):
+        # Удаление тоже идёт через очередь, чтобы не разойтись с отложенной записью
+        self.schedule(path, ("delete", None, None))
+
+    def schedule(self, path, job):
+        Instrumentation.instance().count("persistence.scheduled")
+        with self.condition:
+            self.pending[path] = job
+            self.condition.notify_all()
+
+    def readJson(self, path, default=None, compressed=False):
+        # Учитываем ещё не записанные данные, чтобы не прочитать устаревший файл
+        with self.condition:
+            job = self.pending.get(path) or self.in_flight.get(path)
+        if job is not None and job[0] in ("json", "json.gz"):
+            return job[1]() if callable(job[1]) else job[1]
+        if job is not None and job[0] == "delete":
+            return default
+        if not os.path.exists(path):
+            return default
+        if compressed:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def readText(self, path, default=None):
+        # Как readJson, но для текстовых файлов, записанных через writeText
+        with self.condition:
+            job = self.pending.get(path) or self.in_flight.get(path)
+        if job is not None and job[0] == "text":
+            return job[1]
+        if job is not None and job[0] == "delete":
+            return default
+        if not os.path.exists(path):
+            return default
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                path = next(iter(self.pending))
+                job = self.pending.pop(path)
+                self.in_flight[path] = job
+            try:
+                with Instrumentation.instance().measure("persistence." + job[0]):
+                    self.writeAtomic(path, job)
+                ok = True
+            except Exception:
+                # Ошибка одной записи не должна останавливать рабочий поток
+                ok = False
+            with self.condition:
+                del self.in_flight[path]
+                self.condition.notify_all()
+            for listener in list(self.listeners):
+                try:
+                    listener(path, ok)
+                except Exception:
+                    pass  # ошибка слушателя тоже не должна останавливать поток
+
+    def writeAtomic(self, path, job):
+        kind, data, indent = job
+        if kind == "call":
+            data()
+            return
+        if kind == "delete":
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        if callable(data):
+            data = data()
+        if kind == "json":
+            payload = json.dumps(data, ensure_ascii=False, indent=indent).encode('utf-8')
+        elif kind == "json.gz":
+            payload = gzip.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode('utf-8'), 6)
+        else:
+            payload = data.encode('utf-8')
+        Instrumentation.instance().count("persistence.bytes", len(payload))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def flush(self):
+        # Дожидаемся, пока все запланированные записи окажутся на диске
+        with self.condition:
+            while self.pending or self.in_flight:
+                self.condition.wait()
+
+    def shutdown(self):
+        self.flush()
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.thread.join()
+
+#############################################
+# Дописываемые записи (журнал истории, изменения в SQLite) через PersistenceService:
+# поток интерфейса только добавляет элементы в очередь, рабочий поток забирает
+# всё накопленное одной задачей. Задачи с одним ключом склеиваются, поэтому
+# элементы копятся здесь, а не в самой задаче.
+#############################################
+class WriteQueue:
+    def __init__(self, key, write):
+        self.key = key      # ключ задачи в PersistenceService; свой у каждой очереди
+        self.write = write  # write(items) — в рабочем потоке
+        self.items = []
+        self.busy = False   # рабочий поток сейчас записывает забранные элементы
+        self.condition = threading.Condition()
+        self.persistence = PersistenceService.instance()
+
+    def add(self, items):
+        with self.condition:
+            self.items.extend(items)
+        self.persistence.submit(self.key, self.run)
+
+    def run(self):
+        with self.condition:
+            items, self.items = self.items, []
+            self.busy = True
+        try:
+            if items:
+                self.write(items)
+        finally:
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
+
+    def wait(self):
+        # Перед чтением: всё, что уже поставлено в очередь, должно оказаться на диске.
+        # В самом рабочем потоке ждать нельзя — там задача ещё не может выполниться
+        if threading.current_thread() is self.persistence.thread:
+            return
+        with self.condition:
+            while self.items or self.busy:
+                self.condition.wait()
+
+#############################################
+# Компактная запись задачи. Поля лежат в __slots__, приоритет и категория —
+# коды в общих таблицах (EnumTable), время создания — целые секунды Unix.
+# Для кода, который работает со словарями (синхронизация, поиск, консоль),
+# запись поддерживает task["text"], task.get(...), "id" in task и update();
+# в файлы и историю она попадает через taskToDict().
+#############################################
+class EnumTable:
+    def __init__(self, values):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+        self.lock = threading.Lock()
+
+    def code(self, value):
+        # Незнакомое значение (например, категория из импорта) получает новый код
+        code = self.codes.get(value)
+        if code is None:
+            with self.lock:
+                code = self.codes.get(value)
+                if code is None:
+                    code = len(self.values)
+                    self.values.append(value)
+                    self.codes[value] = code
+        return code
+
+    def lookup(self, value):
+        # Без добавления: для фильтров по значению, которого может не быть
+        return self.codes.get(value)
+
+    def value(self, code):
+        return self.values[code]
+
+PRIORITIES = EnumTable(["Низкий", "Средний", "Высокий"])
+CATEGORIES = EnumTable(["Общее", "Работа", "Дом", "Учёба", "Другое"])
+
+def isoToEpoch(value):
+    if not value:
+        return None
+    try:
+        return int(datetime.datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+def epochToIso(value):
+    return "" if value is None else datetime.datetime.fromtimestamp(value).isoformat()
+
+def keepsOriginalTime(value, parsed):
+    # Исходную строку храним, если из секунд её не восстановить: время не распознано
+    # или в нём указан часовой пояс (fromtimestamp вернёт местное время без смещения)
+    if not value or isinstance(value, int):
+        return False
+    if parsed is None:
+        return True
+    return datetime.datetime.fromisoformat(value).tzinfo is not None
+
+class TaskRecord:
+    __slots__ = ("id", "text", "completed", "priority_code", "category_code", "created",
+                 "due_at", "remind_at", "extra")
+    FIELDS = ("id", "text", "completed", "priority", "category", "timestamp", "due", "remind")
+
+    def __init__(self, task_id=None, text="", completed=False, priority="Низкий", category="Общее",
+                 created=None, extra=None, due_at=None, remind_at=None):
+        self.id = task_id
+        self.text = text
+        self.completed = completed
+        self.priority_code = PRIORITIES.code(priority)
+        self.category_code = CATEGORIES.code(category)
+        self.created = created      # секунды Unix или None
+        self.due_at = due_at        # срок, секунды Unix или None
+        self.remind_at = remind_at  # время напоминания, секунды Unix или None
+        self.extra = extra          # поля, для которых нет слота (словарь или None)
+
+    @classmethod
+    def fromDict(cls, data):
+        if isinstance(data, TaskRecord):
+            return data
+        extra = {key: value for key, value in data.items() if key not in cls.FIELDS} or None
+        created = isoToEpoch(data.get("timestamp"))
+        due_at = isoToEpoch(data.get("due"))
+        remind_at = isoToEpoch(data.get("remind"))
+        for key, parsed in (("timestamp", created), ("due", due_at), ("remind", remind_at)):
+            # Нераспознанное время и время с часовым поясом не теряем — оно уйдёт в файл как было
+            if keepsOriginalTime(data.get(key), parsed):
+                extra = dict(extra or {}, **{key: data[key]})
+        return cls(data.get("id"), data.get("text", ""), bool(data.get("completed")),
+                   data.get("priority") or "Низкий", data.get("category") or "Общее",
+                   created, extra, due_at, remind_at)
+
+    @property
+    def priority(self):
+        return PRIORITIES.value(self.priority_code)
+
+    @priority.setter
+    def priority(self, value):
+        self.priority_code = PRIORITIES.code(value)
+
+    @property
+    def category(self):
+        return CATEGORIES.value(self.category_code)
+
+    @category.setter
+    def category(self, value):
+        self.category_code = CATEGORIES.code(value)
+
+    @property
+    def timestamp(self):
+        return self.optionalTime("timestamp", self.created) or ""
+
+    @timestamp.setter
+    def timestamp(self, value):
+        self.created = self.parseOptionalTime("timestamp", value)
+
+    # Срок и напоминание: в словаре — строки ISO, отсутствуют, если не заданы
+    @property
+    def due(self):
+        return self.optionalTime("due", self.due_at)
+
+    @due.setter
+    def due(self, value):
+        self.due_at = self.parseOptionalTime("due", value)
+
+    @property
+    def remind(self):
+        return self.optionalTime("remind", self.remind_at)
+
+    @remind.setter
+    def remind(self, value):
+        self.remind_at = self.parseOptionalTime("remind", value)
+
+    def optionalTime(self, key, value):
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        return None if value is None else epochToIso(value)
+
+    def parseOptionalTime(self, key, value):
+        parsed = value if isinstance(value, int) else isoToEpoch(value)
+        if self.extra:
+            self.extra.pop(key, None)
+        if keepsOriginalTime(value, parsed):
+            self.extra = dict(self.extra or {}, **{key: value})
+        return parsed
+
+    def freeze(self):
+        # Быстрый неизменяемый снимок для фоновой записи; словарь из него строит frozenToDict
+        return (self.id, self.text, self.completed, self.priority_code, self.category_code,
+                self.created, self.due_at, self.remind_at, dict(self.extra) if self.extra else None)
+
+    def toDict(self):
+        data = {} if self.id is None else {"id": self.id}
+        data["text"] = self.text
+        data["completed"] = self.completed
+        data["priority"] = PRIORITIES.values[self.priority_code]
+        data["category"] = CATEGORIES.values[self.category_code]
+        data["timestamp"] = self.timestamp
+        if self.due_at is not None:
+            data["due"] = epochToIso(self.due_at)
+        if self.remind_at is not None:
+            data["remind"] = epochToIso(self.remind_at)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    # Доступ как к словарю
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            if key == "id" and self.id is None:
+                raise KeyError(key)
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "completed":
+            self.completed = bool(value)
+        elif key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        if key == "id":
+            return self.id is not None
+        if key in ("due", "remind"):
+            return getattr(self, key) is not None
+        return key in self.FIELDS or bool(self.extra and key in self.extra)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.toDict().keys()
+
+    def items(self):
+        return self.toDict().items()
+
+    def update(self, other):
+        for key, value in other.items():
+            self[key] = value
+
+    def __repr__(self):
+        return f"TaskRecord({self.toDict()!r})"
+
+def taskToDict(task):
+    return task.toDict() if isinstance(task, TaskRecord) else dict(task)
+
+def frozenToDict(frozen):
+    if isinstance(frozen, dict):
+        return frozen
+    task_id, text, completed, priority_code, category_code, created, due_at, remind_at, extra = frozen
+    data = {} if task_id is None else {"id": task_id}
+    data["text"] = text
+    data["completed"] = completed
+    data["priority"] = PRIORITIES.values[priority_code]
+    data["category"] = CATEGORIES.values[category_code]
+    data["timestamp"] = epochToIso(created) if created is not None else (extra or {}).get("timestamp", "")
+    if due_at is not None:
+        data["due"] = epochToIso(due_at)
+    if remind_at is not None:
+        data["remind"] = epochToIso(remind_at)
+    if extra:
+        data.update(extra)
+    return data
+
+#############################################
+# Журнал истории задач: построчный (JSON Lines) файл, в который записи
+# только дописываются. Старый формат (один JSON-массив) переносится один раз.
+#############################################
+class HistoryJournal:
+    def __init__(self, path, legacy_path=None, max_bytes=4 * 1024 * 1024):
+        self.path = path                  # текущий сегмент журнала
+        self.legacy_path = legacy_path    # старый tasks_history.json
+        self.max_bytes = max_bytes        # порог ротации текущего сегмента
+        self.size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        # Дописывание, fsync и ротация — в потоке сохранения; size меняется только там
+        self.writes = WriteQueue(f"{path}#append-{id(self):x}", self.writeEntries)
+
+    def migrateLegacy(self):
+        # Однократный перенос истории из JSON-массива в построчный журнал; файл может
+        # быть большим, поэтому вызывается при загрузке задач в фоне, а не в конструкторе
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        if os.path.exists(self.path):
+            return
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in history:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        os.replace(self.legacy_path, self.legacy_path + ".migrated")
+        self.size = os.path.getsize(self.path)
+
+    def segmentPaths(self):
+        # Ротированные сегменты (от старых к новым), затем текущий файл
+        directory = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path) + "."
+        segments = []
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                suffix = name[len(prefix):]
+                if name.startswith(prefix) and suffix.isdigit():
+                    segments.append((int(suffix), os.path.join(directory, name)))
+        paths = [path for _, path in sorted(segments)]
+        if os.path.exists(self.path):
+            paths.append(self.path)
+        return paths
+
+    def rotate(self):
+        segments = self.segmentPaths()
+        number = 1
+        if segments and segments[0] != self.path:
+            last = segments[-2] if segments[-1] == self.path else segments[-1]
+            number = int(last.rsplit(".", 1)[1]) + 1
+        os.replace(self.path, f"{self.path}.{number:06d}")
+        self.size = 0
+
+    def append(self, entry):
+        self.appendMany([entry])
+
+    def appendMany(self, entries):
+        self.writes.add(entries)
+
+    def flush(self):
+        self.writes.wait()
+
+    def writeEntries(self, entries):
+        # Всё накопленное — одна запись на диск и один fsync (при ротации — по одному на сегмент)
+        chunk = []
+        chunk_size = 0
+        for entry in entries:
+            line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+            if self.size + chunk_size and self.size + chunk_size + len(line) > self.max_bytes:
+                self.writeLines(chunk)
+                chunk = []
+                chunk_size = 0
+                if self.size:
+                    self.rotate()
+            chunk.append(line)
+            chunk_size += len(line)
+        self.writeLines(chunk)
+
+    def writeLines(self, lines):
+        if not lines:
+            return
+        with open(self.path, 'ab') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.size += sum(len(line) for line in lines)
+
+    def iterEntries(self):
+        # Потоковое чтение: в памяти держится только одна строка журнала
+        self.flush()
+        for path in self.segmentPaths():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # Недописанная строка после аварийного завершения
+                        continue
+
+#############################################
+# Сегментированный архив задач: по одному сжатому gzip-сегменту на месяц
+# создания задачи и небольшой индекс с количеством задач в каждом сегменте.
+# Читать можно постранично, а записываются только изменённые сегменты.
+#############################################
+class SegmentedArchive:
+    def __init__(self, directory, legacy_path=None):
+        self.directory = directory
+        self.legacy_path = legacy_path  # старый tasks_archive.json
+        self.index_path = os.path.join(directory, "index.json")
+        self.persistence = PersistenceService.instance()
+        self.index = self.persistence.readJson(self.index_path) or {"max_id": 0, "segments": {}}
+        self.segments = {}  # загруженные для изменения сегменты: ключ -> список задач
+        self.dirty = set()
+
+    @staticmethod
+    def segmentKey(task):
+        timestamp = task.get("timestamp") or ""
+        return timestamp[:7] if len(timestamp) >= 7 else "unknown"
+
+    def segmentPath(self, key):
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def migrateLegacy(self, next_id):
+        # Однократный перенос архива из одного JSON-файла; задачи без id получают его здесь
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        with open(self.legacy_path, 'r', encoding='utf-8') as f:
+            tasks = json.load(f)
+        next_id = max([next_id, self.index["max_id"] + 1] + [task["id"] + 1 for task in tasks if "id" in task])
+        for task in tasks:
+            if "id" not in task:
+                task["id"] = next_id
+                next_id += 1
+        self.append(tasks)
+        self.persistence.flush()
+        os.replace(self.legacy_path, self.legacy_path + ".migrated")
+
+    def count(self):
+        return sum(self.index["segments"].values())
+
+    def maxId(self):
+        return self.index["max_id"]
+
+    def loadSegment(self, key):
+        if key not in self.segments:
+            self.segments[key] = list(self.persistence.readJson(self.segmentPath(key), [], compressed=True))
+        return self.segments[key]
+
+    def iterTasks(self):
+        # Ленивый обход: в памяти одновременно находится только один сегмент
+        for key in sorted(self.index["segments"]):
+            tasks = self.segments.get(key)
+            if tasks is None:
+                tasks = self.persistence.readJson(self.segmentPath(key), [], compressed=True)
+            yield from list(tasks)
+
+    def append(self, tasks):
+        for task in tasks:
+            key = self.segmentKey(task)
+            self.loadSegment(key).append(taskToDict(task))
+            self.dirty.add(key)
+            self.index["max_id"] = max(self.index["max_id"], task.get("id", 0))
+        self.flush()
+
+    def removeTasks(self, tasks):
+        # Удаление по id: затрагиваются только сегменты удаляемых задач
+        ids_by_key = {}
+        for task in tasks:
+            ids_by_key.setdefault(self.segmentKey(task), set()).add(task["id"])
+        for key, ids in ids_by_key.items():
+            self.segments[key] = [task for task in self.loadSegment(key) if task.get("id") not in ids]
+            self.dirty.add(key)
+        self.flush()
+
+    def clear(self):
+        for key in self.index["segments"]:
+            self.persistence.removeFile(self.segmentPath(key))
+        self.index["segments"] = {}
+        self.segments = {}
+        self.dirty = set()
+        self.persistence.writeJson(self.index_path, dict(self.index))
+
+    def flush(self):
+        for key in self.dirty:
+            tasks = self.segments[key]
+            if tasks:
+                self.persistence.writeJson(self.segmentPath(key), tasks, compressed=True)
+                self.index["segments"][key] = len(tasks)
+            else:
+                self.persistence.removeFile(self.segmentPath(key))
+                self.index["segments"].pop(key, None)
+        if self.dirty:
+            self.persistence.writeJson(self.index_path, {"max_id": self.index["max_id"],
+                                                         "segments": dict(self.index["segments"])})
+        # Сегменты переданы на запись и больше не изменяются — держать их в памяти незачем
+        self.dirty = set()
+        self.segments = {}
+
+#############################################
+# Хранилища задач, архива и истории. JsonTaskStorage — прежние JSON-файлы,
+# SqliteTaskStorage — одна база SQLite (WAL), где каждая операция затрагивает
+# только свои строки. TodoTab работает с любым из них через один интерфейс.
+#############################################
+class JsonTaskStorage:
+    def __init__(self, file_path, archive, history, snapshot):
+        self.file_path = file_path
+        self.archive = archive    # SegmentedArchive
+        self.history = history    # HistoryJournal
+        self.snapshot = snapshot  # возвращает текущий список активных задач
+        self.persistence = PersistenceService.instance()
+
+    def loadTasks(self):
+        self.history.migrateLegacy()
+        tasks = self.persistence.readJson(self.file_path, [])
+        self.archive.migrateLegacy(max([task["id"] + 1 for task in tasks if "id" in task], default=1))
+        return tasks
+
+    def maxTaskId(self):
+        # Учитываем архив, чтобы новые задачи не получили id архивных
+        return self.archive.maxId()
+
+    def saveTasks(self, tasks):
+        # Снимок копий: записи в модели продолжают меняться, пока идёт запись.
+        # В потоке GUI — только кортежи, словари для JSON строятся в рабочем потоке
+        frozen = [task.freeze() if isinstance(task, TaskRecord) else dict(task) for task in tasks]
+        self.persistence.writeJson(self.file_path, lambda: [frozenToDict(row) for row in frozen])
+
+    def addTask(self, task):
+        self.saveTasks(self.snapshot())
+
+    def addTasks(self, tasks):
+        self.saveTasks(self.snapshot())
+
+    def updateTask(self, task):
+        self.saveTasks(self.snapshot())
+
+    def updateTasks(self, tasks):
+        self.saveTasks(self.snapshot())
+
+    def deleteTasks(self, tasks):
+        self.saveTasks(self.snapshot())
+
+    def archiveCount(self):
+        return self.archive.count()
+
+    def iterArchive(self):
+        return self.archive.iterTasks()
+
+    def loadArchive(self):
+        return list(self.archive.iterTasks())
+
+    def archiveTasks(self, tasks):
+        self.archive.append(tasks)
+        self.saveTasks(self.snapshot())
+
+    def restoreTasks(self, tasks):
+        self.archive.removeTasks(tasks)
+        self.saveTasks(self.snapshot())
+
+    def removeArchived(self, tasks):
+        # Архивные копии по их исходным id (при восстановлении id может смениться)
+        self.archive.removeTasks(tasks)
+
+    def clearArchive(self):
+        self.archive.clear()
+
+    def logHistory(self, entry):
+        self.history.append(entry)
+
+    def logHistoryMany(self, entries):
+        self.history.appendMany(entries)
+
+    def applyBatch(self, entries, operations):
+        # Пакет: одна запись истории, архив по сегментам и один снимок активных задач
+        if entries:
+            self.history.appendMany(entries)
+        for operation, tasks in operations:
+            if operation == "archiveTasks":
+                self.archive.append(tasks)
+            elif operation in ("restoreTasks", "removeArchived"):
+                self.archive.removeTasks(tasks)
+        if operations:
+            self.saveTasks(self.snapshot())
+
+    def iterHistory(self):
+        return self.history.iterEntries()
+
+class SqliteTaskStorage:
+    TASK_COLUMNS = ("id", "text", "completed", "priority", "category", "timestamp")
+
+    def __init__(self, db_path, legacy=None):
+        self.db_path = db_path
+        # (tasks.json, SegmentedArchive, HistoryJournal) для однократного импорта при загрузке
+        self.legacy = legacy
+        # Изменения пишет поток сохранения через своё соединение (открывается в нём же);
+        # self.conn — только для чтения в потоке интерфейса
+        self.write_conn = None
+        self.writes = WriteQueue(f"{db_path}#write-{id(self):x}", self.writeOperations)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    priority TEXT,
+                    category TEXT,
+                    timestamp TEXT,
+                    archived INTEGER NOT NULL DEFAULT 0,
+                    extra TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_tasks_category ON tasks(archived, category);
+                CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(archived, priority);
+                CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks(archived, completed);
+                CREATE INDEX IF NOT EXISTS idx_tasks_timestamp ON tasks(archived, timestamp);
+                CREATE TABLE IF NOT EXISTS history (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    action TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    task TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """)
+
+    def close(self):
+        self.writes.wait()
+        self.conn.close()
+
+    INSERT_TASK = "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    INSERT_HISTORY = "INSERT INTO history (action, timestamp, task) VALUES (?, ?, ?)"
+
+    def enqueue(self, operations):
+        # (SQL, строки параметров); строки строятся здесь, в вызывающем потоке, —
+        # дальше задачи могут меняться. Выполняется в потоке сохранения
+        self.writes.add(operations)
+
+    def writeOperations(self, operations):
+        # Всё накопленное — одна транзакция; у рабочего потока своё соединение
+        if self.write_conn is None:
+            self.write_conn = sqlite3.connect(self.db_path)
+            self.write_conn.execute("PRAGMA synchronous=NORMAL")
+        with self.write_conn:
+            for sql, rows in operations:
+                self.write_conn.executemany(sql, rows)
+
+    def taskToRow(self, task, archived=0):
+        # Поля, для которых нет отдельной колонки, хранятся в extra как JSON
+        if isinstance(task, TaskRecord):
+            extra = task.extra
+            if task.due_at is not None or task.remind_at is not None:
+                extra = {k: v for k, v in task.toDict().items() if k not in self.TASK_COLUMNS}
+            return (task.id, task.text, int(task.completed), task.priority, task.category, task.timestamp,
+                    archived, json.dumps(extra, ensure_ascii=False) if extra else None)
+        extra = {k: v for k, v in task.items() if k not in self.TASK_COLUMNS}
+        return (task.get("id"), task.get("text", ""), int(bool(task.get("completed"))),
+                task.get("priority"), task.get("category"), task.get("timestamp"),
+                archived, json.dumps(extra, ensure_ascii=False) if extra else None)
+
+    def rowToTask(self, row):
+        task_id, text, completed, priority, category, timestamp, extra = row
+        task = {"id": task_id, "text": text, "completed": bool(completed),
+                "priority": priority, "category": category, "timestamp": timestamp}
+        if extra:
+            task.update(json.loads(extra))
+        return task
+
+    def selectTasks(self, archived):
+        # Отдельное соединение: задачи загружаются в фоновом потоке
+        self.writes.wait()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(
+                "SELECT id, text, completed, priority, category, timestamp, extra "
+                "FROM tasks WHERE archived = ? ORDER BY rowid", (archived,))
+            return [self.rowToTask(row) for row in cursor]
+        finally:
+            conn.close()
+
+    def loadTasks(self):
+        if self.legacy is not None:
+            self.importFromJson(*self.legacy)
+            self.legacy = None
+        return self.selectTasks(0)
+
+    def maxTaskId(self):
+        self.writes.wait()
+        return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM tasks").fetchone()[0]
+
+    def taskRows(self, tasks):
+        return [self.taskToRow(task) for task in tasks]
+
+    @staticmethod
+    def idRows(tasks):
+        return [(task["id"],) for task in tasks]
+
+    def saveTasks(self, tasks):
+        self.enqueue([("DELETE FROM tasks WHERE archived = 0", [()]), (self.INSERT_TASK, self.taskRows(tasks))])
+
+    def addTask(self, task):
+        self.updateTask(task)
+
+    def addTasks(self, tasks):
+        self.enqueue([(self.INSERT_TASK, self.taskRows(tasks))])
+
+    def updateTask(self, task):
+        self.addTasks([task])
+
+    def updateTasks(self, tasks):
+        self.addTasks(tasks)
+
+    def deleteTasks(self, tasks):
+        self.enqueue([("DELETE FROM tasks WHERE id = ?", self.idRows(tasks))])
+
+    def archiveCount(self):
+        self.writes.wait()
+        return self.conn.execute("SELECT COUNT(*) FROM tasks WHERE archived = 1").fetchone()[0]
+
+    def iterArchive(self, page_size=500):
+        # Постраничное чтение по ключу через отдельное соединение,
+        # чтобы архив можно было обходить и из фонового потока
+        self.writes.wait()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            last_id = 0
+            while True:
+                rows = conn.execute(
+                    "SELECT id, text, completed, priority, category, timestamp, extra FROM tasks "
+                    "WHERE archived = 1 AND id > ? ORDER BY id LIMIT ?", (last_id, page_size)).fetchall()
+                if not rows:
+                    return
+                for row in rows:
+                    yield self.rowToTask(row)
+                last_id = rows[-1][0]
+        finally:
+            conn.close()
+
+    def loadArchive(self):
+        return self.selectTasks(1)
+
+    def archiveTasks(self, tasks):
+        # Перенос в архив — смена флага
+        self.enqueue([("UPDATE tasks SET archived = 1 WHERE id = ?", self.idRows(tasks))])
+
+    def restoreTasks(self, tasks):
+        # Задача могла получить новый id при восстановлении, поэтому пишем строку целиком
+        self.addTasks(tasks)
+
+    def removeArchived(self, tasks):
+        self.enqueue([("DELETE FROM tasks WHERE id = ? AND archived = 1", self.idRows(tasks))])
+
+    def clearArchive(self):
+        self.enqueue([("DELETE FROM tasks WHERE archived = 1", [()])])
+
+    def logHistory(self, entry):
+        self.logHistoryMany([entry])
+
+    def logHistoryMany(self, entries):
+        self.enqueue([(self.INSERT_HISTORY, self.historyRows(entries))])
+
+    @staticmethod
+    def historyRows(entries):
+        return [(entry["action"], entry["timestamp"], json.dumps(entry["task"], ensure_ascii=False))
+                for entry in entries]
+
+    def applyBatch(self, entries, operations):
+        # Весь пакет — одна транзакция
+        batch = []
+        if entries:
+            batch.append((self.INSERT_HISTORY, self.historyRows(entries)))
+        for operation, tasks in operations:
+            if operation == "deleteTasks":
+                batch.append(("DELETE FROM tasks WHERE id = ?", self.idRows(tasks)))
+            elif operation == "archiveTasks":
+                batch.append(("UPDATE tasks SET archived = 1 WHERE id = ?", self.idRows(tasks)))
+            elif operation == "removeArchived":
+                batch.append(("DELETE FROM tasks WHERE id = ? AND archived = 1", self.idRows(tasks)))
+            else:  # addTasks, updateTasks, restoreTasks — строка задачи целиком
+                batch.append((self.INSERT_TASK, self.taskRows(tasks)))
+        self.enqueue(batch)
+
+    def iterHistory(self):
+        # Отдельное соединение: историю читают и из фонового потока
+        self.writes.wait()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for action, timestamp, task in conn.execute("SELECT action, timestamp, task FROM history ORDER BY seq"):
+                yield {"action": action, "task": json.loads(task), "timestamp": timestamp}
+        finally:
+            conn.close()
+
+    def importFromJson(self, file_path, archive, history):
+        # Однократный импорт прежних JSON-файлов и архива в одной транзакции.
+        # Отдельное соединение: импорт идёт в потоке загрузки задач
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone():
+                return
+            history.migrateLegacy()
+            active = PersistenceService.instance().readJson(file_path, []) or []
+            archive.migrateLegacy(max([task["id"] + 1 for task in active if "id" in task], default=1))
+            next_id = max(conn.execute("SELECT COALESCE(MAX(id), 0) FROM tasks").fetchone()[0], archive.maxId()) + 1
+            rows = []
+            for archived, tasks in ((0, active), (1, archive.iterTasks())):
+                for task in tasks:
+                    if "id" not in task:
+                        task["id"] = next_id
+                    next_id = max(next_id, task["id"] + 1)
+                    rows.append(self.taskToRow(task, archived))
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.executemany(
+                    "INSERT INTO history (action, timestamp, task) VALUES (?, ?, ?)",
+                    ((entry["action"], entry["timestamp"], json.dumps(entry["task"], ensure_ascii=False))
+                     for entry in history.iterEntries()))
+                conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)",
+                             (datetime.datetime.now().isoformat(),))
+        finally:
+            conn.close()
+
+#############################################
+# Репозиторий задач: хранилище выбранного типа и операции над задачами
+# вместе с записью в историю. Список активных задач ведёт вызывающий
+# (модель вкладки «Список дел» или консольная утилита) и отдаёт его через snapshot.
+#############################################
+class TaskRepository:
+    def __init__(self, data_dir=".", backend="json", snapshot=None):
+        self.data_dir = data_dir
+        self.file_path = os.path.join(data_dir, "tasks.json")  # файл для активных задач
+        self.archive_path = os.path.join(data_dir, "tasks_archive.json")  # прежний файл архива
+        self.archive_dir = os.path.join(data_dir, "tasks_archive")  # сегментированный архив
+        self.history_path = os.path.join(data_dir, "tasks_history.jsonl")  # журнал истории
+        self.db_path = os.path.join(data_dir, "omnidesk.db")  # база SQLite
+        self.history_listeners = []  # listener(entry) после каждой записи истории
+        # Пакет изменений (begin/commit): записи истории и операции с хранилищем
+        # копятся и записываются одним разом при commit
+        self.batch_depth = 0
+        self.batch_entries = []
+        self.batch_operations = []  # (метод хранилища, задачи); соседние одного вида склеены
+        self.storage = self.createStorage(backend, snapshot)
+
+    def createStorage(self, backend, snapshot):
+        history = HistoryJournal(self.history_path, legacy_path=os.path.join(self.data_dir, "tasks_history.json"))
+        archive = SegmentedArchive(self.archive_dir, legacy_path=self.archive_path)
+        if backend == "sqlite":
+            # Импорт JSON-файлов и перенос старой истории — в loadTasks, в потоке загрузки
+            return SqliteTaskStorage(self.db_path, legacy=(self.file_path, archive, history))
+        return JsonTaskStorage(self.file_path, archive, history, snapshot=snapshot)
+
+    @staticmethod
+    def newTask(text, priority="Низкий", category="Общее", completed=False, timestamp=None, due=None, remind=None):
+        # due и remind — строки ISO или секунды Unix
+        if timestamp:
+            task = TaskRecord.fromDict({"text": text, "completed": completed, "priority": priority,
+                                        "category": category, "timestamp": timestamp})
+        else:
+            task = TaskRecord(None, text, completed, priority, category, int(time.time()))
+        if due:
+            task.due = due
+        if remind:
+            task.remind = remind
+        return task
+
+    def load(self):
+        # Словари из хранилища сразу превращаются в компактные записи (в потоке загрузки)
+        with Instrumentation.instance().measure("tasks.load"):
+            return [TaskRecord.fromDict(task) for task in self.storage.loadTasks()]
+
+    def nextId(self):
+        # Первый свободный id с учётом архива
+        return self.storage.maxTaskId() + 1
+
+    def addHistoryListener(self, listener):
+        self.history_listeners.append(listener)
+
+    def historyEntry(self, action, task):
+        return {
+            "action": action,
+            "task": taskToDict(task),
+            "timestamp": datetime.datetime.now().isoformat()
+        }
+
+    def logHistory(self, action, tasks):
+        entries = [self.historyEntry(action, task) for task in tasks]
+        if self.batch_depth:
+            self.batch_entries.extend(entries)
+            return
+        with Instrumentation.instance().measure("tasks.logHistory"):
+            self.storage.logHistoryMany(entries)
+        self.notifyHistory(entries)
+
+    def notifyHistory(self, entries):
+        for entry in entries:
+            for listener in self.history_listeners:
+                listener(entry)
+
+    def apply(self, operation, tasks):
+        if not self.batch_depth:
+            getattr(self.storage, operation)(tasks)
+        elif self.batch_operations and self.batch_operations[-1][0] == operation:
+            self.batch_operations[-1][1].extend(tasks)
+        else:
+            self.batch_operations.append((operation, list(tasks)))
+
+    def begin(self):
+        # Пакеты могут быть вложенными; записывает внешний commit
+        self.batch_depth += 1
+
+    def commit(self):
+        self.batch_depth -= 1
+        if self.batch_depth:
+            return
+        entries, operations = self.batch_entries, self.batch_operations
+        self.batch_entries, self.batch_operations = [], []
+        if entries or operations:
+            with Instrumentation.instance().measure("tasks.commitBatch"):
+                self.storage.applyBatch(entries, operations)
+        self.notifyHistory(entries)
+
+    @contextlib.contextmanager
+    def batch(self):
+        # with repository.batch(): ... — commit выполняется и при исключении,
+        # чтобы файлы не разошлись с уже изменёнными в памяти задачами
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.commit()
+
+    def add(self, tasks):
+        self.logHistory("added", tasks)
+        self.apply("addTasks", tasks)
+
+    def update(self, task):
+        self.logHistory("changed", [task])
+        if self.batch_depth:
+            self.apply("updateTasks", [task])
+        else:
+            self.storage.updateTask(task)
+
+    def delete(self, tasks):
+        self.apply("deleteTasks", tasks)
+
+    def archive(self, tasks):
+        self.logHistory("archived", tasks)
+        self.apply("archiveTasks", tasks)
+
+    def restore(self, tasks, archived=None):
+        # archived — копии задач, какими они лежали в архиве: если при восстановлении
+        # id сменился (был занят), архивная копия удаляется по исходному id
+        self.logHistory("restored", tasks)
+        if archived is not None:
+            self.apply("removeArchived", archived)
+        self.apply("restoreTasks", tasks)
+
+    def clearArchive(self):
+        # Возвращает удалённые задачи, чтобы подписчики (индекс, синхронизация) их забыли
+        cleared = list(self.storage.iterArchive())
+        self.storage.clearArchive()
+        return cleared
+
+#############################################
+# Вторичные индексы задач: по категории, приоритету, статусу выполнения
+# и времени создания. Обновляются точечно при добавлении, изменении и удалении.
+#############################################
+class TaskIndex:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # Ключи — коды приоритета и категории и время создания в секундах (TaskRecord)
+        self.by_category = {}
+        self.by_priority = {}
+        self.by_completed = {True: set(), False: set()}
+        self.by_timestamp = []  # отсортированные пары (created, id); без времени — -1
+        self.all_ids = set()
+
+    @staticmethod
+    def timeKey(task):
+        return -1 if task.created is None else task.created
+
+    def add(self, task):
+        task = TaskRecord.fromDict(task)
+        task_id = task.id
+        self.all_ids.add(task_id)
+        self.by_category.setdefault(task.category_code, set()).add(task_id)
+        self.by_priority.setdefault(task.priority_code, set()).add(task_id)
+        self.by_completed[bool(task.completed)].add(task_id)
+        bisect.insort(self.by_timestamp, (self.timeKey(task), task_id))
+
+    def remove(self, task):
+        task = TaskRecord.fromDict(task)
+        task_id = task.id
+        self.all_ids.discard(task_id)
+        self.by_category.get(task.category_code, set()).discard(task_id)
+        self.by_priority.get(task.priority_code, set()).discard(task_id)
+        self.by_completed[bool(task.completed)].discard(task_id)
+        key = (self.timeKey(task), task_id)
+        pos = bisect.bisect_left(self.by_timestamp, key)
+        if pos < len(self.by_timestamp) and self.by_timestamp[pos] == key:
+            del self.by_timestamp[pos]
+
+    def setCompleted(self, task_id, completed):
+        self.by_completed[not completed].discard(task_id)
+        self.by_completed[completed].add(task_id)
+
+    def rebuild(self, tasks):
+        self.clear()
+        for task in tasks:
+            task = TaskRecord.fromDict(task)
+            task_id = task.id
+            self.all_ids.add(task_id)
+            self.by_category.setdefault(task.category_code, set()).add(task_id)
+            self.by_priority.setdefault(task.priority_code, set()).add(task_id)
+            self.by_completed[bool(task.completed)].add(task_id)
+            self.by_timestamp.append((self.timeKey(task), task_id))
+        self.by_timestamp.sort()
+
+    def match(self, category=None, priority=None, completed=None, since=None, until=None):
+        # Пересечение индексов, начиная с самого маленького множества;
+        # None у параметра означает «без ограничения». since/until — строки ISO
+        candidates = []
+        if category is not None:
+            candidates.append(self.by_category.get(CATEGORIES.lookup(category), set()))
+        if priority is not None:
+            candidates.append(self.by_priority.get(PRIORITIES.lookup(priority), set()))
+        if completed is not None:
+            candidates.append(self.by_completed[bool(completed)])
+        if since is not None or until is not None:
+            since_key, until_key = isoToEpoch(since), isoToEpoch(until)
+            lo = 0 if since_key is None else bisect.bisect_left(self.by_timestamp, (since_key,))
+            hi = len(self.by_timestamp) if until_key is None else \
+                bisect.bisect_right(self.by_timestamp, (until_key, float("inf")))
+            candidates.append({task_id for _, task_id in self.by_timestamp[lo:hi]})
+        if not candidates:
+            return set(self.all_ids)
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for other in candidates[1:]:
+            result &= other
+        return result
+
+#############################################
+# Очередь напоминаний: мин-куча ближайших сроков и напоминаний активных задач.
+# Изменённая задача добавляет записи нового поколения, прежние считаются устаревшими
+# и выбрасываются, когда доходят до вершины (ленивое удаление). В простое
+# очередь ничего не делает: приложение заводит один таймер на nextTime().
+#############################################
+class ReminderQueue:
+    KINDS = ("remind", "due")
+
+    def __init__(self):
+        # Запись кучи: (время, номер вида, поколение, id задачи); при равном времени
+        # напоминание раньше срока. Поколение меняется при каждой перепланировке задачи,
+        # поэтому записи прежних поколений устаревают целиком
+        self.heap = []
+        self.scheduled = {}  # id задачи -> (время напоминания, срок, поколение)
+        self.generation = 0
+
+    @staticmethod
+    def times(task):
+        if task.completed or task.id is None or (task.remind_at is None and task.due_at is None):
+            return None
+        return (task.remind_at, task.due_at)
+
+    def rebuild(self, tasks, now):
+        # Полная перестройка за O(n): прошедшие события не планируются
+        self.scheduled = {}
+        self.heap = []
+        for task in tasks:
+            times = self.times(task)
+            if times is not None:
+                self.generation += 1
+                self.scheduled[task.id] = times + (self.generation,)
+                self.heap.extend(self.entries(task.id, times, now))
+        heapq.heapify(self.heap)
+
+    def entries(self, task_id, times, now):
+        return [(moment, kind, self.generation, task_id) for kind, moment in enumerate(times)
+                if moment is not None and moment > now]
+
+    def update(self, task, now):
+        times = self.times(task)
+        current = self.scheduled.get(task.id)
+        if times == (current[:2] if current else None):
+            return
+        if times is None:
+            self.remove(task.id)
+            return
+        self.generation += 1
+        self.scheduled[task.id] = times + (self.generation,)
+        for entry in self.entries(task.id, times, now):
+            heapq.heappush(self.heap, entry)
+        self.compact()
+
+    def remove(self, task_id):
+        if self.scheduled.pop(task_id, None) is not None:
+            self.compact()
+
+    def isCurrent(self, entry):
+        current = self.scheduled.get(entry[3])
+        return current is not None and current[2] == entry[2]
+
+    def compact(self):
+        # Устаревших записей стало заметно больше живых — пересобираем кучу
+        if len(self.heap) > 4 * len(self.scheduled) + 64:
+            self.heap = [entry for entry in self.heap if self.isCurrent(entry)]
+            heapq.heapify(self.heap)
+
+    def nextTime(self):
+        while self.heap and not self.isCurrent(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def popDue(self, now):
+        # Наступившие события: список (id задачи, вид) по порядку времени
+        fired = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if self.isCurrent(entry):
+                fired.append((entry[3], self.KINDS[entry[1]]))
+        return fired
+
+#############################################
+# Экспорт задач, архива и истории в CSV или JSON Lines. Строки пишутся
+# потоково, поэтому память не зависит от объёма данных. В приложении exportData
+# выполняется в фоновом потоке (ExportWorker), в консоли — командой export.
+#############################################
+EXPORT_FIELDS = ["source", "id", "text", "completed", "priority", "category", "timestamp",
+                 "due", "remind", "action", "action_timestamp"]
+
+def iterExportRows(sources, tasks, storage):
+    # tasks — записи, словари или снимки TaskRecord.freeze() (экспорт в фоновом потоке)
+    if "tasks" in sources:
+        for task in tasks:
+            yield dict(frozenToDict(task) if isinstance(task, tuple) else taskToDict(task), source="tasks")
+    if "archive" in sources:
+        for task in storage.iterArchive():
+            yield dict(task, source="archive")
+    if "history" in sources:
+        for entry in storage.iterHistory():
+            yield dict(entry.get("task", {}), source="history",
+                       action=entry.get("action"), action_timestamp=entry.get("timestamp"))
+
+def exportData(path, fmt, sources, tasks, storage, progress=None, cancelled=None, progress_every=1000):
+    # Пишем во временный файл и переименовываем его только после успешного завершения.
+    # Возвращает число записанных строк или None, если экспорт отменён.
+    tmp_path = path + ".part"
+    count = 0
+    aborted = False
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            write_row = writer.writerow
+        else:
+            def write_row(row):
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        for row in iterExportRows(sources, tasks, storage):
+            write_row(row)
+            count += 1
+            if count % progress_every == 0:
+                if cancelled is not None and cancelled():
+                    aborted = True
+                    break
+                if progress is not None:
+                    progress(count)
+    if aborted:
+        os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, path)
+    if progress is not None:
+        progress(count)
+    return count
+
+#############################################
+# Импорт задач из CSV с заголовком, JSON Lines или JSON-массива. Нужна хотя бы
+# колонка text; остальные поля берутся, если есть. Используется кнопкой
+# «Импорт…» списка дел и командой import консольной утилиты.
+#############################################
+def parseBool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "да", "+")
+
+def readTaskRows(path, fmt=None):
+    if fmt is None:
+        fmt = {".csv": "csv", ".jsonl": "jsonl"}.get(os.path.splitext(path)[1].lower(), "json")
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        elif fmt == "jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+def importTasks(path, fmt=None):
+    # Новые задачи без id: номера назначает тот, кто их добавляет
+    tasks = []
+    for row in readTaskRows(path, fmt):
+        text = str(row.get("text") or "").strip()
+        if not text:
+            continue
+        tasks.append(TaskRepository.newTask(text, row.get("priority") or "Низкий", row.get("category") or "Общее",
+                                            parseBool(row.get("completed", False)), row.get("timestamp") or None,
+                                            row.get("due") or None, row.get("remind") or None))
+    return tasks
+
+#############################################
+# Хранилище заметок: каталог notes/ с отдельным файлом на каждую заметку
+# (<id>.json) и небольшим index.json с порядком и заголовками.
+# Старый notes.json переносится один раз.
+#############################################
+class NoteStore:
+    def __init__(self, directory, legacy_path=None):
+        self.directory = directory
+        self.legacy_path = legacy_path  # старый notes.json
+        self.index_path = os.path.join(directory, "index.json")
+        self.persistence = PersistenceService.instance()
+
+    def notePath(self, note_id):
+        return os.path.join(self.directory, f"{note_id}.json")
+
+    def migrateLegacy(self):
+        if not self.legacy_path or not os.path.exists(self.legacy_path) or os.path.exists(self.index_path):
+            return
+        with open(self.legacy_path, 'r', encoding='utf-8') as f:
+            notes = json.load(f)
+        for note_id, note in enumerate(notes, 1):
+            note.setdefault("id", note_id)
+            self.saveNote(note)
+        self.saveIndex(notes)
+        self.persistence.flush()
+        os.replace(self.legacy_path, self.legacy_path + ".migrated")
+
+    def loadIndex(self):
+        # Если index.json потерян, восстанавливаем его по файлам заметок
+        self.migrateLegacy()
+        entries = self.persistence.readJson(self.index_path)
+        if entries is not None:
+            return entries
+        if not os.path.isdir(self.directory):
+            return []
+        ids = sorted(int(name[:-5]) for name in os.listdir(self.directory)
+                     if name.endswith(".json") and name[:-5].isdigit())
+        entries = []
+        for note_id in ids:
+            note = self.loadNote(note_id)
+            if note is not None:
+                entries.append({"id": note_id, "title": note.get("title", "")})
+        return entries
+
+    def loadNote(self, note_id):
+        try:
+            return self.persistence.readJson(self.notePath(note_id))
+        except (OSError, ValueError):
+            return None
+
+    def saveNote(self, note):
+        self.persistence.writeJson(self.notePath(note["id"]), dict(note))
+
+    def deleteNote(self, note_id):
+        self.persistence.removeFile(self.notePath(note_id))
+
+    def saveIndex(self, notes):
+        self.persistence.writeJson(self.index_path, [{"id": note["id"], "title": note["title"]} for note in notes])
+
+#############################################
+# Кэш текстов заметок: последние открытые тексты с ограничением по суммарному
+# размеру (в символах). Закреплённые записи (ещё не сохранённые) не вытесняются.
+#############################################
+class NoteBodyCache:
+    def __init__(self, max_chars=4 * 1024 * 1024):
+        self.max_chars = max_chars
+        self.entries = OrderedDict()  # id заметки -> текст
+        self.size = 0
+        self.pinned = set()
+
+    def get(self, note_id):
+        content = self.entries.get(note_id)
+        if content is not None:
+            self.entries.move_to_end(note_id)
+        return content
+
+    def put(self, note_id, content):
+        self.discard(note_id)
+        self.entries[note_id] = content
+        self.size += len(content)
+        self.evict()
+
+    def discard(self, note_id):
+        content = self.entries.pop(note_id, None)
+        if content is not None:
+            self.size -= len(content)
+
+    def pin(self, note_id):
+        self.pinned.add(note_id)
+
+    def unpin(self, note_id):
+        self.pinned.discard(note_id)
+        self.evict()
+
+    def evict(self):
+        if self.size <= self.max_chars:
+            return
+        for note_id in list(self.entries):
+            if self.size <= self.max_chars:
+                break
+            if note_id not in self.pinned:
+                self.discard(note_id)
+
+#############################################
+# Репозиторий заметок: список заголовков, тексты по требованию через кэш,
+# учёт изменённых заметок и запись только их. Используется органайзером
+# заметок и консольной утилитой.
+#############################################
+class NoteRepository:
+    def __init__(self, data_dir="."):
+        self.store = NoteStore(os.path.join(data_dir, "notes"), legacy_path=os.path.join(data_dir, "notes.json"))
+        # Список заметок держит только "id" и "title"; тексты читаются по требованию
+        self.notes = []
+        self.bodies = NoteBodyCache()
+        self.next_id = 1
+        self.dirty = set()  # id заметок, изменённых после последнего сохранения
+        self.index_dirty = False  # изменились состав, порядок или заголовки заметок
+
+    def load(self):
+        # Список обновляется на месте: на него могут ссылаться вызывающие
+        with Instrumentation.instance().measure("notes.load"):
+            entries = self.store.loadIndex()
+        self.notes[:] = [{"id": entry["id"], "title": entry["title"]} for entry in entries]
+        self.next_id = max([self.next_id] + [note["id"] + 1 for note in self.notes])
+        self.dirty = set()
+        self.index_dirty = False
+        return self.notes
+
+    def rowOf(self, note_id):
+        return next((row for row, note in enumerate(self.notes) if note["id"] == note_id), None)
+
+    def create(self, title, content=""):
+        note = {"id": self.next_id, "title": title}
+        self.next_id += 1
+        self.notes.append(note)
+        self.index_dirty = True
+        self.setBody(note["id"], content)
+        return note
+
+    def rename(self, note, title):
+        note["title"] = title
+        self.dirty.add(note["id"])
+        self.index_dirty = True
+
+    def delete(self, note_id):
+        row = self.rowOf(note_id)
+        if row is None:
+            return None
+        self.notes.pop(row)
+        self.dirty.discard(note_id)
+        self.bodies.unpin(note_id)
+        self.bodies.discard(note_id)
+        self.index_dirty = True
+        self.store.deleteNote(note_id)
+        return row
+
+    def readBody(self, note_id):
+        data = self.store.loadNote(note_id)
+        return data.get("content", "") if data else ""
+
+    def body(self, note_id):
+        content = self.bodies.get(note_id)
+        if content is None:
+            content = self.readBody(note_id)
+            self.bodies.put(note_id, content)
+        return content
+
+    def setBody(self, note_id, content):
+        # Несохранённый текст закреплён в кэше до записи на диск
+        self.bodies.pin(note_id)
+        self.bodies.put(note_id, content)
+        self.dirty.add(note_id)
+
+    def iterNotes(self):
+        # Полные заметки для перестроения индекса или экспорта; кэш при этом не засоряется
+        for note in self.notes:
+            content = self.bodies.get(note["id"])
+            if content is None:
+                content = self.readBody(note["id"])
+            yield {"id": note["id"], "title": note["title"], "content": content}
+
+    def save(self):
+        # Записываются только изменённые заметки; каждая — отдельным атомарным файлом.
+        # Возвращает записанные заметки целиком
+        if self.index_dirty:
+            self.store.saveIndex(self.notes)
+            self.index_dirty = False
+        saved = []
+        if self.dirty:
+            for note in self.notes:
+                if note["id"] in self.dirty:
+                    full_note = {"id": note["id"], "title": note["title"], "content": self.body(note["id"])}
+                    self.store.saveNote(full_note)
+                    self.bodies.unpin(note["id"])
+                    saved.append(full_note)
+            self.dirty = set()
+        return saved
+
+#############################################
+# Полнотекстовый индекс по заметкам, задачам (включая архив) и сохранённым
+# файлам редактора. Обновляется по одному документу, хранится на диске,
+# по последнему слову запроса ищет по префиксу. Используется палитрой поиска.
+#############################################
+class FullTextIndex:
+    TOKEN_RE = re.compile(r"\w+")
+    MAX_EXPANSIONS = 300  # сколько слов словаря может подставить один префикс
+
+    def __init__(self, path):
+        self.path = path
+        self.docs = {}        # id документа -> (вид, заголовок, {слово: частота})
+        self.postings = {}    # слово -> {id документа: частота}
+        self.vocabulary = []  # отсортированный список слов для поиска по префиксу
+        self.loaded = False
+        self.dirty = False
+
+    @classmethod
+    def tokenize(cls, text):
+        # Латиница и кириллица приводятся к нижнему регистру, «ё» считается «е»
+        return [token for token in cls.TOKEN_RE.findall(text.lower().replace("ё", "е")) if len(token) > 1]
+
+    def ensureLoaded(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        data = PersistenceService.instance().readJson(self.path, None, compressed=True)
+        if not data:
+            return
+        for doc_id, (kind, title, tokens) in data["docs"].items():
+            self.docs[doc_id] = (kind, title, tokens)
+            for token, tf in tokens.items():
+                self.postings.setdefault(token, {})[doc_id] = tf
+        self.vocabulary = sorted(self.postings)
+
+    def isEmpty(self):
+        self.ensureLoaded()
+        return not self.docs
+
+    def update(self, doc_id, kind, title, text):
+        self.ensureLoaded()
+        tokens = dict(Counter(self.tokenize(title) * 3 + self.tokenize(text)))
+        old = self.docs.get(doc_id)
+        if old is not None and old[2] == tokens:
+            if old[:2] != (kind, title):
+                self.docs[doc_id] = (kind, title, tokens)
+                self.dirty = True
+            return
+        if old is not None:
+            self.dropPostings(doc_id, old[2])
+        self.docs[doc_id] = (kind, title, tokens)
+        for token, tf in tokens.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                bisect.insort(self.vocabulary, token)
+            posting[doc_id] = tf
+        self.dirty = True
+
+    def setKind(self, doc_id, kind):
+        self.ensureLoaded()
+        doc = self.docs.get(doc_id)
+        if doc is not None and doc[0] != kind:
+            self.docs[doc_id] = (kind, doc[1], doc[2])
+            self.dirty = True
+
+    def remove(self, doc_id):
+        self.ensureLoaded()
+        doc = self.docs.pop(doc_id, None)
+        if doc is not None:
+            self.dropPostings(doc_id, doc[2])
+            self.dirty = True
+
+    def removeKind(self, kind):
+        for doc_id in [doc_id for doc_id, doc in self.docs.items() if doc[0] == kind]:
+            self.remove(doc_id)
+
+    def dropPostings(self, doc_id, tokens):
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[token]
+                pos = bisect.bisect_left(self.vocabulary, token)
+                if pos < len(self.vocabulary) and self.vocabulary[pos] == token:
+                    del self.vocabulary[pos]
+
+    def expand(self, prefix):
+        pos = bisect.bisect_left(self.vocabulary, prefix)
+        end = min(pos + self.MAX_EXPANSIONS, len(self.vocabulary))
+        while pos < end and self.vocabulary[pos].startswith(prefix):
+            yield self.vocabulary[pos]
+            pos += 1
+
+    def search(self, query, limit=20):
+        # Документ должен содержать все слова запроса (каждое — как префикс);
+        # ранжирование по tf-idf, точное совпадение слова весит вдвое больше
+        self.ensureLoaded()
+        query_tokens = list(dict.fromkeys(self.tokenize(query)))
+        if not query_tokens:
+            return []
+        total = len(self.docs)
+        expansions = []
+        for query_token in query_tokens:
+            tokens = list(self.expand(query_token))
+            if not tokens:
+                return []
+            expansions.append((sum(len(self.postings[token]) for token in tokens), query_token, tokens))
+        # Начинаем с самого редкого слова, дальше считаем только оставшихся кандидатов
+        expansions.sort()
+        scores = None
+        for _, query_token, tokens in expansions:
+            matched = {}
+            for token in tokens:
+                posting = self.postings[token]
+                weight = math.log(1 + total / len(posting)) * (2.0 if token == query_token else 1.0)
+                if scores is None:
+                    for doc_id, tf in posting.items():
+                        matched[doc_id] = matched.get(doc_id, 0.0) + tf * weight
+                else:
+                    for doc_id in (scores.keys() & posting.keys()):
+                        matched[doc_id] = matched.get(doc_id, scores[doc_id]) + posting[doc_id] * weight
+            scores = matched
+            if not scores:
+                return []
+        best = heapq.nlargest(limit, scores.items(), key=lambda pair: pair[1])
+        return [(doc_id, self.docs[doc_id][0], self.docs[doc_id][1], score) for doc_id, score in best]
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        # Кортежи документов не изменяются на месте, поэтому достаточно копии словаря
+        PersistenceService.instance().writeJson(self.path, {"version": 1, "docs": dict(self.docs)}, compressed=True)
+
+#############################################
+# Синхронизация. Каждое изменение задачи, заметки или записи истории попадает
+# в журнал исходящих изменений (outbox) с часами Лэмпорта и id устройства.
+# syncData сначала забирает чужие изменения после своего курсора, затем
+# отправляет свои пакетами. Конфликт (запись изменена и здесь, и на другом
+# устройстве) решается по версии (часы, устройство): побеждает более поздняя,
+# проигравшая версия заметки сохраняется копией.
+#############################################
+class FileSyncServer:
+    # Эталонный сервер — каталог (локальный или общий сетевой/облачный):
+    # log/<seq>.json — принятые пакеты по порядку, batches/<id> — номера принятых пакетов
+    def __init__(self, root):
+        self.root = root
+        self.log_dir = os.path.join(root, "log")
+        self.batches_dir = os.path.join(root, "batches")
+        os.makedirs(self.log_dir, exist_ok=True)
+        os.makedirs(self.batches_dir, exist_ok=True)
+
+    def batchPath(self, seq):
+        return os.path.join(self.log_dir, f"{seq:010d}.json")
+
+    def head(self):
+        # head.json — только подсказка, точное значение находим проверкой следующих файлов
+        seq = 0
+        try:
+            with open(os.path.join(self.root, "head.json"), 'r', encoding='utf-8') as f:
+                seq = json.load(f)["seq"]
+        except (OSError, ValueError, KeyError):
+            pass
+        while os.path.exists(self.batchPath(seq + 1)):
+            seq += 1
+        return seq
+
+    def writeFile(self, path, payload):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+    def push(self, batch_id, changes):
+        # Повторная отправка того же пакета (после обрыва) не создаёт дубликат
+        marker = os.path.join(self.batches_dir, batch_id)
+        if os.path.exists(marker):
+            with open(marker, 'r', encoding='utf-8') as f:
+                return int(f.read())
+        payload = json.dumps({"batch": batch_id, "changes": changes}, ensure_ascii=False).encode('utf-8')
+        tmp_path = self.writeFile(self.batchPath(0), payload)
+        seq = self.head() + 1
+        try:
+            while True:
+                # os.link атомарно занимает номер уже целиком записанным файлом
+                try:
+                    os.link(tmp_path, self.batchPath(seq))
+                    break
+                except FileExistsError:
+                    seq += 1
+        finally:
+            os.remove(tmp_path)
+        os.replace(self.writeFile(marker, str(seq).encode()), marker)
+        head_path = os.path.join(self.root, "head.json")
+        os.replace(self.writeFile(head_path, json.dumps({"seq": seq}).encode()), head_path)
+        return seq
+
+    def pull(self, cursor, limit=500):
+        # Изменения из пакетов после cursor; пакет не делится, поэтому курсор всегда целый
+        changes = []
+        while len(changes) < limit and os.path.exists(self.batchPath(cursor + 1)):
+            with open(self.batchPath(cursor + 1), 'r', encoding='utf-8') as f:
+                changes.extend(json.load(f)["changes"])
+            cursor += 1
+        return changes, cursor
+
+class SyncEngine:
+    BATCH_SIZE = 500
+
+    def __init__(self, directory="sync"):
+        self.directory = directory
+        self.state_path = os.path.join(directory, "state.json")
+        self.outbox_path = os.path.join(directory, "outbox.jsonl")
+        self.persistence = PersistenceService.instance()
+        os.makedirs(directory, exist_ok=True)
+        state = self.persistence.readJson(self.state_path) or {}
+        self.device = state.get("device") or uuid.uuid4().hex[:12]
+        self.clock = state.get("clock", 0)
+        self.cursor = state.get("cursor", 0)
+        # Записи, созданные до включения синхронизации, один раз заносятся в outbox (seed)
+        self.seeded = state.get("seeded", False)
+        self.versions = state.get("versions", {})  # ключ записи -> [часы, устройство]
+        # Соответствие глобальных id записей (uid) локальным id задач и заметок
+        self.uids = {kind: dict(ids) for kind, ids in state.get("ids", {"task": {}, "note": {}}).items()}
+        self.local_ids = {kind: {local_id: uid for uid, local_id in ids.items()} for kind, ids in self.uids.items()}
+        self.outbox = OrderedDict()  # ключ записи -> последнее неотправленное изменение
+        self.applying = False  # изменения, пришедшие с сервера, в outbox не записываются
+        self.loadOutbox()
+
+    def loadOutbox(self):
+        if not os.path.exists(self.outbox_path):
+            return
+        with open(self.outbox_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    continue  # недописанная при сбое строка
+                self.outbox.pop(change["key"], None)
+                self.outbox[change["key"]] = change
+                # Часы не должны откатиться, даже если state.json не успел записаться
+                self.clock = max(self.clock, change["clock"])
+                self.bindLocalId(change["kind"], change["uid"], change.get("local_id"))
+
+    def rewriteOutbox(self):
+        # Синхронно и атомарно: сразу после этого в файл снова дописывают record
+        self.persistence.writeAtomic(self.outbox_path, ("text", "".join(
+            json.dumps(change, ensure_ascii=False) + "\n" for change in self.outbox.values()), None))
+
+    def saveState(self):
+        self.persistence.writeJson(self.state_path, {
+            "device": self.device, "clock": self.clock, "cursor": self.cursor, "seeded": self.seeded,
+            "versions": dict(self.versions), "ids": {kind: dict(ids) for kind, ids in self.uids.items()}})
+
+    def localId(self, kind, uid):
+        return self.uids.get(kind, {}).get(uid)
+
+    def bindLocalId(self, kind, uid, local_id):
+        if local_id is not None and kind in self.uids:
+            self.uids[kind][uid] = local_id
+            self.local_ids[kind][local_id] = uid
+
+    def record(self, kind, local_id, data, deleted=False):
+        self.recordMany([(kind, local_id, data, deleted)])
+
+    def recordMany(self, records):
+        # records — (вид, локальный id, данные, удалена ли); в файл — одной дозаписью
+        if self.applying:
+            return
+        lines = []
+        for kind, local_id, data, deleted in records:
+            if kind == "history" and not self.seeded:
+                continue  # история целиком уйдёт с первым seed, иначе записи задвоятся
+            self.clock += 1
+            if local_id is None:
+                uid = f"{self.device}:{self.clock}"  # записи истории не меняются, id — сама версия
+            else:
+                uid = self.local_ids[kind].get(local_id) or f"{self.device}:{local_id}"
+                self.bindLocalId(kind, uid, local_id)
+            key = f"{kind}/{uid}"
+            # base — версия, от которой сделано изменение; по ней получатель узнаёт конфликт
+            change = {"key": key, "kind": kind, "uid": uid, "local_id": local_id, "clock": self.clock,
+                      "device": self.device, "base": self.versions.get(key), "deleted": deleted, "data": data}
+            if kind != "history":
+                self.versions[key] = [self.clock, self.device]
+            self.outbox.pop(key, None)
+            self.outbox[key] = change
+            lines.append(json.dumps(change, ensure_ascii=False) + "\n")
+        if not lines:
+            return
+        # Дописываем сразу: несинхронизированные изменения переживают перезапуск
+        with open(self.outbox_path, 'a', encoding='utf-8') as f:
+            f.write("".join(lines))
+
+    def seed(self, records):
+        # Первый запуск синхронизации: всё, что уже есть на устройстве, уходит на сервер
+        self.seeded = True
+        self.recordMany(records)
+        self.saveState()
+
+    def pull(self, server, apply):
+        # apply(change, conflict) применяет изменение и возвращает локальный id записи;
+        # conflict=True — изменение сделано без учёта нашей версии, и наша проиграла.
+        # После каждой порции сохраняем курсор, так что прерванная загрузка продолжается с него.
+        received = 0
+        while True:
+            changes, cursor = server.pull(self.cursor, self.BATCH_SIZE)
+            if cursor == self.cursor:
+                break
+            outbox_changed = False
+            for change in changes:
+                self.clock = max(self.clock, change["clock"])
+                if change["device"] == self.device:
+                    continue
+                key = change["key"]
+                version = [change["clock"], change["device"]]
+                local_version = self.versions.get(key)
+                if local_version is not None and local_version >= version:
+                    continue  # у нас версия новее; своё изменение уйдёт при отправке
+                conflict = local_version is not None and change.get("base") != local_version
+                if self.outbox.pop(key, None) is not None:
+                    outbox_changed = True
+                self.applying = True
+                try:
+                    local_id = apply(change, conflict)
+                finally:
+                    self.applying = False
+                if change["kind"] != "history":
+                    self.bindLocalId(change["kind"], change["uid"], local_id)
+                    self.versions[key] = version
+                received += 1
+            if outbox_changed:
+                self.rewriteOutbox()
+            self.cursor = cursor
+            self.saveState()
+        return received
+
+    def push(self, server):
+        # Пакет удаляется из outbox только после подтверждения сервером; id пакета
+        # определяется его содержимым, поэтому повторная отправка безопасна
+        # Outbox переписывается один раз в конце (и при ошибке), а не после каждого пакета:
+        # после сбоя пакеты соберутся заново теми же и сервер не примет их повторно
+        sent = 0
+        changes = iter(list(self.outbox.values()))
+        try:
+            while True:
+                batch = list(itertools.islice(changes, self.BATCH_SIZE))
+                if not batch:
+                    break
+                batch_id = f"{self.device}-{batch[0]['clock']}-{batch[-1]['clock']}-{len(batch)}"
+                server.push(batch_id, batch)
+                for change in batch:
+                    if self.outbox.get(change["key"]) is change:
+                        del self.outbox[change["key"]]
+                sent += len(batch)
+        finally:
+            if sent:
+                self.rewriteOutbox()
+        self.saveState()
+        return sent
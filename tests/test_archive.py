@@ -0,0 +1,59 @@
+import pytest
+
+from omnidesk_core import PersistenceService, SegmentedArchive, TaskRecord, TaskRepository
+
+
+def makeTask(task_id, text=None, timestamp="2023-11-14T22:13:20"):
+    return TaskRecord.fromDict({"id": task_id, "text": text or f"задача {task_id}", "completed": True,
+                                "priority": "Низкий", "category": "Общее", "timestamp": timestamp})
+
+
+def test_segmented_archive_add_remove(tmp_path):
+    archive = SegmentedArchive(str(tmp_path / "archive"))
+    # Два месяца — два сегмента
+    archive.append([makeTask(1, timestamp="2023-11-14T22:13:20"), makeTask(2, timestamp="2024-01-11T19:06:40"),
+                    makeTask(3, timestamp="2024-01-11T19:06:40")])
+    assert archive.count() == 3
+    assert archive.maxId() == 3
+    archive.removeTasks([makeTask(2, timestamp="2024-01-11T19:06:40")])
+    PersistenceService.instance().flush()
+    reopened = SegmentedArchive(str(tmp_path / "archive"))
+    assert sorted(task["id"] for task in reopened.iterTasks()) == [1, 3]
+    assert reopened.count() == 2
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_archive_paging(tmp_path, backend):
+    active = []
+    repository = TaskRepository(str(tmp_path), backend=backend, snapshot=lambda: list(active))
+    tasks = [makeTask(task_id) for task_id in range(1, 26)]
+    repository.add(tasks)
+    repository.archive(tasks)
+    PersistenceService.instance().flush()
+    if backend == "sqlite":
+        tasks = list(repository.storage.iterArchive(page_size=7))
+    else:
+        tasks = list(repository.storage.iterArchive())
+    assert [task["id"] for task in tasks] == list(range(1, 26))
+    assert repository.storage.archiveCount() == 25
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_restore_with_taken_id_removes_archived_copy(tmp_path, backend):
+    # active — то, что показывает модель; JSON-хранилище сохраняет её снимок
+    active = [makeTask(1, "из архива")]
+    repository = TaskRepository(str(tmp_path), backend=backend, snapshot=lambda: list(active))
+    repository.add(active)
+    active.clear()
+    repository.archive([makeTask(1, "из архива")])
+    active.append(makeTask(1, "активная"))
+    repository.add(active)
+    # Исходный id занят — восстанавливаем под новым id
+    archived = list(repository.storage.iterArchive())
+    restored = makeTask(2, "из архива")
+    active.append(restored)
+    repository.restore([restored], archived)
+    PersistenceService.instance().flush()
+    reopened = TaskRepository(str(tmp_path), backend=backend)
+    assert reopened.storage.archiveCount() == 0
+    assert sorted((task.id, task.text) for task in reopened.load()) == [(1, "активная"), (2, "из архива")]
@@ -0,0 +1,18 @@
+import json
+
+from omnidesk_core import TaskRecord, TaskRepository, exportData
+
+
+def test_export_of_frozen_snapshots_ignores_later_edits(tmp_path):
+    task = TaskRecord.fromDict({"id": 1, "text": "до", "priority": "Высокий", "category": "Дом",
+                                "timestamp": "2024-01-05T10:00:00", "note": "доп"})
+    frozen = [task.freeze()]
+    task.text = "после"
+    task.completed = True
+    task["note"] = "изменено"
+    storage = TaskRepository(str(tmp_path), snapshot=lambda: []).storage
+    path = str(tmp_path / "out.jsonl")
+    assert exportData(path, "jsonl", ["tasks"], frozen, storage) == 1
+    row = json.loads(open(path, encoding="utf-8").read())
+    assert (row["text"], row["completed"], row["note"], row["source"]) == ("до", False, "доп", "tasks")
+    assert row["priority"] == "Высокий"
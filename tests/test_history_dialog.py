@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+pytest.importorskip("PyQt6")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+
+from OmniDesk import HistoryDialog, TaskRecord, TaskRepository  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def test_stale_batches_are_dropped(app, tmp_path):
+    repository = TaskRepository(str(tmp_path), backend="sqlite")
+    repository.logHistory("added", [TaskRecord(task_id, f"задача {task_id}") for task_id in range(1, 4)])
+    dialog = HistoryDialog(repository.storage)
+    dialog.loader.wait()
+    app.processEvents()
+    assert len(dialog.history_model.entries) == 3
+    stale = dialog.load_generation
+    dialog.search_edit.setText("задача 2")
+    dialog.reload()
+    dialog.loader.wait()
+    # Пачка прежней загрузки, пришедшая после reload, не попадает в список
+    dialog.onBatchReady(stale, [("2024-01-01T00:00:00", "added", "задача 1")])
+    dialog.onLoadFinished(stale)
+    app.processEvents()
+    assert [entry[2] for entry in dialog.history_model.entries] == ["задача 2"]
+    label = dialog.history_model.data(dialog.history_model.index(0))
+    assert label.endswith("  Добавлена – задача 2")
+    assert dialog.status_label.text() == "Найдено записей: 1"
+    dialog.done(0)
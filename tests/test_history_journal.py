@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+
+from omnidesk_core import HistoryJournal, PersistenceService
+
+
+def makeEntry(number):
+    return {"action": "add", "task": {"id": number, "text": f"задача {number}"}, "timestamp": "2024-01-01T12:00:00"}
+
+
+def test_rotation_keeps_order_and_segment_size(tmp_path):
+    path = str(tmp_path / "tasks_history.jsonl")
+    journal = HistoryJournal(path, max_bytes=400)
+    for number in range(10):
+        journal.append(makeEntry(number))
+    journal.appendMany([makeEntry(number) for number in range(10, 40)])
+    # Запись идёт в потоке сохранения
+    journal.flush()
+    paths = journal.segmentPaths()
+    assert len(paths) > 3
+    assert paths[-1] == path
+    assert [os.path.basename(p) for p in paths[:2]] == ["tasks_history.jsonl.000001", "tasks_history.jsonl.000002"]
+    assert all(os.path.getsize(p) <= 400 for p in paths)
+    assert [entry["task"]["id"] for entry in journal.iterEntries()] == list(range(40))
+
+
+def test_rotation_continues_numbering_after_reopen(tmp_path):
+    path = str(tmp_path / "tasks_history.jsonl")
+    journal = HistoryJournal(path, max_bytes=400)
+    journal.appendMany([makeEntry(number) for number in range(20)])
+    journal.flush()
+    segments = len(journal.segmentPaths())
+    reopened = HistoryJournal(path, max_bytes=400)
+    assert reopened.size == os.path.getsize(path)
+    reopened.appendMany([makeEntry(number) for number in range(20, 40)])
+    reopened.flush()
+    assert len(reopened.segmentPaths()) > segments
+    assert [entry["task"]["id"] for entry in reopened.iterEntries()] == list(range(40))
+
+
+def test_oversized_entry_gets_own_segment(tmp_path):
+    path = str(tmp_path / "tasks_history.jsonl")
+    journal = HistoryJournal(path, max_bytes=100)
+    big = makeEntry(1)
+    big["task"]["text"] = "x" * 500
+    journal.appendMany([makeEntry(0), big, makeEntry(2)])
+    assert [entry["task"]["id"] for entry in journal.iterEntries()] == [0, 1, 2]
+    assert len(journal.segmentPaths()) == 3
+
+
+def test_legacy_history_is_migrated_once(tmp_path):
+    legacy = tmp_path / "tasks_history.json"
+    legacy.write_text(json.dumps([makeEntry(1), makeEntry(2)]), encoding="utf-8")
+    path = str(tmp_path / "tasks_history.jsonl")
+    journal = HistoryJournal(path, legacy_path=str(legacy))
+    # Конструктор ничего не переносит: это делает загрузка задач в фоне
+    assert legacy.exists()
+    journal.migrateLegacy()
+    assert not legacy.exists()
+    assert (tmp_path / "tasks_history.json.migrated").exists()
+    journal.append(makeEntry(3))
+    journal.flush()
+    assert [entry["task"]["id"] for entry in HistoryJournal(path, legacy_path=str(legacy)).iterEntries()] == [1, 2, 3]
+
+
+def test_append_does_not_wait_for_disk(tmp_path):
+    persistence = PersistenceService.instance()
+    path = str(tmp_path / "tasks_history.jsonl")
+    journal = HistoryJournal(path)
+    release = threading.Event()
+    persistence.submit("block", release.wait)
+    journal.appendMany([makeEntry(number) for number in range(3)])
+    # Рабочий поток занят — вызывающий уже вернулся, а на диске ещё ничего нет
+    assert not os.path.exists(path)
+    release.set()
+    assert [entry["task"]["id"] for entry in journal.iterEntries()] == [0, 1, 2]
@@ -0,0 +1,84 @@
+import json
+import threading
+
+import pytest
+
+from omnidesk_core import PersistenceService
+
+
+@pytest.fixture
+def service():
+    # Отдельный экземпляр, а не общий PersistenceService.instance(): его можно остановить
+    service = PersistenceService()
+    yield service
+    if service.thread.is_alive():
+        service.shutdown()
+
+
+def blockWorker(service):
+    # Рабочий поток занят, пока тест не отпустит событие; очередь тем временем копится
+    started, release = threading.Event(), threading.Event()
+    service.submit("block", lambda: (started.set(), release.wait()))
+    started.wait()
+    return release
+
+
+def test_repeated_writes_to_one_path_are_coalesced(service, tmp_path):
+    written = []
+    service.addListener(lambda path, ok: written.append((path, ok)))
+    path = str(tmp_path / "data.json")
+    other = str(tmp_path / "other.json")
+    release = blockWorker(service)
+    for number in range(50):
+        service.writeJson(path, {"n": number})
+        if number == 10:
+            service.writeJson(other, {"n": "other"})
+    # Отложенные данные видны до записи на диск
+    assert service.readJson(path) == {"n": 49}
+    release.set()
+    service.flush()
+    assert json.loads(open(path, encoding="utf-8").read()) == {"n": 49}
+    # Одна запись на путь, в порядке первой постановки в очередь
+    assert written == [("block", True), (path, True), (other, True)]
+
+
+def test_callable_data_is_built_in_worker(service, tmp_path):
+    path = str(tmp_path / "data.json")
+    threads = []
+    service.writeJson(path, lambda: threads.append(threading.current_thread()) or [1, 2, 3])
+    service.flush()
+    assert json.loads(open(path, encoding="utf-8").read()) == [1, 2, 3]
+    assert threads == [service.thread]
+
+
+def test_delete_after_write_wins(service, tmp_path):
+    path = str(tmp_path / "notes.txt")
+    release = blockWorker(service)
+    service.writeText(path, "текст")
+    service.removeFile(path)
+    assert service.readText(path, "нет") == "нет"
+    release.set()
+    service.flush()
+    assert not (tmp_path / "notes.txt").exists()
+
+
+def test_failed_write_does_not_stop_worker(service, tmp_path):
+    results = []
+    service.addListener(lambda path, ok: results.append(ok))
+    service.submit("broken", lambda: 1 / 0)
+    service.writeText(str(tmp_path / "after.txt"), "ok")
+    service.flush()
+    assert results == [False, True]
+    assert (tmp_path / "after.txt").read_text(encoding="utf-8") == "ok"
+
+
+def test_shutdown_flushes_pending_writes(service, tmp_path):
+    release = blockWorker(service)
+    paths = [str(tmp_path / f"file{number}.json") for number in range(20)]
+    for number, path in enumerate(paths):
+        service.writeJson(path, number)
+    release.set()
+    service.shutdown()
+    assert not service.thread.is_alive()
+    assert [json.loads(open(path, encoding="utf-8").read()) for path in paths] == list(range(20))
+
@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("PyQt6")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from OmniDesk import PersistenceService, RecoveryJournal  # noqa: E402
+
+
+def test_journal_round_trip(tmp_path):
+    journal = RecoveryJournal(root=str(tmp_path / "recovery"))
+    journal.open("tab1", "Без имени")
+    journal.splice("tab1", 0, 1, ["первая", "вторая"])
+    journal.splice("tab1", 1, 2, ["2", "3"])
+    journal.flush()
+    PersistenceService.instance().flush()
+    assert journal.readText("tab1") == "первая\n2\n3"
+    journal.discard("tab1")
+    journal.flush()
+    PersistenceService.instance().flush()
+    assert journal.entries() == []
+
+
+def test_file_header_sees_queued_save(tmp_path):
+    persistence = PersistenceService.instance()
+    file_path = str(tmp_path / "doc.txt")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write("старый\nтекст")
+    journal = RecoveryJournal(root=str(tmp_path / "recovery"))
+    # Задача журнала уже стоит в очереди раньше, чем сохранение файла
+    release = threading.Event()
+    persistence.submit("block", release.wait)
+    journal.open("other", "Другая вкладка")
+    journal.flush()
+    persistence.writeText(file_path, "сохранённый\nтекст")
+    # Страховка от зависания, если open всё же станет ждать записи
+    threading.Timer(5, release.set).start()
+    started = time.monotonic()
+    journal.open("tab1", "doc.txt", file_path)
+    journal.splice("tab1", 1, 2, ["правка"])
+    journal.flush()
+    # Поток интерфейса не ждёт ни сохранения, ни очереди перед ним
+    assert time.monotonic() - started < 1
+    release.set()
+    persistence.flush()
+    assert journal.readText("tab1") == "сохранённый\nправка"
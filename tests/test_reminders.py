@@ -0,0 +1,78 @@
+from omnidesk_core import ReminderQueue, TaskRecord
+
+
+def makeTask(task_id, remind=None, due=None, completed=False):
+    return TaskRecord(task_id, f"задача {task_id}", completed, due_at=due, remind_at=remind)
+
+
+def test_rebuild_orders_events_and_skips_past():
+    queue = ReminderQueue()
+    queue.rebuild([makeTask(1, remind=100, due=200), makeTask(2, due=150), makeTask(3, due=50),
+                   makeTask(4, due=300, completed=True)], now=60)
+    assert queue.nextTime() == 100
+    assert queue.popDue(1000) == [(1, "remind"), (2, "due"), (1, "due")]
+    assert queue.nextTime() is None
+
+
+def test_reminder_before_due_at_same_time():
+    queue = ReminderQueue()
+    queue.rebuild([makeTask(1, remind=100, due=100)], now=0)
+    assert queue.popDue(100) == [(1, "remind"), (1, "due")]
+
+
+def test_edit_fires_each_event_once():
+    queue = ReminderQueue()
+    task = makeTask(1, remind=100, due=200)
+    queue.rebuild([task], now=0)
+    task.remind_at = 150
+    queue.update(task, now=0)
+    assert queue.popDue(1000) == [(1, "remind"), (1, "due")]
+
+
+def test_complete_and_uncomplete_fires_once():
+    queue = ReminderQueue()
+    task = makeTask(1, remind=100, due=200)
+    queue.rebuild([task], now=0)
+    task.completed = True
+    queue.update(task, now=0)
+    assert queue.nextTime() is None
+    task.completed = False
+    queue.update(task, now=0)
+    assert queue.popDue(1000) == [(1, "remind"), (1, "due")]
+
+
+def test_unchanged_update_is_noop():
+    queue = ReminderQueue()
+    task = makeTask(1, due=200)
+    queue.rebuild([task], now=0)
+    queue.update(task, now=0)
+    assert len(queue.heap) == 1
+
+
+def test_remove_drops_events():
+    queue = ReminderQueue()
+    queue.rebuild([makeTask(1, due=100), makeTask(2, due=200)], now=0)
+    queue.remove(1)
+    assert queue.nextTime() == 200
+    assert queue.popDue(1000) == [(2, "due")]
+
+
+def test_fired_event_not_repeated_after_other_field_changes():
+    queue = ReminderQueue()
+    task = makeTask(1, remind=100, due=200)
+    queue.rebuild([task], now=0)
+    assert queue.popDue(120) == [(1, "remind")]
+    task.due_at = 300
+    queue.update(task, now=120)
+    assert queue.popDue(1000) == [(1, "due")]
+
+
+def test_compact_bounds_stale_entries():
+    queue = ReminderQueue()
+    task = makeTask(1, due=10)
+    queue.rebuild([task], now=0)
+    for due in range(11, 1000):
+        task.due_at = due
+        queue.update(task, now=0)
+    assert len(queue.heap) <= 4 * len(queue.scheduled) + 64 + 1
+    assert queue.popDue(10000) == [(1, "due")]
@@ -0,0 +1,58 @@
+import json
+import threading
+
+import pytest
+
+from omnidesk_core import PersistenceService, TaskRecord, TaskRepository
+
+
+def writeLegacyFiles(directory):
+    tasks = [{"id": 1, "text": "активная", "completed": False, "priority": "Высокий", "category": "Дом",
+              "timestamp": "2024-01-05T10:00:00"}]
+    archive = [{"text": "старая", "completed": True, "priority": "Низкий", "category": "Общее",
+                "timestamp": "2023-12-01T10:00:00"}]
+    history = [{"action": "added", "task": tasks[0], "timestamp": "2024-01-05T10:00:00"}]
+    for name, data in (("tasks.json", tasks), ("tasks_archive.json", archive), ("tasks_history.json", history)):
+        (directory / name).write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_legacy_files_are_migrated_on_load_not_in_constructor(tmp_path, backend):
+    writeLegacyFiles(tmp_path)
+    repository = TaskRepository(str(tmp_path), backend=backend, snapshot=lambda: [])
+    # Конструктор только создаёт объекты; переносы — в load (поток загрузки)
+    assert (tmp_path / "tasks_history.json").exists()
+    assert (tmp_path / "tasks_archive.json").exists()
+    tasks = repository.load()
+    PersistenceService.instance().flush()
+    assert [task.text for task in tasks] == ["активная"]
+    assert not (tmp_path / "tasks_history.json").exists()
+    assert not (tmp_path / "tasks_archive.json").exists()
+    assert [entry["action"] for entry in repository.storage.iterHistory()] == ["added"]
+    assert [task["text"] for task in repository.storage.iterArchive()] == ["старая"]
+    assert repository.nextId() == 3
+
+    # Повторная загрузка ничего не переносит второй раз
+    reopened = TaskRepository(str(tmp_path), backend=backend, snapshot=lambda: [])
+    assert [task.text for task in reopened.load()] == ["активная"]
+    assert len(list(reopened.storage.iterHistory())) == 1
+    assert reopened.storage.archiveCount() == 1
+
+
+def test_sqlite_writes_run_on_persistence_thread(tmp_path):
+    persistence = PersistenceService.instance()
+    repository = TaskRepository(str(tmp_path), backend="sqlite")
+    repository.load()
+    release = threading.Event()
+    persistence.submit("block", release.wait)
+    task = TaskRecord.fromDict({"id": 1, "text": "до", "timestamp": "2024-01-05T10:00:00"})
+    with repository.batch():
+        repository.add([task])
+        repository.archive([task])
+    # Строки сняты при постановке в очередь: дальнейшие правки записи не влияют
+    task.text = "после"
+    threading.Timer(0.2, release.set).start()
+    # Чтение дожидается поставленных изменений
+    assert [row["text"] for row in repository.storage.iterArchive()] == ["до"]
+    assert [entry["action"] for entry in repository.storage.iterHistory()] == ["added", "archived"]
+    assert repository.nextId() == 2
@@ -0,0 +1,60 @@
+from omnidesk_core import FullTextIndex, PersistenceService
+
+
+def makeIndex(tmp_path):
+    index = FullTextIndex(str(tmp_path / "search_index.json.gz"))
+    index.update("task:1", "task", "Позвонить в банк", "уточнить перевод")
+    index.update("task:2", "task", "Банкет", "заказать зал")
+    index.update("note:1", "note", "Ёлка", "купить гирлянды и игрушки")
+    index.update("note:2", "note", "Перевод статьи", "банковский сектор, перевод на английский")
+    return index
+
+
+def ids(results):
+    return [doc_id for doc_id, _, _, _ in results]
+
+
+def test_prefix_matches_all_words_with_prefix(tmp_path):
+    index = makeIndex(tmp_path)
+    assert set(ids(index.search("бан"))) == {"task:1", "task:2", "note:2"}
+    assert ids(index.search("гирл")) == ["note:1"]
+    assert index.search("нетслова") == []
+
+
+def test_all_query_words_are_required(tmp_path):
+    index = makeIndex(tmp_path)
+    assert set(ids(index.search("перев бан"))) == {"task:1", "note:2"}
+    assert index.search("банкет гирлянды") == []
+
+
+def test_exact_and_title_matches_rank_higher(tmp_path):
+    index = makeIndex(tmp_path)
+    # «банк» — целое слово в заголовке task:1, в остальных только префикс
+    assert ids(index.search("банк"))[0] == "task:1"
+
+
+def test_case_and_yo_are_normalized(tmp_path):
+    index = makeIndex(tmp_path)
+    assert ids(index.search("ЕЛКА")) == ["note:1"]
+
+
+def test_update_and_remove_drop_old_words(tmp_path):
+    index = makeIndex(tmp_path)
+    index.update("task:2", "task", "Фуршет", "заказать зал")
+    assert "task:2" not in ids(index.search("бан"))
+    assert ids(index.search("фур")) == ["task:2"]
+    index.remove("note:1")
+    assert index.search("гирл") == []
+    assert "гирлянды" not in index.vocabulary
+    index.removeKind("task")
+    assert ids(index.search("бан")) == ["note:2"]
+
+
+def test_saved_index_is_reloaded(tmp_path):
+    index = makeIndex(tmp_path)
+    index.save()
+    PersistenceService.instance().flush()
+    reloaded = FullTextIndex(index.path)
+    assert not reloaded.isEmpty()
+    assert set(ids(reloaded.search("бан"))) == {"task:1", "task:2", "note:2"}
+    assert reloaded.vocabulary == index.vocabulary
@@ -0,0 +1,112 @@
+import os
+
+from omnidesk_core import FileSyncServer, PersistenceService, SyncEngine
+
+
+class Device:
+    # Минимальное «приложение»: записи по виду и локальному id
+    def __init__(self, directory):
+        self.engine = SyncEngine(str(directory))
+        self.records = {}
+        self.conflicts = []
+        self.next_id = 100
+
+    def apply(self, change, conflict):
+        if conflict:
+            self.conflicts.append(change["key"])
+        if change["kind"] == "history":
+            self.records.setdefault("history", []).append(change["data"])
+            return None
+        local_id = self.engine.localId(change["kind"], change["uid"])
+        if local_id is None:
+            local_id = self.next_id
+            self.next_id += 1
+        if change["deleted"]:
+            self.records.pop((change["kind"], local_id), None)
+        else:
+            self.records[(change["kind"], local_id)] = change["data"]
+        return local_id
+
+    def sync(self, server):
+        received = self.engine.pull(server, self.apply)
+        sent = self.engine.push(server)
+        return received, sent
+
+
+def makeDevices(tmp_path):
+    server = FileSyncServer(str(tmp_path / "server"))
+    a, b = Device(tmp_path / "a"), Device(tmp_path / "b")
+    a.engine.seed([])
+    b.engine.seed([])
+    return server, a, b
+
+
+def test_round_trip(tmp_path):
+    server, a, b = makeDevices(tmp_path)
+    a.engine.record("note", 1, {"title": "Заметка"})
+    a.engine.record("history", None, {"action": "add"})
+    assert a.sync(server) == (0, 2)
+    assert b.sync(server) == (2, 0)
+    assert list(b.records[("note", 100)].values()) == ["Заметка"]
+    assert b.records["history"] == [{"action": "add"}]
+    # Изменение с B возвращается на A в ту же запись
+    b.engine.record("note", 100, {"title": "Изменена"})
+    b.sync(server)
+    a.sync(server)
+    assert a.records[("note", 1)] == {"title": "Изменена"}
+    assert not a.conflicts and not b.conflicts
+
+
+def test_concurrent_edit_is_conflict_and_later_version_wins(tmp_path):
+    server, a, b = makeDevices(tmp_path)
+    a.engine.record("note", 1, {"title": "v1"})
+    a.sync(server)
+    b.sync(server)
+    a.engine.record("note", 1, {"title": "от A"})
+    b.engine.record("note", 100, {"title": "от B"})
+    b.engine.record("note", 100, {"title": "от B ещё раз"})
+    a.sync(server)
+    b.sync(server)
+    a.sync(server)
+    # У B часы дальше, его версия побеждает на обоих устройствах
+    assert a.records[("note", 1)] == {"title": "от B ещё раз"}
+    assert "note/" + a.engine.device + ":1" in a.conflicts
+    assert not b.conflicts
+
+
+def test_outbox_survives_restart(tmp_path):
+    server, a, _ = makeDevices(tmp_path)
+    a.engine.record("note", 1, {"title": "не отправлена"})
+    a.engine.saveState()
+    PersistenceService.instance().flush()
+    restarted = SyncEngine(str(tmp_path / "a"))
+    assert restarted.seeded
+    assert [change["data"] for change in restarted.outbox.values()] == [{"title": "не отправлена"}]
+    assert restarted.push(server) == 1
+    assert os.path.getsize(tmp_path / "a" / "outbox.jsonl") == 0
+
+
+def test_seed_sends_existing_records_once(tmp_path):
+    server = FileSyncServer(str(tmp_path / "server"))
+    engine = SyncEngine(str(tmp_path / "a"))
+    assert not engine.seeded
+    # История, записанная до seed, не задваивается
+    engine.record("history", None, {"action": "add"})
+    engine.record("task", 1, {"text": "до seed"})
+    engine.seed([("task", 1, {"text": "до seed"}, False), ("task", 2, {"text": "старая"}, False),
+                 ("history", None, {"action": "add"}, False)])
+    assert engine.push(server) == 3
+    PersistenceService.instance().flush()
+    assert SyncEngine(str(tmp_path / "a")).seeded
+    other = Device(tmp_path / "b")
+    other.engine.seed([])
+    assert other.sync(server) == (3, 0)
+
+
+def test_push_in_batches(tmp_path):
+    server, a, b = makeDevices(tmp_path)
+    a.engine.recordMany(("note", i, {"title": str(i)}, False) for i in range(SyncEngine.BATCH_SIZE * 2 + 7))
+    assert a.engine.push(server) == SyncEngine.BATCH_SIZE * 2 + 7
+    assert server.head() == 3
+    assert not a.engine.outbox
+    assert b.sync(server)[0] == SyncEngine.BATCH_SIZE * 2 + 7
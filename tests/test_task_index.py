@@ -0,0 +1,75 @@
+import itertools
+import random
+
+from omnidesk_core import CATEGORIES, PRIORITIES, TaskIndex, TaskRecord, isoToEpoch
+
+
+def makeTasks(count, seed=1):
+    rng = random.Random(seed)
+    tasks = []
+    for task_id in range(1, count + 1):
+        timestamp = "" if task_id % 17 == 0 else f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00"
+        tasks.append(TaskRecord.fromDict({"id": task_id, "text": f"задача {task_id}",
+                                          "completed": rng.random() < 0.3,
+                                          "priority": rng.choice(PRIORITIES.values),
+                                          "category": rng.choice(CATEGORIES.values),
+                                          "timestamp": timestamp}))
+    return tasks
+
+
+def bruteForce(tasks, category=None, priority=None, completed=None, since=None, until=None):
+    since_key, until_key = isoToEpoch(since), isoToEpoch(until)
+    result = set()
+    for task in tasks:
+        key = TaskIndex.timeKey(task)
+        if category is not None and task.category != category:
+            continue
+        if priority is not None and task.priority != priority:
+            continue
+        if completed is not None and task.completed != completed:
+            continue
+        if since_key is not None and key < since_key:
+            continue
+        if until_key is not None and key > until_key:
+            continue
+        result.add(task.id)
+    return result
+
+
+def test_match_agrees_with_full_scan():
+    tasks = makeTasks(300)
+    index = TaskIndex()
+    index.rebuild(tasks)
+    for category, priority, completed, (since, until) in itertools.product(
+            [None, "Работа", "Дом"], [None, "Высокий"], [None, True, False],
+            [(None, None), ("2024-03-01T00:00:00", None), (None, "2024-06-30T23:59:59"),
+             ("2024-05-01T00:00:00", "2024-05-28T12:00:00")]):
+        filters = dict(category=category, priority=priority, completed=completed, since=since, until=until)
+        assert index.match(**filters) == bruteForce(tasks, **filters), filters
+
+
+def test_add_remove_and_complete_keep_index_in_sync():
+    tasks = makeTasks(50)
+    index = TaskIndex()
+    for task in tasks:
+        index.add(task)
+    rebuilt = TaskIndex()
+    rebuilt.rebuild(tasks)
+    assert index.by_timestamp == rebuilt.by_timestamp
+
+    removed = tasks[::3]
+    for task in removed:
+        index.remove(task)
+    tasks = [task for task in tasks if task not in removed]
+    task = tasks[0]
+    task.completed = not task.completed
+    index.setCompleted(task.id, task.completed)
+    assert index.match() == {task.id for task in tasks}
+    assert index.match(completed=True) == bruteForce(tasks, completed=True)
+    assert index.match(since="2024-01-01T00:00:00") == bruteForce(tasks, since="2024-01-01T00:00:00")
+
+
+def test_unknown_category_matches_nothing():
+    index = TaskIndex()
+    index.rebuild(makeTasks(10))
+    assert index.match(category="Нет такой") == set()
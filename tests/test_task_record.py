@@ -0,0 +1,45 @@
+from omnidesk_core import CATEGORIES, PRIORITIES, TaskRecord, frozenToDict, isoToEpoch
+
+
+def test_offset_survives_round_trip():
+    data = {"id": 1, "text": "созвон", "completed": False, "priority": "Высокий", "category": "Работа",
+            "timestamp": "2024-03-01T09:00:00+03:00", "due": "2024-03-02T18:30:00+05:00",
+            "remind": "2024-03-02T18:00:00Z"}
+    task = TaskRecord.fromDict(data)
+    assert task.toDict() == {**data, "remind": "2024-03-02T18:00:00Z"}
+    assert frozenToDict(task.freeze()) == task.toDict()
+    # Для сортировки и напоминаний — те же секунды Unix
+    assert task.due_at == isoToEpoch("2024-03-02T13:30:00+00:00")
+    assert task.remind_at == isoToEpoch("2024-03-02T18:00:00+00:00")
+
+
+def test_local_time_is_stored_as_seconds_only():
+    task = TaskRecord.fromDict({"id": 1, "text": "t", "timestamp": "2024-03-01T09:00:00",
+                                "due": "2024-03-02T18:30:00"})
+    assert task.extra is None
+    assert task.toDict()["due"] == "2024-03-02T18:30:00"
+
+
+def test_setting_time_replaces_original_string():
+    task = TaskRecord.fromDict({"id": 1, "text": "t", "due": "2024-03-02T18:30:00+05:00"})
+    task.due = isoToEpoch("2024-03-05T10:00:00")
+    assert task.due == "2024-03-05T10:00:00"
+    task.due = None
+    assert "due" not in task.toDict()
+
+
+def test_contains_optional_fields():
+    task = TaskRecord(1, "t")
+    assert "due" not in task and "remind" not in task
+    assert "text" in task and "timestamp" in task
+    task.due = "2024-03-02T18:30:00+05:00"
+    assert "due" in task
+    task.remind = "не время"
+    assert "remind" in task and task["remind"] == "не время"
+
+
+def test_missing_priority_and_category_get_defaults():
+    task = TaskRecord.fromDict({"id": 1, "text": "без полей"})
+    assert (task.priority, task.category) == ("Низкий", "Общее")
+    assert task.toDict()["priority"] == "Низкий" and task.toDict()["category"] == "Общее"
+    assert None not in PRIORITIES.values and None not in CATEGORIES.values
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+pytest.importorskip("PyQt6")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from OmniDesk import VersionStore  # noqa: E402
+
+
+def makeStore(tmp_path, **kwargs):
+    return VersionStore(root=str(tmp_path / "history"), **kwargs)
+
+
+def text(n):
+    return "".join(f"строка {i}\n" for i in range(200)) + f"правка {n}\n"
+
+
+def test_versions_round_trip_through_deltas(tmp_path):
+    store = makeStore(tmp_path)
+    path = str(tmp_path / "file.txt")
+    entries = [store.addVersion(path, text(n)) for n in range(5)]
+    assert [entry["depth"] for entry in entries] == [0, 1, 2, 3, 4]
+    for n, entry in enumerate(entries):
+        assert store.restoreVersion(path, entry["id"]) == text(n)
+    assert store.addVersion(path, text(4)) is None
+
+
+def test_chain_length_is_bounded(tmp_path):
+    store = makeStore(tmp_path, max_chain=3)
+    path = str(tmp_path / "file.txt")
+    depths = [store.addVersion(path, text(n))["depth"] for n in range(10)]
+    assert max(depths) <= 3
+    assert 0 in depths[1:]
+
+
+def test_repeated_content_keeps_real_depth(tmp_path):
+    # A→B→C→B→D→B…: повторный текст уже хранится дельтой, цепочка не должна расти без предела
+    store = makeStore(tmp_path, max_chain=3)
+    path = str(tmp_path / "file.txt")
+    store.addVersion(path, text(0))
+    store.addVersion(path, text(1))
+    for n in range(2, 12):
+        for content in (text(n), text(1)):
+            entry = store.addVersion(path, content)
+            assert entry["depth"] == store.objectDepth(entry["hash"])
+            assert entry["depth"] <= 3
+
+
+def test_last_content_keeps_one_file(tmp_path):
+    store = makeStore(tmp_path)
+    for name in ("a.txt", "b.txt", "c.txt"):
+        store.addVersion(str(tmp_path / name), text(0) + name)
+    assert store.last_content[0].endswith("c.txt")
+    entry = store.addVersion(str(tmp_path / "a.txt"), text(1) + "a.txt")
+    assert store.restoreVersion(str(tmp_path / "a.txt"), entry["id"]) == text(1) + "a.txt"
+
+
+def test_retention_collects_unreferenced_objects(tmp_path):
+    store = makeStore(tmp_path, keep_last=3, keep_daily_days=0)
+    path = str(tmp_path / "file.txt")
+    for n in range(8):
+        store.addVersion(path, text(n))
+    versions = store.listVersions(path)
+    assert len(versions) <= 4
+    for entry in versions:
+        assert store.restoreVersion(path, entry["id"]).startswith("строка 0")
+
+
+def countObjects(store):
+    objects_dir = os.path.join(store.root, "objects")
+    return sum(len(os.listdir(os.path.join(objects_dir, prefix))) for prefix in os.listdir(objects_dir))
+
+
+def test_garbage_collected_only_when_object_is_unreachable(tmp_path, monkeypatch):
+    store = makeStore(tmp_path, keep_last=3, keep_daily_days=0, max_chain=4)
+    path = str(tmp_path / "file.txt")
+    collected = []
+    original = store.collectGarbage
+    monkeypatch.setattr(store, "collectGarbage", lambda: (collected.append(True), original()))
+    for n in range(5):
+        store.addVersion(path, text(n))
+    # Удалённые версии пока служат базами дельт оставшихся — обход хранилища не нужен
+    assert collected == []
+    for n in range(5, 12):
+        store.addVersion(path, text(n))
+    # После полной копии старая цепочка не нужна и вычищается
+    assert collected
+    assert countObjects(store) == len(store.reachable(store.listVersions(path)))
+    for entry in store.listVersions(path):
+        assert store.restoreVersion(path, entry["id"]).startswith("строка 0")
+
+
+def test_object_base_reads_header_of_large_object(tmp_path):
+    store = makeStore(tmp_path)
+    path = str(tmp_path / "big.txt")
+    noise = os.urandom(300000).hex()
+    first = store.addVersion(path, noise)
+    second = store.addVersion(path, noise + "конец")
+    assert store.objectBase(first["hash"]) is None
+    assert store.objectBase(second["hash"]) == first["hash"]
+    assert store.objectDepth(second["hash"]) == 1